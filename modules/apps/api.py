@@ -1,7 +1,94 @@
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any
+from pydantic import BaseModel
 import pulumi
 import pulumi_kubernetes as k8s
 
+from modules.observability import LoggingProfile
+
+HASURA_RESOURCES = {
+    "requests": {"memory": "512Mi", "cpu": "250m"},
+    "limits": {"memory": "1Gi", "cpu": "500m"},
+}
+
+
+class HasuraConfig(BaseModel):
+    """
+    Perfil de performance do Hasura (logs, pool do Postgres e event triggers).
+
+    O pool é por réplica: réplicas × pg_connections precisa caber no
+    max_connections do banco, descontados os demais serviços.
+    """
+
+    # Sobrescrevem o LoggingProfile do stack (None: usa o perfil)
+    log_level: Optional[str] = None  # debug, info, warn, error
+    log_types: Optional[List[str]] = None
+    # Pool de conexões com o Postgres
+    pg_connections: int = 50
+    pg_stripes: int = 1
+    pg_conn_idle_timeout: int = 180  # segundos
+    pg_conn_lifetime: int = 600  # segundos
+    # Event triggers
+    events_http_pool_size: int = 100
+    events_fetch_batch_size: int = 100
+    # Timeout das requisições HTTP ao servidor (segundos)
+    server_timeout: Optional[int] = None
+
+    @classmethod
+    def for_environment(cls, environment: str) -> "HasuraConfig":
+        """Perfil padrão de um ambiente (ver HASURA_ENVIRONMENT_DEFAULTS)"""
+        return cls(**HASURA_ENVIRONMENT_DEFAULTS.get(environment, {}))
+
+    @property
+    def env(self) -> Dict[str, str]:
+        env = {
+            "HASURA_GRAPHQL_PG_CONNECTIONS": str(self.pg_connections),
+            "HASURA_GRAPHQL_PG_STRIPES": str(self.pg_stripes),
+            "HASURA_GRAPHQL_PG_CONN_IDLE_TIMEOUT": str(self.pg_conn_idle_timeout),
+            "HASURA_GRAPHQL_PG_CONN_LIFETIME": str(self.pg_conn_lifetime),
+            "HASURA_GRAPHQL_EVENTS_HTTP_POOL_SIZE": str(self.events_http_pool_size),
+            "HASURA_GRAPHQL_EVENTS_FETCH_BATCH_SIZE": str(
+                self.events_fetch_batch_size
+            ),
+        }
+        if self.server_timeout:
+            env["HASURA_GRAPHQL_SERVER_TIMEOUT"] = str(self.server_timeout)
+        if self.log_level:
+            env["HASURA_GRAPHQL_LOG_LEVEL"] = self.log_level
+        if self.log_types:
+            env["HASURA_GRAPHQL_ENABLED_LOG_TYPES"] = ",".join(self.log_types)
+        return env
+
+
+# Sandbox divide o banco com os demais serviços em poucas réplicas
+HASURA_ENVIRONMENT_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "sandbox": {
+        "pg_connections": 10,
+        "pg_conn_idle_timeout": 60,
+        "events_http_pool_size": 20,
+        "events_fetch_batch_size": 20,
+        "server_timeout": 60,
+    },
+    "production": {
+        "pg_connections": 30,
+        "pg_stripes": 2,
+        "server_timeout": 60,
+    },
+}
+
+
+class HasuraPoolConfig(BaseModel):
+    """
+    Pool dedicado do Hasura (Deployment + Service `<nome>-<sufixo>`).
+
+    Usado para separar as subscriptions (websockets de longa duração) das
+    queries e mutations, escalando e ajustando cada classe de tráfego de
+    forma independente.
+    """
+
+    suffix: str = "subscriptions"
+    replicas: int = 1
+    resources: Dict[str, Any] = HASURA_RESOURCES
+
 
 class HasuraGateway(pulumi.ComponentResource):
     def __init__(
@@ -11,7 +98,26 @@ class HasuraGateway(pulumi.ComponentResource):
         # Configurações específicas do Hasura
         image: str = "hasura/graphql-engine:latest",
         replicas: int = 2,
+        resources: Optional[Dict[str, Any]] = None,
         enable_console: bool = True,
+        # Perfil de performance (pool do Postgres, event triggers)
+        config: Optional[HasuraConfig] = None,
+        # Perfil de logs do stack
+        logging_profile: Optional[LoggingProfile] = None,
+        # Endpoint OTLP do OtelCollector. O Hasura só exporta traces com a
+        # integração OpenTelemetry (EE) configurada na metadata
+        otlp_endpoint: Optional[str] = None,
+        # Service headless (<name>-headless) para balanceamento direto aos pods
+        headless_service: bool = False,
+        # Encerramento: o preStop espera um tempo aleatório (até
+        # drain_jitter_seconds) para que os pods não derrubem todas as
+        # subscriptions ao mesmo tempo; depois o Hasura fecha os websockets
+        # em até graceful_shutdown_seconds
+        drain_jitter_seconds: int = 30,
+        graceful_shutdown_seconds: int = 60,
+        # Pool separado para subscriptions; o Deployment principal fica com
+        # queries, mutations e o console
+        subscription_pool: Optional[HasuraPoolConfig] = None,
         # Dependências (micro-serviços) {"ENV_VAR_NAME": "SERVICE_URL"}
         env_vars: Optional[Dict[str, Any]] = None,
         opts: Optional[pulumi.ResourceOptions] = None,
@@ -22,8 +128,43 @@ class HasuraGateway(pulumi.ComponentResource):
         self.namespace = namespace
         self.env_vars = env_vars
         self.enable_console = enable_console
-        self.deployment = self._create_deployment(image, replicas)
-        self.service = self._create_service()
+        self.config = config or HasuraConfig()
+        self.logging_profile = logging_profile or LoggingProfile()
+        self.otlp_endpoint = otlp_endpoint
+        self.drain_jitter_seconds = drain_jitter_seconds
+        self.graceful_shutdown_seconds = graceful_shutdown_seconds
+        # Réplicas de todos os pools (orçamento de conexões com o Postgres)
+        self.total_replicas = replicas + (
+            subscription_pool.replicas if subscription_pool else 0
+        )
+        self.deployment = self._create_deployment(
+            name, image, replicas, resources or HASURA_RESOURCES, enable_console
+        )
+        self.service = self._create_service(name)
+        self.headless_service = (
+            self._create_headless_service(name) if headless_service else None
+        )
+
+        # ✅ Pool de subscriptions
+        self.subscription_name = None
+        self.subscription_deployment = None
+        self.subscription_service = None
+        self.subscription_headless_service = None
+        if subscription_pool:
+            self.subscription_name = f"{name}-{subscription_pool.suffix}"
+            self.subscription_deployment = self._create_deployment(
+                self.subscription_name,
+                image,
+                subscription_pool.replicas,
+                subscription_pool.resources,
+                enable_console=False,
+            )
+            self.subscription_service = self._create_service(self.subscription_name)
+            self.subscription_headless_service = (
+                self._create_headless_service(self.subscription_name)
+                if headless_service
+                else None
+            )
 
         self.register_outputs(
             {
@@ -34,24 +175,50 @@ class HasuraGateway(pulumi.ComponentResource):
                     if enable_console
                     else None
                 ),
+                "subscriptions_endpoint": (
+                    f"{self.subscription_name}.{namespace}.svc.cluster.local"
+                    if self.subscription_name
+                    else None
+                ),
             }
         )
 
-    def _create_deployment(self, image: str, replicas: int) -> k8s.apps.v1.Deployment:
-        """Deployment do Hasura"""
+    def _create_deployment(
+        self,
+        name: str,
+        image: str,
+        replicas: int,
+        resources: Dict[str, Any],
+        enable_console: bool,
+    ) -> k8s.apps.v1.Deployment:
+        """Deployment do Hasura (pool principal ou de subscriptions)"""
         env_vars = []
 
         # Add plan variables
         fixed_env_vars = {
-            "HASURA_GRAPHQL_ENABLE_CONSOLE": str(self.enable_console).lower(),
+            "HASURA_GRAPHQL_ENABLE_CONSOLE": str(enable_console).lower(),
             "HASURA_GRAPHQL_UNAUTHORIZED_ROLE": "anonymous",
-            "HASURA_GRAPHQL_ENABLED_LOG_TYPES": "startup,query-log,http-log,webhook-log,websocket-log",
-            "HASURA_GRAPHQL_LOG_LEVEL": "debug",
+            "HASURA_GRAPHQL_LOG_LEVEL": self.logging_profile.level_for("hasura"),
+            "HASURA_GRAPHQL_ENABLED_LOG_TYPES": ",".join(
+                self.logging_profile.hasura_log_types
+            ),
+            **self.config.env,
             "HASURA_GRAPHQL_CORS_DOMAIN": "*",
             "HASURA_GRAPHQL_INFER_FUNCTION_PERMISSIONS": "false",
+            "HASURA_GRAPHQL_GRACEFUL_SHUTDOWN_TIMEOUT": str(
+                self.graceful_shutdown_seconds
+            ),
             "PORT": "8080",
         }
 
+        if self.otlp_endpoint:
+            fixed_env_vars.update(
+                {
+                    "OTEL_EXPORTER_OTLP_ENDPOINT": self.otlp_endpoint,
+                    "OTEL_SERVICE_NAME": name,
+                }
+            )
+
         # Adicionar variáveis fixas
         for key, value in fixed_env_vars.items():
             env_vars.append(k8s.core.v1.EnvVarArgs(name=key, value=value))
@@ -89,17 +256,44 @@ class HasuraGateway(pulumi.ComponentResource):
                 )
             )
 
+        # Réplicas de leitura: a chave só existe quando
+        # apps:bonde-database-read-urls está configurado
+        env_vars.append(
+            k8s.core.v1.EnvVarArgs(
+                name="HASURA_GRAPHQL_READ_REPLICA_URLS",
+                value_from=k8s.core.v1.EnvVarSourceArgs(
+                    secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(
+                        name="bonde-database-read-url",
+                        key="HASURA_GRAPHQL_READ_REPLICA_URLS",
+                        optional=True,
+                    )
+                ),
+            )
+        )
+
         return k8s.apps.v1.Deployment(
-            f"{self.name}-deployment",
+            f"{name}-deployment",
             metadata=k8s.meta.v1.ObjectMetaArgs(
-                name=self.name, namespace=self.namespace, labels={"app": self.name}
+                name=name, namespace=self.namespace, labels={"app": name}
             ),
             spec=k8s.apps.v1.DeploymentSpecArgs(
                 replicas=replicas,
-                selector=k8s.meta.v1.LabelSelectorArgs(match_labels={"app": self.name}),
+                selector=k8s.meta.v1.LabelSelectorArgs(match_labels={"app": name}),
+                # Troca um pod por vez, espaçando as reconexões das subscriptions
+                strategy=k8s.apps.v1.DeploymentStrategyArgs(
+                    type="RollingUpdate",
+                    rolling_update=k8s.apps.v1.RollingUpdateDeploymentArgs(
+                        max_surge=1, max_unavailable=0
+                    ),
+                ),
+                min_ready_seconds=10,
                 template=k8s.core.v1.PodTemplateSpecArgs(
-                    metadata=k8s.meta.v1.ObjectMetaArgs(labels={"app": self.name}),
+                    metadata=k8s.meta.v1.ObjectMetaArgs(labels={"app": name}),
                     spec=k8s.core.v1.PodSpecArgs(
+                        termination_grace_period_seconds=5
+                        + self.drain_jitter_seconds
+                        + self.graceful_shutdown_seconds
+                        + 10,
                         containers=[
                             k8s.core.v1.ContainerArgs(
                                 name="hasura",
@@ -108,9 +302,22 @@ class HasuraGateway(pulumi.ComponentResource):
                                     k8s.core.v1.ContainerPortArgs(container_port=8080)
                                 ],
                                 env=env_vars,
+                                lifecycle=k8s.core.v1.LifecycleArgs(
+                                    pre_stop=k8s.core.v1.LifecycleHandlerArgs(
+                                        exec_=k8s.core.v1.ExecActionArgs(
+                                            command=[
+                                                "sh",
+                                                "-c",
+                                                # Sai dos endpoints e espera 5s + jitter
+                                                "sleep $((5 + $(od -An -N2 -tu2 /dev/urandom) "
+                                                f"% {self.drain_jitter_seconds + 1}))",
+                                            ]
+                                        )
+                                    )
+                                ),
                                 resources=k8s.core.v1.ResourceRequirementsArgs(
-                                    requests={"memory": "512Mi", "cpu": "250m"},
-                                    limits={"memory": "1Gi", "cpu": "500m"},
+                                    requests=resources.get("requests", {}),
+                                    limits=resources.get("limits", {}),
                                 ),
                                 liveness_probe=k8s.core.v1.ProbeArgs(
                                     http_get=k8s.core.v1.HTTPGetActionArgs(
@@ -134,17 +341,38 @@ class HasuraGateway(pulumi.ComponentResource):
             opts=pulumi.ResourceOptions(parent=self),
         )
 
-    def _create_service(self) -> k8s.core.v1.Service:
+    def _create_service(self, name: str) -> k8s.core.v1.Service:
         """Service para o Hasura"""
         return k8s.core.v1.Service(
-            f"{self.name}-service",
+            f"{name}-service",
             metadata=k8s.meta.v1.ObjectMetaArgs(
-                name=self.name, namespace=self.namespace, labels={"app": self.name}
+                name=name, namespace=self.namespace, labels={"app": name}
             ),
             spec=k8s.core.v1.ServiceSpecArgs(
-                selector={"app": self.name},
+                selector={"app": name},
                 ports=[k8s.core.v1.ServicePortArgs(port=80, target_port=8080)],
                 type="ClusterIP",
             ),
             opts=pulumi.ResourceOptions(parent=self),
         )
+
+    def _create_headless_service(self, name: str) -> k8s.core.v1.Service:
+        """Service headless: o DNS (A/SRV) resolve diretamente os IPs dos pods"""
+        return k8s.core.v1.Service(
+            f"{name}-headless-service",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=f"{name}-headless",
+                namespace=self.namespace,
+                labels={"app": name},
+            ),
+            spec=k8s.core.v1.ServiceSpecArgs(
+                cluster_ip="None",
+                selector={"app": name},
+                ports=[
+                    k8s.core.v1.ServicePortArgs(
+                        name="http", port=8080, target_port=8080
+                    )
+                ],
+            ),
+            opts=pulumi.ResourceOptions(parent=self),
+        )
@@ -3,6 +3,9 @@ from pydantic import BaseModel
 import pulumi
 import pulumi_kubernetes as k8s
 
+from modules.observability import LoggingProfile, ApmProfile, SloConfig, create_slo_rule
+from modules.observability.apm import APM_SECRETS
+
 
 class ContainerConfig(BaseModel):
     image: str
@@ -27,6 +30,8 @@ class ServiceConfig(BaseModel):
     port: int = 80
     target_port: Optional[int] = None
     annotations: Dict[str, str] = {}
+    # Service headless adicional (<name>-headless) para balanceamento direto aos pods
+    headless: bool = False
 
 
 class IngressConfig(BaseModel):
@@ -37,6 +42,45 @@ class IngressConfig(BaseModel):
     annotations: Dict[str, str] = {}
 
 
+class CanaryConfig(BaseModel):
+    """
+    Marca o serviço como canary de outro (ex.: client-canary de client-admin).
+
+    O Caddy envia `weight`% do tráfego do serviço estável para este; o
+    `tools/canary.py` ajusta o peso conforme as métricas do rollout.
+    """
+
+    canary_of: str
+    weight: int = 0
+    cookie: str = "bonde_canary"
+
+
+class ApmConfig(BaseModel):
+    """
+    Instrumentação Elastic APM do serviço.
+
+    Os padrões (ambiente, amostragem) vêm do ApmProfile do stack; aqui
+    ficam apenas os ajustes do serviço.
+    """
+
+    enabled: bool = True
+    service_name: Optional[str] = None  # padrão: nome do serviço
+    transaction_sample_rate: Optional[float] = None  # padrão: ApmProfile
+
+
+class MetricsConfig(BaseModel):
+    """
+    Endpoint Prometheus do serviço.
+
+    Expõe a porta nomeada `metrics` no Service e cria um ServiceMonitor
+    (requer o kube-prometheus-stack do stack shared).
+    """
+
+    port: Optional[int] = None  # padrão: porta do container
+    path: str = "/metrics"
+    interval: str = "30s"
+
+
 class WebServiceConfig(BaseModel):
     name: str
     namespace: str
@@ -48,6 +92,15 @@ class WebServiceConfig(BaseModel):
     annotations: Dict[str, str] = {}
     volumes: List[Dict[str, Any]] = []
     service_account: Optional[str] = None
+    # Pools de nodes (ver Pulumi.shared.yaml): serviços sem estado podem
+    # tolerar o taint do pool spot; o pool graviton exige imagem arm64
+    node_selector: Dict[str, str] = {}
+    tolerations: List[Dict[str, Any]] = []
+    canary: Optional[CanaryConfig] = None
+    apm: Optional[ApmConfig] = None
+    metrics: Optional[MetricsConfig] = None
+    # Requer `metrics` com um histograma de duração das requisições
+    slo: Optional[SloConfig] = None
 
 
 class WebService(pulumi.ComponentResource):
@@ -55,14 +108,32 @@ class WebService(pulumi.ComponentResource):
         self,
         name: str,
         config: WebServiceConfig,
+        logging_profile: Optional[LoggingProfile] = None,
+        apm_profile: Optional[ApmProfile] = None,
+        # Endpoint OTLP/HTTP do OtelCollector (OTEL_EXPORTER_OTLP_ENDPOINT)
+        otlp_endpoint: Optional[str] = None,
         opts: Optional[pulumi.ResourceOptions] = None,
     ):
         super().__init__("custom:apps:WebService", name, {}, opts)
 
         self.config = config
+        self.logging_profile = logging_profile or LoggingProfile()
+        self.apm_profile = apm_profile or ApmProfile()
+        self.otlp_endpoint = otlp_endpoint
         self.deployment = self._create_deployment()
         self.service = self._create_service() if config.service else None
+        self.headless_service = (
+            self._create_headless_service()
+            if config.service and config.service.headless
+            else None
+        )
         self.ingress = self._create_ingress() if config.ingress.enabled else None
+        self.service_monitor = (
+            self._create_service_monitor()
+            if config.metrics and self.service
+            else None
+        )
+        self.slo_rule = self._create_slo_rule() if config.slo else None
 
         self.register_outputs(
             {
@@ -72,16 +143,46 @@ class WebService(pulumi.ComponentResource):
             }
         )
 
+    def _apm_env(self) -> Dict[str, str]:
+        """Variáveis do agente Elastic APM, quando o serviço optou pelo APM"""
+        apm = self.config.apm
+        if not apm or not apm.enabled:
+            return {}
+        return self.apm_profile.env(
+            apm.service_name or self.config.name, apm.transaction_sample_rate
+        )
+
+    def _otel_env(self) -> Dict[str, str]:
+        """Exportação de traces OpenTelemetry para o coletor do stack"""
+        if not self.otlp_endpoint:
+            return {}
+        return {
+            "OTEL_EXPORTER_OTLP_ENDPOINT": self.otlp_endpoint,
+            "OTEL_EXPORTER_OTLP_PROTOCOL": "http/protobuf",
+            "OTEL_SERVICE_NAME": self.config.name,
+        }
+
     def _create_deployment(self) -> k8s.apps.v1.Deployment:
         # Environment variables
         env_vars = []
 
+        # Nível de log e APM do stack (o env do serviço tem prioridade)
+        env = {
+            "LOG_LEVEL": self.logging_profile.level_for("webservice"),
+            **self._apm_env(),
+            **self._otel_env(),
+            **self.config.container.env,
+        }
+        env_from_secret = dict(self.config.container.env_from_secret)
+        if self.config.apm and self.config.apm.enabled:
+            env_from_secret = {**APM_SECRETS, **env_from_secret}
+
         # Add plain env vars
-        for key, value in self.config.container.env.items():
+        for key, value in env.items():
             env_vars.append(k8s.core.v1.EnvVarArgs(name=key, value=value))
 
         # Add secret-based env vars
-        for env_name, secret_ref in self.config.container.env_from_secret.items():
+        for env_name, secret_ref in env_from_secret.items():
             env_vars.append(
                 k8s.core.v1.EnvVarArgs(
                     name=env_name,
@@ -132,6 +233,8 @@ class WebService(pulumi.ComponentResource):
                     metadata=k8s.meta.v1.ObjectMetaArgs(labels=self._get_labels()),
                     spec=k8s.core.v1.PodSpecArgs(
                         service_account_name=self.config.service_account,
+                        node_selector=self.config.node_selector or None,
+                        tolerations=self.config.tolerations or None,
                         image_pull_secrets=(
                             [
                                 k8s.core.v1.LocalObjectReferenceArgs(
@@ -147,11 +250,7 @@ class WebService(pulumi.ComponentResource):
                                 name=self.config.name,
                                 image=self.config.container.image,
                                 image_pull_policy=self.config.container.image_pull_policy,
-                                ports=[
-                                    k8s.core.v1.ContainerPortArgs(
-                                        container_port=self.config.container.port
-                                    )
-                                ],
+                                ports=self._container_ports(),
                                 env=env_vars,
                                 command=self.config.container.command,
                                 args=self.config.container.args,
@@ -182,15 +281,111 @@ class WebService(pulumi.ComponentResource):
                 annotations=self.config.service.annotations,
             ),
             spec=k8s.core.v1.ServiceSpecArgs(
+                selector=self._get_match_labels(),
+                ports=self._service_ports(),
+                type=self.config.service.type,
+            ),
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+
+    def _metrics_port(self) -> Optional[int]:
+        if not self.config.metrics:
+            return None
+        return self.config.metrics.port or self.config.container.port
+
+    def _container_ports(self) -> List[k8s.core.v1.ContainerPortArgs]:
+        ports = [
+            k8s.core.v1.ContainerPortArgs(
+                container_port=self.config.container.port, name="http"
+            )
+        ]
+        metrics_port = self._metrics_port()
+        if metrics_port and metrics_port != self.config.container.port:
+            ports.append(
+                k8s.core.v1.ContainerPortArgs(container_port=metrics_port, name="metrics")
+            )
+        return ports
+
+    def _service_ports(self) -> List[k8s.core.v1.ServicePortArgs]:
+        ports = [
+            k8s.core.v1.ServicePortArgs(
+                name="http",
+                port=self.config.service.port,
+                target_port=self.config.service.target_port
+                or self.config.container.port,
+            )
+        ]
+        metrics_port = self._metrics_port()
+        if metrics_port:
+            if metrics_port == self.config.service.port:
+                raise ValueError(
+                    f"{self.config.name}: metrics.port não pode ser igual a service.port"
+                )
+            ports.append(
+                k8s.core.v1.ServicePortArgs(
+                    name="metrics", port=metrics_port, target_port=metrics_port
+                )
+            )
+        return ports
+
+    def _create_service_monitor(self) -> k8s.apiextensions.CustomResource:
+        """ServiceMonitor para a porta `metrics` do Service"""
+        return k8s.apiextensions.CustomResource(
+            f"{self.config.name}-service-monitor",
+            api_version="monitoring.coreos.com/v1",
+            kind="ServiceMonitor",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.config.name,
+                namespace=self.config.namespace,
+                labels=self._get_labels(),
+            ),
+            spec={
+                "selector": {"matchLabels": self._get_match_labels()},
+                "endpoints": [
+                    {
+                        "port": "metrics",
+                        "path": self.config.metrics.path,
+                        "interval": self.config.metrics.interval,
+                    }
+                ],
+            },
+            opts=pulumi.ResourceOptions(parent=self, depends_on=[self.service]),
+        )
+
+    def _create_slo_rule(self) -> k8s.apiextensions.CustomResource:
+        """PrometheusRule do SLO sobre as séries coletadas pelo ServiceMonitor"""
+        if not self.service_monitor:
+            raise ValueError(f"{self.config.name}: slo requer metrics e service")
+        slo = self.config.slo
+        if not slo.metric:
+            slo = slo.model_copy(update={"metric": "http_request_duration_seconds"})
+        return create_slo_rule(
+            self.config.name,
+            self.config.namespace,
+            slo,
+            {"service": self.config.name},
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+
+    def _create_headless_service(self) -> k8s.core.v1.Service:
+        """Service headless: o DNS (A/SRV) resolve diretamente os IPs dos pods"""
+        return k8s.core.v1.Service(
+            f"{self.config.name}-headless-service",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=f"{self.config.name}-headless",
+                namespace=self.config.namespace,
+                labels=self._get_labels(),
+            ),
+            spec=k8s.core.v1.ServiceSpecArgs(
+                cluster_ip="None",
                 selector=self._get_match_labels(),
                 ports=[
                     k8s.core.v1.ServicePortArgs(
-                        port=self.config.service.port,
-                        target_port=self.config.service.target_port
-                        or self.config.container.port,
+                        name="http",
+                        port=self.config.container.port,
+                        target_port=self.config.container.port,
                     )
                 ],
-                type=self.config.service.type,
             ),
             opts=pulumi.ResourceOptions(parent=self),
         )
@@ -1,8 +1,76 @@
-from typing import Dict, Optional, Any
+from typing import Dict, List, Literal, Optional, Any
 from pydantic import BaseModel
 import pulumi
 import pulumi_kubernetes as k8s
 
+from modules.base import AutoscalingConfig
+from modules.data import Redis, RedisConfig
+from modules.observability import LoggingProfile
+
+
+class N8NQueueConfig(BaseModel):
+    """
+    Queue mode do N8N: o processo principal (UI/API/triggers) enfileira as
+    execuções no Redis (Bull) e os workers as executam. Webhooks de produção
+    são atendidos por processos próprios (`<nome>-webhook`).
+
+    Todos os processos precisam da mesma N8N_ENCRYPTION_KEY (secret
+    n8n-encryption-key, ver load_env_secrets).
+    """
+
+    enabled: bool = False
+    # Redis externo ("host:porta"); sem ele um Redis local é criado
+    redis_address: Optional[str] = None
+    # Workers
+    worker_replicas: int = 1
+    worker_concurrency: int = 10
+    # Autoscaling dos workers pelo tamanho da fila (KEDA, lista bull:jobs:wait)
+    worker_autoscaling: Optional[AutoscalingConfig] = None
+    queue_length_target: int = 20
+    worker_resources: Dict[str, Any] = {
+        "requests": {"memory": "512Mi", "cpu": "250m"},
+        "limits": {"memory": "1Gi", "cpu": "500m"},
+    }
+    # Processadores de webhook
+    webhook_replicas: int = 1
+    webhook_resources: Dict[str, Any] = {
+        "requests": {"memory": "256Mi", "cpu": "100m"},
+        "limits": {"memory": "512Mi", "cpu": "500m"},
+    }
+
+
+class N8NExecutionsConfig(BaseModel):
+    """Retenção dos dados de execução no banco do N8N"""
+
+    prune: bool = True
+    max_age_hours: int = 336  # 14 dias
+    max_count: int = 10000
+    # Execuções bem-sucedidas: "all" ou "none" (apenas erros ficam salvos)
+    save_on_success: Literal["all", "none"] = "none"
+    save_on_error: Literal["all", "none"] = "all"
+    save_manual: bool = True
+    # Horas entre o soft delete e a remoção definitiva (inclui binários)
+    hard_delete_buffer_hours: int = 1
+
+
+class N8NBinaryDataConfig(BaseModel):
+    """
+    Armazenamento dos dados binários das execuções (arquivos, anexos).
+
+    - default: em memória/banco (padrão do N8N)
+    - filesystem: PVC próprio; não suportado em queue mode (sem volume compartilhado)
+    - s3: bucket S3 com as credenciais aws-access-key/aws-secret-key
+      (external storage, recurso do plano Enterprise do N8N)
+    """
+
+    mode: Literal["default", "filesystem", "s3"] = "default"
+    # filesystem
+    volume_size: str = "10Gi"
+    storage_class: Optional[str] = None
+    # s3 (AWS_BUCKET)
+    bucket: Optional[str] = None
+    region: str = "us-east-1"
+
 
 class N8NConfig(BaseModel):
     name: str = "n8n"
@@ -21,6 +89,19 @@ class N8NConfig(BaseModel):
         "requests": {"memory": "512Mi", "cpu": "250m"},
         "limits": {"memory": "1Gi", "cpu": "500m"},
     }
+    # Conexões com o Postgres por processo (DB_POSTGRESDB_POOL_SIZE);
+    # sem valor, vale o padrão do N8N (ver tools/db_budget.RUNTIME_POOL_DEFAULTS)
+    db_pool_size: Optional[int] = None
+    queue: N8NQueueConfig = N8NQueueConfig()
+    executions: N8NExecutionsConfig = N8NExecutionsConfig()
+    binary_data: N8NBinaryDataConfig = N8NBinaryDataConfig()
+
+    @property
+    def webhook_service(self) -> Optional[str]:
+        """Service dos processadores de webhook (apenas em queue mode)"""
+        if self.queue.enabled and self.queue.webhook_replicas > 0:
+            return f"{self.name}-webhook"
+        return None
 
 
 class N8NOrchestrator(pulumi.ComponentResource):
@@ -28,25 +109,74 @@ class N8NOrchestrator(pulumi.ComponentResource):
         self,
         name: str,
         config: N8NConfig,
+        logging_profile: Optional[LoggingProfile] = None,
         opts: Optional[pulumi.ResourceOptions] = None,
     ):
         super().__init__("custom:apps:N8NOrchestrator", name, {}, opts)
 
         self.config = config
+        self.logging_profile = logging_profile or LoggingProfile()
+        queue = config.queue
+        binary_data = config.binary_data
+
+        if binary_data.mode == "filesystem" and (queue.enabled or config.replicas > 1):
+            raise ValueError(
+                "binary_data.mode=filesystem exige uma única réplica sem queue mode; use s3"
+            )
+        if binary_data.mode == "s3" and not binary_data.bucket:
+            raise ValueError("binary_data.mode=s3 exige binary_data.bucket")
+
+        self.binary_data_volume = (
+            self._create_binary_data_volume()
+            if binary_data.mode == "filesystem"
+            else None
+        )
+
+        # ✅ Redis da fila (local quando não há um endereço externo)
+        self.redis = None
+        self.redis_address = queue.redis_address
+        if queue.enabled and not self.redis_address:
+            self.redis = Redis(
+                f"{config.name}-redis",
+                config=RedisConfig(name=f"{config.name}-redis", namespace=config.namespace),
+                opts=pulumi.ResourceOptions(parent=self),
+            )
+            self.redis_address = self.redis.address
 
         self.deployment = self._create_deployment()
-        self.service = self._create_service()
+        self.service = self._create_service(config.name)
+
+        # ✅ Workers e processadores de webhook
+        self.worker_deployment = None
+        self.worker_scaled_object = None
+        self.webhook_deployment = None
+        self.webhook_service = None
+        self.webhook_service_url = f"http://{config.name}:{config.service_port}"
+        if queue.enabled:
+            self.worker_deployment = self._create_deployment("worker")
+            if queue.worker_autoscaling:
+                self.worker_scaled_object = self._create_worker_scaled_object()
+            if config.webhook_service:
+                self.webhook_deployment = self._create_deployment("webhook")
+                self.webhook_service = self._create_service(config.webhook_service)
+                self.webhook_service_url = (
+                    f"http://{config.webhook_service}:{config.service_port}"
+                )
 
         self.register_outputs(
             {
                 "service_endpoint": f"{config.name}.{config.namespace}.svc.cluster.local",
                 "webhook_url": config.webhook_url,
+                "webhook_service_url": self.webhook_service_url,
                 "n8n_ui_url": f"http://{config.name}.{config.namespace}.svc.cluster.local:{config.service_port}",
             }
         )
 
-    def _create_deployment(self) -> k8s.apps.v1.Deployment:
-        """Deployment do N8N"""
+    def _process_name(self, role: str) -> str:
+        return self.config.name if role == "main" else f"{self.config.name}-{role}"
+
+    def _env_vars(self, role: str) -> List[k8s.core.v1.EnvVarArgs]:
+        """Variáveis de ambiente comuns aos processos do N8N"""
         env_vars = []
 
         # Variáveis de ambiente fixas
@@ -56,7 +186,7 @@ class N8NOrchestrator(pulumi.ComponentResource):
             "DB_POSTGRESDB_SSL_REJECT_UNAUTHORIZED": "false",
             "WEBHOOK_URL": self.config.webhook_url,
             "N8N_ENFORCE_SETTINGS_FILE_PERMISSIONS": "true",
-            "N8N_LOG_LEVEL": "debug",
+            "N8N_LOG_LEVEL": self.logging_profile.level_for("n8n"),
             "N8N_PROTOCOL": "http",
             "N8N_PORT": str(self.config.container_port),
             "N8N_HOST": "0.0.0.0",
@@ -68,6 +198,9 @@ class N8NOrchestrator(pulumi.ComponentResource):
             "N8N_SMTP_TLS": "true",
         }
 
+        if self.config.db_pool_size:
+            fixed_env_vars["DB_POSTGRESDB_POOL_SIZE"] = str(self.config.db_pool_size)
+
         for key, value in fixed_env_vars.items():
             env_vars.append(k8s.core.v1.EnvVarArgs(name=key, value=value))
 
@@ -103,36 +236,151 @@ class N8NOrchestrator(pulumi.ComponentResource):
                 )
             )
 
+        # Retenção das execuções
+        executions = self.config.executions
+        executions_env_vars = {
+            "EXECUTIONS_DATA_PRUNE": str(executions.prune).lower(),
+            "EXECUTIONS_DATA_MAX_AGE": str(executions.max_age_hours),
+            "EXECUTIONS_DATA_PRUNE_MAX_COUNT": str(executions.max_count),
+            "EXECUTIONS_DATA_SAVE_ON_SUCCESS": executions.save_on_success,
+            "EXECUTIONS_DATA_SAVE_ON_ERROR": executions.save_on_error,
+            "EXECUTIONS_DATA_SAVE_MANUAL_EXECUTIONS": str(executions.save_manual).lower(),
+            "EXECUTIONS_DATA_HARD_DELETE_BUFFER": str(executions.hard_delete_buffer_hours),
+        }
+        for key, value in executions_env_vars.items():
+            env_vars.append(k8s.core.v1.EnvVarArgs(name=key, value=value))
+
+        env_vars += self._binary_data_env_vars()
+
+        queue = self.config.queue
+        if queue.enabled:
+            redis_host, redis_port = self.redis_address.rsplit(":", 1)
+            queue_env_vars = {
+                "EXECUTIONS_MODE": "queue",
+                "QUEUE_BULL_REDIS_HOST": redis_host,
+                "QUEUE_BULL_REDIS_PORT": redis_port,
+                "QUEUE_HEALTH_CHECK_ACTIVE": "true",
+                "OFFLOAD_MANUAL_EXECUTIONS_TO_WORKERS": "true",
+            }
+            if role == "main" and queue.webhook_replicas > 0:
+                # Webhooks de produção ficam com os processadores de webhook
+                queue_env_vars["N8N_DISABLE_PRODUCTION_MAIN_PROCESS"] = "true"
+            for key, value in queue_env_vars.items():
+                env_vars.append(k8s.core.v1.EnvVarArgs(name=key, value=value))
+
+        # Chave compartilhada entre main, workers e webhooks: obrigatória em
+        # queue mode (load_env_secrets(n8n_queue_mode=True) cria o secret)
+        env_vars.append(
+            k8s.core.v1.EnvVarArgs(
+                name="N8N_ENCRYPTION_KEY",
+                value_from=k8s.core.v1.EnvVarSourceArgs(
+                    secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(
+                        name="n8n-encryption-key",
+                        key="N8N_ENCRYPTION_KEY",
+                        optional=None if queue.enabled else True,
+                    )
+                ),
+            )
+        )
+
+        return env_vars
+
+    def _binary_data_env_vars(self) -> List[k8s.core.v1.EnvVarArgs]:
+        """Modo de armazenamento dos dados binários"""
+        binary_data = self.config.binary_data
+        if binary_data.mode == "default":
+            return []
+
+        env_vars = [
+            k8s.core.v1.EnvVarArgs(
+                name="N8N_DEFAULT_BINARY_DATA_MODE", value=binary_data.mode
+            ),
+            k8s.core.v1.EnvVarArgs(
+                name="N8N_AVAILABLE_BINARY_DATA_MODES", value="filesystem,s3"
+            ),
+        ]
+        if binary_data.mode == "filesystem":
+            env_vars.append(
+                k8s.core.v1.EnvVarArgs(
+                    name="N8N_BINARY_DATA_STORAGE_PATH", value="/binary-data"
+                )
+            )
+        elif binary_data.mode == "s3":
+            s3_env_vars = {
+                "N8N_EXTERNAL_STORAGE_S3_HOST": f"s3.{binary_data.region}.amazonaws.com",
+                "N8N_EXTERNAL_STORAGE_S3_BUCKET_NAME": binary_data.bucket,
+                "N8N_EXTERNAL_STORAGE_S3_BUCKET_REGION": binary_data.region,
+            }
+            for key, value in s3_env_vars.items():
+                env_vars.append(k8s.core.v1.EnvVarArgs(name=key, value=value))
+            for env_name, secret_name, secret_key in [
+                ("N8N_EXTERNAL_STORAGE_S3_ACCESS_KEY", "aws-access-key", "AWS_ACCESS_KEY"),
+                ("N8N_EXTERNAL_STORAGE_S3_ACCESS_SECRET", "aws-secret-key", "AWS_SECRET_KEY"),
+            ]:
+                env_vars.append(
+                    k8s.core.v1.EnvVarArgs(
+                        name=env_name,
+                        value_from=k8s.core.v1.EnvVarSourceArgs(
+                            secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(
+                                name=secret_name, key=secret_key
+                            )
+                        ),
+                    )
+                )
+        return env_vars
+
+    def _create_deployment(self, role: str = "main") -> k8s.apps.v1.Deployment:
+        """Deployment do N8N (main, worker ou webhook)"""
+        name = self._process_name(role)
+        queue = self.config.queue
+        replicas, resources, args = {
+            "main": (self.config.replicas, self.config.resources, None),
+            "worker": (
+                None if queue.worker_autoscaling else queue.worker_replicas,
+                queue.worker_resources,
+                ["worker", f"--concurrency={queue.worker_concurrency}"],
+            ),
+            "webhook": (queue.webhook_replicas, queue.webhook_resources, ["webhook"]),
+        }[role]
+
         return k8s.apps.v1.Deployment(
-            f"{self.config.name}-deployment",
+            f"{name}-deployment",
             metadata=k8s.meta.v1.ObjectMetaArgs(
-                name=self.config.name,
+                name=name,
                 namespace=self.config.namespace,
-                labels={"app": self.config.name},
+                labels={"app": name},
             ),
             spec=k8s.apps.v1.DeploymentSpecArgs(
-                replicas=self.config.replicas,
+                # Com KEDA o número de workers é gerenciado pelo ScaledObject
+                replicas=replicas,
+                # O PVC ReadWriteOnce não pode ser montado por dois pods
+                strategy=(
+                    k8s.apps.v1.DeploymentStrategyArgs(type="Recreate")
+                    if self.binary_data_volume
+                    else None
+                ),
                 selector=k8s.meta.v1.LabelSelectorArgs(
-                    match_labels={"app": self.config.name}
+                    match_labels={"app": name}
                 ),
                 template=k8s.core.v1.PodTemplateSpecArgs(
                     metadata=k8s.meta.v1.ObjectMetaArgs(
-                        labels={"app": self.config.name}
+                        labels={"app": name}
                     ),
                     spec=k8s.core.v1.PodSpecArgs(
                         containers=[
                             k8s.core.v1.ContainerArgs(
                                 name="n8n",
                                 image=self.config.image,
+                                args=args,
                                 ports=[
                                     k8s.core.v1.ContainerPortArgs(
                                         container_port=self.config.container_port
                                     )
                                 ],
-                                env=env_vars,
+                                env=self._env_vars(role),
                                 resources=k8s.core.v1.ResourceRequirementsArgs(
-                                    requests=self.config.resources.get("requests", {}),
-                                    limits=self.config.resources.get("limits", {}),
+                                    requests=resources.get("requests", {}),
+                                    limits=resources.get("limits", {}),
                                 ),
                                 liveness_probe=k8s.core.v1.ProbeArgs(
                                     http_get=k8s.core.v1.HTTPGetActionArgs(
@@ -150,25 +398,65 @@ class N8NOrchestrator(pulumi.ComponentResource):
                                     initial_delay_seconds=60,
                                     period_seconds=15,
                                 ),
+                                volume_mounts=(
+                                    [
+                                        k8s.core.v1.VolumeMountArgs(
+                                            name="binary-data", mount_path="/binary-data"
+                                        )
+                                    ]
+                                    if self.binary_data_volume
+                                    else None
+                                ),
                             )
-                        ]
+                        ],
+                        volumes=(
+                            [
+                                k8s.core.v1.VolumeArgs(
+                                    name="binary-data",
+                                    persistent_volume_claim=k8s.core.v1.PersistentVolumeClaimVolumeSourceArgs(
+                                        claim_name=self.binary_data_volume.metadata["name"]
+                                    ),
+                                )
+                            ]
+                            if self.binary_data_volume
+                            else None
+                        ),
                     ),
                 ),
             ),
             opts=pulumi.ResourceOptions(parent=self),
         )
 
-    def _create_service(self) -> k8s.core.v1.Service:
-        """Service para o N8N"""
-        return k8s.core.v1.Service(
-            f"{self.config.name}-service",
+    def _create_binary_data_volume(self) -> k8s.core.v1.PersistentVolumeClaim:
+        """PVC dos dados binários (binary_data.mode=filesystem)"""
+        return k8s.core.v1.PersistentVolumeClaim(
+            f"{self.config.name}-binary-data",
             metadata=k8s.meta.v1.ObjectMetaArgs(
-                name=self.config.name,
+                name=f"{self.config.name}-binary-data",
                 namespace=self.config.namespace,
                 labels={"app": self.config.name},
             ),
+            spec=k8s.core.v1.PersistentVolumeClaimSpecArgs(
+                access_modes=["ReadWriteOnce"],
+                storage_class_name=self.config.binary_data.storage_class,
+                resources=k8s.core.v1.VolumeResourceRequirementsArgs(
+                    requests={"storage": self.config.binary_data.volume_size}
+                ),
+            ),
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+
+    def _create_service(self, name: str) -> k8s.core.v1.Service:
+        """Service para o N8N (main ou webhook)"""
+        return k8s.core.v1.Service(
+            f"{name}-service",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=name,
+                namespace=self.config.namespace,
+                labels={"app": name},
+            ),
             spec=k8s.core.v1.ServiceSpecArgs(
-                selector={"app": self.config.name},
+                selector={"app": name},
                 ports=[
                     k8s.core.v1.ServicePortArgs(
                         port=self.config.service_port,
@@ -179,3 +467,43 @@ class N8NOrchestrator(pulumi.ComponentResource):
             ),
             opts=pulumi.ResourceOptions(parent=self),
         )
+
+    def _create_worker_scaled_object(self) -> k8s.apiextensions.CustomResource:
+        """ScaledObject (KEDA) dos workers pelo tamanho da fila de execuções"""
+        name = self._process_name("worker")
+        queue = self.config.queue
+        # O operador do KEDA roda em outro namespace: usa o nome completo
+        redis_host, redis_port = self.redis_address.rsplit(":", 1)
+        if "." not in redis_host:
+            redis_host = f"{redis_host}.{self.config.namespace}.svc.cluster.local"
+        return k8s.apiextensions.CustomResource(
+            f"{name}-scaled-object",
+            api_version="keda.sh/v1alpha1",
+            kind="ScaledObject",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=name,
+                namespace=self.config.namespace,
+                labels={"app": name},
+            ),
+            spec={
+                "scaleTargetRef": {"name": name},
+                "minReplicaCount": queue.worker_autoscaling.min_replicas,
+                "maxReplicaCount": queue.worker_autoscaling.max_replicas,
+                "pollingInterval": 15,
+                "cooldownPeriod": 120,
+                "triggers": [
+                    {
+                        "type": "redis",
+                        "metadata": {
+                            "address": f"{redis_host}:{redis_port}",
+                            # Execuções aguardando um worker (Bull)
+                            "listName": "bull:jobs:wait",
+                            "listLength": str(queue.queue_length_target),
+                        },
+                    }
+                ],
+            },
+            opts=pulumi.ResourceOptions(
+                parent=self, depends_on=[self.worker_deployment]
+            ),
+        )
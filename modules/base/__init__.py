@@ -1 +1,6 @@
 from .namespaces import create_namespace
+from .autoscaling import (
+    AutoscalingConfig,
+    create_hpa,
+    create_pod_disruption_budget,
+)
@@ -0,0 +1,95 @@
+from typing import Dict, Optional
+from pydantic import BaseModel
+import pulumi
+import pulumi_kubernetes as k8s
+
+
+class AutoscalingConfig(BaseModel):
+    min_replicas: int = 1
+    max_replicas: int = 3
+    cpu_utilization: int = 70
+    memory_utilization: Optional[int] = None
+
+
+def create_hpa(
+    name: str,
+    namespace: str,
+    target_name: str,
+    config: AutoscalingConfig,
+    labels: Optional[Dict[str, str]] = None,
+    target_kind: str = "Deployment",
+    opts: Optional[pulumi.ResourceOptions] = None,
+) -> k8s.autoscaling.v2.HorizontalPodAutoscaler:
+    """
+    Cria um HorizontalPodAutoscaler (autoscaling/v2) baseado em CPU/memória.
+
+    Args:
+        name: Nome do recurso HPA
+        namespace: Namespace Kubernetes
+        target_name: Nome do workload escalado
+        config: Limites e metas de utilização
+    """
+    metrics = [
+        k8s.autoscaling.v2.MetricSpecArgs(
+            type="Resource",
+            resource=k8s.autoscaling.v2.ResourceMetricSourceArgs(
+                name="cpu",
+                target=k8s.autoscaling.v2.MetricTargetArgs(
+                    type="Utilization",
+                    average_utilization=config.cpu_utilization,
+                ),
+            ),
+        )
+    ]
+    if config.memory_utilization:
+        metrics.append(
+            k8s.autoscaling.v2.MetricSpecArgs(
+                type="Resource",
+                resource=k8s.autoscaling.v2.ResourceMetricSourceArgs(
+                    name="memory",
+                    target=k8s.autoscaling.v2.MetricTargetArgs(
+                        type="Utilization",
+                        average_utilization=config.memory_utilization,
+                    ),
+                ),
+            )
+        )
+
+    return k8s.autoscaling.v2.HorizontalPodAutoscaler(
+        f"{name}-hpa",
+        metadata=k8s.meta.v1.ObjectMetaArgs(
+            name=name, namespace=namespace, labels=labels
+        ),
+        spec=k8s.autoscaling.v2.HorizontalPodAutoscalerSpecArgs(
+            scale_target_ref=k8s.autoscaling.v2.CrossVersionObjectReferenceArgs(
+                api_version="apps/v1", kind=target_kind, name=target_name
+            ),
+            min_replicas=config.min_replicas,
+            max_replicas=config.max_replicas,
+            metrics=metrics,
+        ),
+        opts=opts,
+    )
+
+
+def create_pod_disruption_budget(
+    name: str,
+    namespace: str,
+    match_labels: Dict[str, str],
+    min_available: int = 1,
+    opts: Optional[pulumi.ResourceOptions] = None,
+) -> k8s.policy.v1.PodDisruptionBudget:
+    """
+    Cria um PodDisruptionBudget garantindo réplicas mínimas durante drains.
+    """
+    return k8s.policy.v1.PodDisruptionBudget(
+        f"{name}-pdb",
+        metadata=k8s.meta.v1.ObjectMetaArgs(
+            name=name, namespace=namespace, labels=match_labels
+        ),
+        spec=k8s.policy.v1.PodDisruptionBudgetSpecArgs(
+            min_available=min_available,
+            selector=k8s.meta.v1.LabelSelectorArgs(match_labels=match_labels),
+        ),
+        opts=opts,
+    )
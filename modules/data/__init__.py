@@ -0,0 +1,2 @@
+from .redis import Redis, RedisConfig
+from .pgbouncer import PgBouncer, PgBouncerConfig, PgBouncerPoolConfig
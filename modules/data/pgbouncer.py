@@ -0,0 +1,268 @@
+from typing import Dict, List, Optional, Any
+from urllib.parse import parse_qsl, urlencode, urlparse
+from pydantic import BaseModel
+import pulumi
+import pulumi_kubernetes as k8s
+
+from modules.base import create_pod_disruption_budget
+
+
+# Parâmetros de TLS do cliente: o PgBouncer não tem TLS do lado do cliente
+# configurado (o TLS é só com o Postgres, ver server_tls_sslmode)
+CLIENT_TLS_PARAMS = {"sslmode", "sslrootcert", "sslcert", "sslkey", "sslcrl", "sslpassword"}
+
+
+def pooled_database_url(url: str, host: str, alias: str) -> str:
+    """
+    URL do banco reescrita para o pooler: mesmas credenciais (quando houver),
+    host do PgBouncer, alias como banco e sem TLS entre o cliente e o pooler.
+    """
+    parsed = urlparse(url)
+    credentials = parsed.netloc.rsplit("@", 1)[0] + "@" if "@" in parsed.netloc else ""
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key not in CLIENT_TLS_PARAMS
+    ] + [("sslmode", "disable")]
+    return parsed._replace(
+        netloc=f"{credentials}{host}", path=f"/{alias}", query=urlencode(query)
+    ).geturl()
+
+
+class PgBouncerPoolConfig(BaseModel):
+    """
+    Database (alias) exposto pelo PgBouncer.
+
+    Cada cliente escolhe o modo pelo nome do banco na URL:
+    - transaction: a conexão com o Postgres volta ao pool ao fim de cada
+      transação (APIs, workers); não mantém estado de sessão
+    - session: uma conexão por cliente enquanto ele estiver conectado
+      (migrations, advisory locks, LISTEN/NOTIFY)
+    """
+
+    name: str
+    mode: str = "transaction"  # transaction, session
+    pool_size: int = 20
+
+
+class PgBouncerConfig(BaseModel):
+    name: str = "pgbouncer"
+    namespace: str
+    # Tag fixa: max_prepared_statements exige PgBouncer >= 1.21
+    image: str = "edoburu/pgbouncer:v1.23.1-p2"
+    replicas: int = 2
+    port: int = 5432
+    pools: List[PgBouncerPoolConfig] = [
+        PgBouncerPoolConfig(name="bonde", mode="transaction"),
+        PgBouncerPoolConfig(name="bonde_session", mode="session", pool_size=5),
+    ]
+    # Conexões de clientes aceitas por réplica (baratas, não chegam ao Postgres)
+    max_client_conn: int = 1000
+    # Prepared statements do protocolo em modo transaction (PgBouncer >= 1.21)
+    max_prepared_statements: int = 100
+    server_idle_timeout: int = 60  # segundos
+    server_tls_sslmode: str = "prefer"
+    resources: Dict[str, Any] = {
+        "requests": {"memory": "32Mi", "cpu": "50m"},
+        "limits": {"memory": "128Mi", "cpu": "250m"},
+    }
+
+
+class PgBouncer(pulumi.ComponentResource):
+    """
+    PgBouncer na frente do banco compartilhado do bonde.
+
+    As réplicas da aplicação abrem conexões com o pooler, que mantém no
+    máximo `pool_size` conexões com o Postgres por alias e por réplica do
+    PgBouncer, independente de quantas réplicas da aplicação existam.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: PgBouncerConfig,
+        database_url: pulumi.Input[str],
+        opts: Optional[pulumi.ResourceOptions] = None,
+    ):
+        super().__init__("custom:data:PgBouncer", name, {}, opts)
+
+        self.config = config
+        database_url = pulumi.Output.secret(database_url)
+
+        self.secret = self._create_secret(database_url)
+        self.deployment = self._create_deployment()
+        self.service = self._create_service()
+        self.pdb = (
+            create_pod_disruption_budget(
+                config.name,
+                config.namespace,
+                match_labels={"app": config.name},
+                min_available=1,
+                opts=pulumi.ResourceOptions(parent=self),
+            )
+            if config.replicas > 1
+            else None
+        )
+
+        # URLs do pooler por alias, com as credenciais do banco original
+        host = f"{config.name}.{config.namespace}.svc.cluster.local:{config.port}"
+        self.database_urls: Dict[str, pulumi.Output[str]] = {
+            pool.name: pulumi.Output.secret(
+                database_url.apply(
+                    lambda url, alias=pool.name: pooled_database_url(url, host, alias)
+                )
+            )
+            for pool in config.pools
+        }
+
+        self.register_outputs(
+            {
+                "service_endpoint": host,
+                "pools": [pool.name for pool in config.pools],
+            }
+        )
+
+    def _pgbouncer_ini(self, url: str) -> str:
+        """pgbouncer.ini com um alias por pool apontando para o mesmo banco"""
+        parsed = urlparse(url)
+        database = parsed.path.lstrip("/") or "postgres"
+        lines = ["[databases]"]
+        for pool in self.config.pools:
+            lines.append(
+                f"{pool.name} = host={parsed.hostname} port={parsed.port or 5432} "
+                f"dbname={database} pool_mode={pool.mode} pool_size={pool.pool_size}"
+            )
+        lines += [
+            "",
+            "[pgbouncer]",
+            "listen_addr = 0.0.0.0",
+            f"listen_port = {self.config.port}",
+            "auth_type = scram-sha-256",
+            "auth_file = /etc/pgbouncer/userlist.txt",
+            f"max_client_conn = {self.config.max_client_conn}",
+            f"max_prepared_statements = {self.config.max_prepared_statements}",
+            f"server_idle_timeout = {self.config.server_idle_timeout}",
+            f"server_tls_sslmode = {self.config.server_tls_sslmode}",
+            "ignore_startup_parameters = extra_float_digits",
+            "",
+        ]
+        return "\n".join(lines)
+
+    def _create_secret(self, database_url: pulumi.Output[str]) -> k8s.core.v1.Secret:
+        """Configuração e credenciais do PgBouncer, geradas a partir da URL do banco"""
+        return k8s.core.v1.Secret(
+            f"{self.config.name}-secret",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=f"{self.config.name}-config",
+                namespace=self.config.namespace,
+                labels={"app": self.config.name},
+            ),
+            string_data={
+                "pgbouncer.ini": database_url.apply(self._pgbouncer_ini),
+                # URL sem credenciais: userlist vazio (sem usuário para o auth_file)
+                "userlist.txt": database_url.apply(
+                    lambda url: f'"{urlparse(url).username}" "{urlparse(url).password or ""}"\n'
+                    if urlparse(url).username
+                    else ""
+                ),
+            },
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+
+    def _create_deployment(self) -> k8s.apps.v1.Deployment:
+        """Deployment do PgBouncer"""
+        return k8s.apps.v1.Deployment(
+            f"{self.config.name}-deployment",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.config.name,
+                namespace=self.config.namespace,
+                labels={"app": self.config.name},
+            ),
+            spec=k8s.apps.v1.DeploymentSpecArgs(
+                replicas=self.config.replicas,
+                selector=k8s.meta.v1.LabelSelectorArgs(
+                    match_labels={"app": self.config.name}
+                ),
+                template=k8s.core.v1.PodTemplateSpecArgs(
+                    metadata=k8s.meta.v1.ObjectMetaArgs(
+                        labels={"app": self.config.name},
+                        # ✅ Rolling update quando a configuração mudar
+                        annotations={
+                            "config/revision": self.secret.metadata["resource_version"]
+                        },
+                    ),
+                    spec=k8s.core.v1.PodSpecArgs(
+                        containers=[
+                            k8s.core.v1.ContainerArgs(
+                                name="pgbouncer",
+                                image=self.config.image,
+                                ports=[
+                                    k8s.core.v1.ContainerPortArgs(
+                                        container_port=self.config.port,
+                                        name="postgres",
+                                    )
+                                ],
+                                volume_mounts=[
+                                    k8s.core.v1.VolumeMountArgs(
+                                        name="pgbouncer-config",
+                                        mount_path="/etc/pgbouncer",
+                                        read_only=True,
+                                    )
+                                ],
+                                resources=k8s.core.v1.ResourceRequirementsArgs(
+                                    requests=self.config.resources.get("requests", {}),
+                                    limits=self.config.resources.get("limits", {}),
+                                ),
+                                readiness_probe=k8s.core.v1.ProbeArgs(
+                                    tcp_socket=k8s.core.v1.TCPSocketActionArgs(
+                                        port=self.config.port
+                                    ),
+                                    initial_delay_seconds=5,
+                                    period_seconds=10,
+                                ),
+                                # Fecha as conexões dos clientes com calma ao sair
+                                lifecycle=k8s.core.v1.LifecycleArgs(
+                                    pre_stop=k8s.core.v1.LifecycleHandlerArgs(
+                                        exec_=k8s.core.v1.ExecActionArgs(
+                                            command=["sh", "-c", "sleep 10"]
+                                        )
+                                    )
+                                ),
+                            )
+                        ],
+                        volumes=[
+                            k8s.core.v1.VolumeArgs(
+                                name="pgbouncer-config",
+                                secret=k8s.core.v1.SecretVolumeSourceArgs(
+                                    secret_name=self.secret.metadata["name"]
+                                ),
+                            )
+                        ],
+                    ),
+                ),
+            ),
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+
+    def _create_service(self) -> k8s.core.v1.Service:
+        """Service para o PgBouncer"""
+        return k8s.core.v1.Service(
+            f"{self.config.name}-service",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.config.name,
+                namespace=self.config.namespace,
+                labels={"app": self.config.name},
+            ),
+            spec=k8s.core.v1.ServiceSpecArgs(
+                selector={"app": self.config.name},
+                ports=[
+                    k8s.core.v1.ServicePortArgs(
+                        port=self.config.port,
+                        target_port=self.config.port,
+                        name="postgres",
+                    )
+                ],
+                type="ClusterIP",
+            ),
+            opts=pulumi.ResourceOptions(parent=self),
+        )
@@ -0,0 +1,150 @@
+from typing import Dict, Optional, Any
+from pydantic import BaseModel
+import pulumi
+import pulumi_kubernetes as k8s
+
+
+class RedisConfig(BaseModel):
+    name: str = "redis"
+    namespace: str
+    image: str = "redis:7-alpine"
+    port: int = 6379
+    # Política de memória do Redis (ex.: "256mb", "allkeys-lru")
+    max_memory: Optional[str] = None
+    max_memory_policy: str = "noeviction"
+    append_only: bool = True
+    resources: Dict[str, Any] = {
+        "requests": {"memory": "64Mi", "cpu": "50m"},
+        "limits": {"memory": "256Mi", "cpu": "200m"},
+    }
+
+
+class Redis(pulumi.ComponentResource):
+    """
+    Redis single-node dentro do cluster.
+
+    Serve como stand-in local (sandbox/testes) para um Redis gerenciado
+    (ex.: ElastiCache). Em produção basta apontar os consumidores para o
+    endpoint gerenciado e não criar este componente.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: RedisConfig,
+        opts: Optional[pulumi.ResourceOptions] = None,
+    ):
+        super().__init__("custom:data:Redis", name, {}, opts)
+
+        self.config = config
+
+        self.deployment = self._create_deployment()
+        self.service = self._create_service()
+
+        self.address = f"{config.name}:{config.port}"
+
+        self.register_outputs(
+            {
+                "service_endpoint": f"{config.name}.{config.namespace}.svc.cluster.local",
+                "address": self.address,
+            }
+        )
+
+    def _create_deployment(self) -> k8s.apps.v1.Deployment:
+        """Deployment do Redis"""
+        args = [
+            "redis-server",
+            "--port",
+            str(self.config.port),
+            "--appendonly",
+            "yes" if self.config.append_only else "no",
+            "--maxmemory-policy",
+            self.config.max_memory_policy,
+        ]
+        if self.config.max_memory:
+            args += ["--maxmemory", self.config.max_memory]
+
+        return k8s.apps.v1.Deployment(
+            f"{self.config.name}-deployment",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.config.name,
+                namespace=self.config.namespace,
+                labels={"app": self.config.name},
+            ),
+            spec=k8s.apps.v1.DeploymentSpecArgs(
+                replicas=1,
+                strategy=k8s.apps.v1.DeploymentStrategyArgs(type="Recreate"),
+                selector=k8s.meta.v1.LabelSelectorArgs(
+                    match_labels={"app": self.config.name}
+                ),
+                template=k8s.core.v1.PodTemplateSpecArgs(
+                    metadata=k8s.meta.v1.ObjectMetaArgs(
+                        labels={"app": self.config.name},
+                        # Réplica única em emptyDir: o scale down perderia os dados
+                        annotations={
+                            "cluster-autoscaler.kubernetes.io/safe-to-evict": "false"
+                        },
+                    ),
+                    spec=k8s.core.v1.PodSpecArgs(
+                        containers=[
+                            k8s.core.v1.ContainerArgs(
+                                name="redis",
+                                image=self.config.image,
+                                args=args,
+                                ports=[
+                                    k8s.core.v1.ContainerPortArgs(
+                                        container_port=self.config.port, name="redis"
+                                    )
+                                ],
+                                volume_mounts=[
+                                    k8s.core.v1.VolumeMountArgs(
+                                        name="redis-data", mount_path="/data"
+                                    )
+                                ],
+                                resources=k8s.core.v1.ResourceRequirementsArgs(
+                                    requests=self.config.resources.get("requests", {}),
+                                    limits=self.config.resources.get("limits", {}),
+                                ),
+                                readiness_probe=k8s.core.v1.ProbeArgs(
+                                    exec_=k8s.core.v1.ExecActionArgs(
+                                        command=["redis-cli", "-p", str(self.config.port), "ping"]
+                                    ),
+                                    initial_delay_seconds=5,
+                                    period_seconds=10,
+                                ),
+                            )
+                        ],
+                        volumes=[
+                            k8s.core.v1.VolumeArgs(
+                                name="redis-data",
+                                empty_dir=k8s.core.v1.EmptyDirVolumeSourceArgs(),
+                            )
+                        ],
+                    ),
+                ),
+            ),
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+
+    def _create_service(self) -> k8s.core.v1.Service:
+        """Service para o Redis"""
+        return k8s.core.v1.Service(
+            f"{self.config.name}-service",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.config.name,
+                namespace=self.config.namespace,
+                labels={"app": self.config.name},
+            ),
+            spec=k8s.core.v1.ServiceSpecArgs(
+                selector={"app": self.config.name},
+                ports=[
+                    k8s.core.v1.ServicePortArgs(
+                        port=self.config.port,
+                        target_port=self.config.port,
+                        name="redis",
+                    )
+                ],
+                type="ClusterIP",
+            ),
+            opts=pulumi.ResourceOptions(parent=self),
+        )
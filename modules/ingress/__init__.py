@@ -1,2 +1,23 @@
-from .caddy import create_caddy
-from .on_demand import create_on_demand_service
+from .caddy import (
+    create_caddy,
+    CaddyConfig,
+    CaddyLoadBalancerConfig,
+    CaddyMetricsConfig,
+    CaddyStorageConfig,
+    CaddyTenantsConfig,
+)
+from .routes import (
+    CaddyRouteConfig,
+    CaddyCacheConfig,
+    CaddyLoadBalancingConfig,
+    CaddyTransportConfig,
+    CaddyCanaryConfig,
+    CaddyRateLimitConfig,
+    CaddyPathRouteConfig,
+)
+from .on_demand import (
+    create_on_demand_service,
+    OnDemandConfig,
+    OnDemandCacheConfig,
+    OnDemandWarmupConfig,
+)
@@ -1,12 +1,171 @@
+import hashlib
+import json
 import pulumi
 import pulumi_aws as aws
 import pulumi_kubernetes as k8s
 import os
+from typing import Dict, List, Optional, Any
+from pydantic import BaseModel
+
+from modules.base import (
+    AutoscalingConfig,
+    create_hpa,
+    create_pod_disruption_budget,
+)
+from .routes import (
+    CaddyPathRouteConfig,
+    CaddyRouteConfig,
+    apply_route_options,
+    insert_path_routes,
+)
+from .dashboards import caddy_dashboard
+from .tenants import (
+    TENANT_ROUTES_ID,
+    build_tenant_route,
+    insert_tenant_route,
+    tenants_path,
+)
+from modules.observability import LoggingProfile, SloConfig, create_slo_rule
+
+
+class CaddyStorageConfig(BaseModel):
+    """
+    Storage de certificados do Caddy (certmagic).
+
+    - file_system: padrão do Caddy, em /data (emptyDir, perdido a cada restart)
+    - redis: módulo github.com/pberkel/caddy-storage-redis
+    - s3: módulo github.com/ss098/certmagic-s3
+
+    Os módulos redis/s3 exigem uma imagem do Caddy compilada com os plugins
+    (ver config/caddy/Dockerfile).
+    """
+
+    module: str = "file_system"  # file_system, redis, s3
+    # Redis
+    address: List[str] = []  # ["host:port"]
+    db: int = 0
+    key_prefix: str = "caddy"
+    # Secret com a chave CADDY_STORAGE_PASSWORD (opcional)
+    password_secret: Optional[str] = None
+    # S3
+    host: str = "s3.amazonaws.com"
+    bucket: Optional[str] = None
+    prefix: str = "caddy"
+
+
+class CaddyLoadBalancerConfig(BaseModel):
+    """
+    NLB na frente do Caddy.
+
+    - instance: NLB in-tree (annotations legadas), targets nos nodes via NodePort
+    - ip: aws-load-balancer-controller, targets diretamente nos IPs dos pods
+
+    Com `proxy_protocol` o NLB envia o PROXY protocol v2 e o Caddy usa o
+    listener wrapper `proxy_protocol` para recuperar o IP do cliente.
+    Sem proxy protocol, `preserve_client_ip` mantém o IP de origem nos
+    targets IP (necessário com HTTP/3, já que o NLB não suporta PROXY
+    protocol em target groups UDP/TCP_UDP).
+    Para os pod readiness gates o namespace precisa do label
+    `elbv2.k8s.aws/pod-readiness-gate-inject: enabled` (ver `namespace_labels`).
+    Trocar o target_type recria o NLB.
+    """
+
+    target_type: str = "instance"  # instance, ip
+    proxy_protocol: bool = False
+    # Origens confiáveis para o cabeçalho PROXY (CIDR da VPC)
+    proxy_protocol_allow: List[str] = ["10.0.0.0/16"]
+    preserve_client_ip: bool = False
+    readiness_gates: bool = True
+
+    @property
+    def namespace_labels(self) -> Dict[str, str]:
+        """Labels necessários no namespace do Caddy"""
+        if self.target_type == "ip" and self.readiness_gates:
+            return {"elbv2.k8s.aws/pod-readiness-gate-inject": "enabled"}
+        return {}
+
+
+class CaddyMetricsConfig(BaseModel):
+    """
+    Métricas Prometheus do Caddy.
+
+    As métricas são servidas por um servidor HTTP dedicado (handler
+    `metrics`) em vez da API admin, que continua restrita ao localhost.
+    """
+
+    enabled: bool = False
+    port: int = 9180
+    # Label `host` em todas as métricas caddy_http_*
+    per_host: bool = True
+    # Requer os CRDs do prometheus-operator
+    service_monitor: bool = False
+    scrape_interval: str = "30s"
+    # ConfigMap com o dashboard (sidecar do Grafana, label grafana_dashboard)
+    dashboard: bool = True
+
+
+class CaddyTenantsConfig(BaseModel):
+    """
+    Shard de rotas dos domínios customizados dos tenants.
+
+    Gerado por `python -m tools.tenant_routes <ambiente>` em
+    config/caddy/tenants-<ambiente>.json. Fica em um ConfigMap próprio e um
+    sidecar aplica as mudanças via API admin (PATCH /id/tenant-routes),
+    sem rolling update do Caddy.
+    """
+
+    enabled: bool = False
+    reloader_image: str = "curlimages/curl:8.10.1"
+    reload_interval_seconds: int = 30
+
+
+class CaddyConfig(BaseModel):
+    image: str = "caddy:2-alpine"
+    # Deployment ou DaemonSet (um Caddy por node do pool de borda)
+    kind: str = "Deployment"
+    replicas: int = 1
+    node_selector: Dict[str, str] = {}
+    tolerations: List[Dict[str, Any]] = []
+    load_balancer: CaddyLoadBalancerConfig = CaddyLoadBalancerConfig()
+    # HTTP/3 (QUIC): UDP 443 no Service e h3 nos protocols do servidor.
+    # O próprio Caddy anuncia o h3 via header Alt-Svc nas respostas HTTPS.
+    http3: bool = False
+    storage: CaddyStorageConfig = CaddyStorageConfig()
+    # PodDisruptionBudget (apenas quando há mais de uma réplica)
+    min_available: Optional[int] = None
+    autoscaling: Optional[AutoscalingConfig] = None
+    metrics: CaddyMetricsConfig = CaddyMetricsConfig()
+    # SLO da borda (servidor https); requer metrics.service_monitor
+    slo: Optional[SloConfig] = None
+    tenants: CaddyTenantsConfig = CaddyTenantsConfig()
+    # Encerramento: o preStop aguarda o NLB remover o pod e o grace_period
+    # drena as conexões abertas antes do Caddy sair
+    pre_stop_seconds: int = 15
+    grace_period_seconds: int = 30
+    # Opções por serviço de destino (compressão, cache-control, cache de borda)
+    routes: Dict[str, CaddyRouteConfig] = {}
+    # Rotas por host e path geradas pelo stack (ex.: webhooks do N8N)
+    path_routes: List[CaddyPathRouteConfig] = []
+    resources: Dict[str, Any] = {
+        "requests": {"memory": "64Mi", "cpu": "50m"},
+        "limits": {"memory": "128Mi", "cpu": "100m"},
+    }
+
+
+def _is_loopback_server(server: Dict[str, Any]) -> bool:
+    """Servidores internos do Caddy (ex.: canary), fora do NLB"""
+    return all(
+        address.startswith("127.0.0.1:") for address in server.get("listen", [])
+    )
 
 
 class CaddyStack(pulumi.ComponentResource):
     """
     CaddyStack implementa o Caddy como proxy reverso multi-tenant com LoadBalancer automático.
+
+    Com storage compartilhado (redis/s3) os certificados ACME, incluindo os
+    on-demand dos tenants, sobrevivem a restarts e são compartilhados entre
+    réplicas, permitindo escalar horizontalmente (HPA + PDB).
     """
 
     def __init__(
@@ -15,11 +174,18 @@ class CaddyStack(pulumi.ComponentResource):
         namespace: str,
         k8s_provider,
         environment: str,
+        config: Optional[CaddyConfig] = None,
+        logging_profile: Optional[LoggingProfile] = None,
+        otlp_endpoint: Optional[str] = None,
         opts=None,
     ):
         super().__init__("custom:caddy:CaddyStack", name, None, opts)
 
         self.namespace = namespace
+        self.config = config or CaddyConfig()
+        self.logging_profile = logging_profile or LoggingProfile()
+        # Endpoint OTLP/gRPC do OtelCollector (handler tracing)
+        self.otlp_endpoint = otlp_endpoint
 
         # ✅ LER Caddyfile específico do ambiente
         caddyfile_path = os.path.join(
@@ -46,6 +212,28 @@ class CaddyStack(pulumi.ComponentResource):
                 f"⚠️  Caddyfile não encontrado, usando fallback: {caddyfile_path}"
             )
 
+        caddy_json = self._build_config(json.loads(caddyfile_content))
+        # A revisão ignora o shard dos tenants, recarregado sem rolling update
+        config_revision = hashlib.sha256(
+            json.dumps(caddy_json, indent=4).encode()
+        ).hexdigest()[:12]
+
+        # ✅ Shard de rotas dos tenants (ConfigMap próprio)
+        self.tenants_config_map = None
+        if self.config.tenants.enabled:
+            tenant_route = self._load_tenant_route(environment)
+            caddy_json = insert_tenant_route(caddy_json, tenant_route)
+            self.tenants_config_map = k8s.core.v1.ConfigMap(
+                f"{name}-tenants",
+                metadata=k8s.meta.v1.ObjectMetaArgs(
+                    name=f"{name}-tenants", namespace=namespace
+                ),
+                data={"tenants.json": json.dumps(tenant_route, indent=4)},
+                opts=pulumi.ResourceOptions(provider=k8s_provider, parent=self),
+            )
+
+        caddy_json_content = json.dumps(caddy_json, indent=4)
+
         self.config_map = k8s.core.v1.ConfigMap(
             f"{name}-config",
             metadata=k8s.meta.v1.ObjectMetaArgs(
@@ -53,97 +241,301 @@ class CaddyStack(pulumi.ComponentResource):
             ),
             data={
                 "Caddyfile": "",  # Pode manter vazio ou remover
-                "caddy.json": caddyfile_content,
+                "caddy.json": caddy_json_content,
             },
             opts=pulumi.ResourceOptions(provider=k8s_provider, parent=self),
         )
 
-        # Deployment
-        self.deployment = k8s.apps.v1.Deployment(
-            f"{name}-deployment",
-            metadata=k8s.meta.v1.ObjectMetaArgs(
-                name=name,
-                namespace=namespace,
-                labels={"app": "caddy", "component": "ingress"},
-            ),
-            spec=k8s.apps.v1.DeploymentSpecArgs(
-                replicas=1,
-                selector=k8s.meta.v1.LabelSelectorArgs(match_labels={"app": "caddy"}),
-                template=k8s.core.v1.PodTemplateSpecArgs(
-                    metadata=k8s.meta.v1.ObjectMetaArgs(
-                        labels={"app": "caddy"},
-                        # ✅ Annotation para rolling update quando ConfigMap mudar
-                        annotations={"config/revision": "1"},
+        # Variáveis de ambiente usadas por placeholders {env.*} no caddy.json
+        env_vars = []
+        storage = self.config.storage
+        if storage.password_secret:
+            env_vars.append(
+                k8s.core.v1.EnvVarArgs(
+                    name="CADDY_STORAGE_PASSWORD",
+                    value_from=k8s.core.v1.EnvVarSourceArgs(
+                        secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(
+                            name=storage.password_secret,
+                            key="CADDY_STORAGE_PASSWORD",
+                        )
                     ),
-                    spec=k8s.core.v1.PodSpecArgs(
-                        containers=[
-                            k8s.core.v1.ContainerArgs(
-                                name="caddy",
-                                image="caddy:2-alpine",
-                                args=[
-                                    "caddy",
-                                    "run",
-                                    "--config",
-                                    "/etc/caddy/caddy.json",  # ✅ Aponta para o JSON
-                                ],
-                                ports=[
-                                    k8s.core.v1.ContainerPortArgs(
-                                        container_port=80, name="http"
-                                    ),
-                                    k8s.core.v1.ContainerPortArgs(
-                                        container_port=443, name="https"
-                                    ),
-                                ],
-                                volume_mounts=[
-                                    k8s.core.v1.VolumeMountArgs(
-                                        name="caddy-config", mount_path="/etc/caddy"
-                                    ),
-                                    k8s.core.v1.VolumeMountArgs(
-                                        name="caddy-data", mount_path="/data"
-                                    ),
-                                ],
-                                resources=k8s.core.v1.ResourceRequirementsArgs(
-                                    requests={"memory": "64Mi", "cpu": "50m"},
-                                    limits={"memory": "128Mi", "cpu": "100m"},
-                                ),
+                )
+            )
+        if storage.module == "s3":
+            for env_name, secret_name in [
+                ("AWS_ACCESS_KEY", "aws-access-key"),
+                ("AWS_SECRET_KEY", "aws-secret-key"),
+            ]:
+                env_vars.append(
+                    k8s.core.v1.EnvVarArgs(
+                        name=env_name,
+                        value_from=k8s.core.v1.EnvVarSourceArgs(
+                            secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(
+                                name=secret_name, key=env_name
                             )
+                        ),
+                    )
+                )
+
+        # Exporter do handler tracing (OTLP/gRPC)
+        if self.otlp_endpoint:
+            for env_name, value in [
+                ("OTEL_EXPORTER_OTLP_ENDPOINT", self.otlp_endpoint),
+                ("OTEL_SERVICE_NAME", "caddy"),
+            ]:
+                env_vars.append(k8s.core.v1.EnvVarArgs(name=env_name, value=value))
+
+        pod_template = k8s.core.v1.PodTemplateSpecArgs(
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                labels={"app": "caddy"},
+                annotations={
+                    # ✅ Annotation para rolling update quando ConfigMap mudar
+                    "config/revision": config_revision,
+                    # /data (emptyDir) é descartável: os certificados ficam no
+                    # storage compartilhado, então o pod não impede o scale down
+                    "cluster-autoscaler.kubernetes.io/safe-to-evict": "true",
+                },
+            ),
+            spec=k8s.core.v1.PodSpecArgs(
+                node_selector=self.config.node_selector or None,
+                tolerations=self.config.tolerations or None,
+                termination_grace_period_seconds=self.config.pre_stop_seconds
+                + self.config.grace_period_seconds
+                + 10,
+                # Espalha as réplicas entre nodes
+                topology_spread_constraints=[
+                    k8s.core.v1.TopologySpreadConstraintArgs(
+                        max_skew=1,
+                        topology_key="kubernetes.io/hostname",
+                        when_unsatisfiable="ScheduleAnyway",
+                        label_selector=k8s.meta.v1.LabelSelectorArgs(
+                            match_labels={"app": "caddy"}
+                        ),
+                    )
+                ],
+                containers=[
+                    k8s.core.v1.ContainerArgs(
+                        name="caddy",
+                        image=self.config.image,
+                        args=[
+                            "caddy",
+                            "run",
+                            "--config",
+                            "/etc/caddy/caddy.json",  # ✅ Aponta para o JSON
                         ],
-                        volumes=[
-                            k8s.core.v1.VolumeArgs(
-                                name="caddy-config",
-                                config_map=k8s.core.v1.ConfigMapVolumeSourceArgs(
-                                    name=self.config_map.metadata["name"]
-                                ),
+                        env=env_vars,
+                        ports=[
+                            k8s.core.v1.ContainerPortArgs(
+                                container_port=80, name="http"
+                            ),
+                            k8s.core.v1.ContainerPortArgs(
+                                container_port=443, name="https"
+                            ),
+                        ]
+                        + (
+                            [
+                                k8s.core.v1.ContainerPortArgs(
+                                    container_port=443, protocol="UDP", name="h3"
+                                )
+                            ]
+                            if self.config.http3
+                            else []
+                        )
+                        + (
+                            [
+                                k8s.core.v1.ContainerPortArgs(
+                                    container_port=self.config.metrics.port,
+                                    name="metrics",
+                                )
+                            ]
+                            if self.config.metrics.enabled
+                            else []
+                        ),
+                        volume_mounts=[
+                            k8s.core.v1.VolumeMountArgs(
+                                name="caddy-config", mount_path="/etc/caddy"
                             ),
-                            k8s.core.v1.VolumeArgs(
-                                name="caddy-data",
-                                empty_dir=k8s.core.v1.EmptyDirVolumeSourceArgs(),
+                            k8s.core.v1.VolumeMountArgs(
+                                name="caddy-data", mount_path="/data"
                             ),
                         ],
+                        lifecycle=k8s.core.v1.LifecycleArgs(
+                            pre_stop=k8s.core.v1.LifecycleHandlerArgs(
+                                exec_=k8s.core.v1.ExecActionArgs(
+                                    command=[
+                                        "sleep",
+                                        str(self.config.pre_stop_seconds),
+                                    ]
+                                )
+                            )
+                        ),
+                        resources=k8s.core.v1.ResourceRequirementsArgs(
+                            requests=self.config.resources.get("requests", {}),
+                            limits=self.config.resources.get("limits", {}),
+                        ),
+                    )
+                ]
+                + self._tenants_reloader_containers(),
+                volumes=[
+                    k8s.core.v1.VolumeArgs(
+                        name="caddy-config",
+                        config_map=k8s.core.v1.ConfigMapVolumeSourceArgs(
+                            name=self.config_map.metadata["name"]
+                        ),
+                    ),
+                    k8s.core.v1.VolumeArgs(
+                        name="caddy-data",
+                        empty_dir=k8s.core.v1.EmptyDirVolumeSourceArgs(),
                     ),
+                ]
+                + (
+                    [
+                        k8s.core.v1.VolumeArgs(
+                            name="caddy-tenants",
+                            config_map=k8s.core.v1.ConfigMapVolumeSourceArgs(
+                                name=self.tenants_config_map.metadata["name"]
+                            ),
+                        )
+                    ]
+                    if self.tenants_config_map
+                    else []
                 ),
             ),
-            opts=pulumi.ResourceOptions(
-                provider=k8s_provider, parent=self, depends_on=[self.config_map]
-            ),
+        )
+
+        self.deployment = None
+        self.daemon_set = None
+        if self.config.kind == "DaemonSet":
+            # Um Caddy por node do pool de borda (node_selector/tolerations)
+            self.daemon_set = k8s.apps.v1.DaemonSet(
+                f"{name}-daemonset",
+                metadata=k8s.meta.v1.ObjectMetaArgs(
+                    name=name,
+                    namespace=namespace,
+                    labels={"app": "caddy", "component": "ingress"},
+                ),
+                spec=k8s.apps.v1.DaemonSetSpecArgs(
+                    selector=k8s.meta.v1.LabelSelectorArgs(
+                        match_labels={"app": "caddy"}
+                    ),
+                    update_strategy=k8s.apps.v1.DaemonSetUpdateStrategyArgs(
+                        type="RollingUpdate",
+                        rolling_update=k8s.apps.v1.RollingUpdateDaemonSetArgs(
+                            max_unavailable=1
+                        ),
+                    ),
+                    template=pod_template,
+                ),
+                opts=pulumi.ResourceOptions(
+                    provider=k8s_provider, parent=self, depends_on=[self.config_map]
+                ),
+            )
+        elif self.config.kind == "Deployment":
+            self.deployment = k8s.apps.v1.Deployment(
+                f"{name}-deployment",
+                metadata=k8s.meta.v1.ObjectMetaArgs(
+                    name=name,
+                    namespace=namespace,
+                    labels={"app": "caddy", "component": "ingress"},
+                ),
+                spec=k8s.apps.v1.DeploymentSpecArgs(
+                    # Com HPA o número de réplicas é gerenciado pelo autoscaler
+                    replicas=None if self.config.autoscaling else self.config.replicas,
+                    selector=k8s.meta.v1.LabelSelectorArgs(
+                        match_labels={"app": "caddy"}
+                    ),
+                    # Um pod por vez, sem reduzir a capacidade durante o rollout
+                    strategy=k8s.apps.v1.DeploymentStrategyArgs(
+                        type="RollingUpdate",
+                        rolling_update=k8s.apps.v1.RollingUpdateDeploymentArgs(
+                            max_surge=1, max_unavailable=0
+                        ),
+                    ),
+                    template=pod_template,
+                ),
+                opts=pulumi.ResourceOptions(
+                    provider=k8s_provider, parent=self, depends_on=[self.config_map]
+                ),
+            )
+        else:
+            raise ValueError(f"Tipo de workload do Caddy desconhecido: {self.config.kind}")
+        workload = self.deployment or self.daemon_set
+
+        # ✅ PDB e HPA para múltiplas réplicas
+        max_replicas = (
+            self.config.autoscaling.max_replicas
+            if self.config.autoscaling
+            else self.config.replicas
+        )
+        self.pdb = (
+            create_pod_disruption_budget(
+                name,
+                namespace,
+                match_labels={"app": "caddy"},
+                min_available=self.config.min_available,
+                opts=pulumi.ResourceOptions(provider=k8s_provider, parent=self),
+            )
+            if self.config.min_available and (self.daemon_set or max_replicas > 1)
+            else None
+        )
+        self.hpa = (
+            create_hpa(
+                name,
+                namespace,
+                target_name=name,
+                config=self.config.autoscaling,
+                labels={"app": "caddy"},
+                opts=pulumi.ResourceOptions(
+                    provider=k8s_provider, parent=self, depends_on=[workload]
+                ),
+            )
+            if self.config.autoscaling and self.deployment
+            else None
         )
 
         # ✅ SERVICE COM LOADBALANCER AUTOMÁTICO
+        lb = self.config.load_balancer
+        if lb.target_type == "ip":
+            # aws-load-balancer-controller: NLB registra os IPs dos pods
+            # diretamente, sem o hop extra via NodePort/kube-proxy
+            service_annotations = {
+                "service.beta.kubernetes.io/aws-load-balancer-nlb-target-type": "ip",
+                "service.beta.kubernetes.io/aws-load-balancer-scheme": "internet-facing",
+                "service.beta.kubernetes.io/aws-load-balancer-attributes": "load_balancing.cross_zone.enabled=true",
+            }
+            target_group_attributes = ["deregistration_delay.timeout_seconds=30"]
+            if lb.preserve_client_ip:
+                target_group_attributes.append("preserve_client_ip.enabled=true")
+            service_annotations[
+                "service.beta.kubernetes.io/aws-load-balancer-target-group-attributes"
+            ] = ",".join(target_group_attributes)
+            if lb.proxy_protocol:
+                service_annotations[
+                    "service.beta.kubernetes.io/aws-load-balancer-proxy-protocol"
+                ] = "*"
+            load_balancer_class = "service.k8s.aws/nlb"
+            external_traffic_policy = None
+        else:
+            service_annotations = {
+                "service.beta.kubernetes.io/aws-load-balancer-type": "nlb",  # ou "elb"
+                "service.beta.kubernetes.io/aws-load-balancer-scheme": "internet-facing",
+                "service.beta.kubernetes.io/aws-load-balancer-cross-zone-load-balancing-enabled": "true",
+            }
+            load_balancer_class = None
+            external_traffic_policy = "Local"
+
         self.service = k8s.core.v1.Service(
             f"{name}-service",
             metadata=k8s.meta.v1.ObjectMetaArgs(
                 name=name,
                 namespace=namespace,
                 labels={"app": "caddy", "environment": environment},
-                annotations={
-                    "service.beta.kubernetes.io/aws-load-balancer-type": "nlb",  # ou "elb"
-                    "service.beta.kubernetes.io/aws-load-balancer-scheme": "internet-facing",
-                    "service.beta.kubernetes.io/aws-load-balancer-cross-zone-load-balancing-enabled": "true",
-                },
+                annotations=service_annotations,
             ),
             spec=k8s.core.v1.ServiceSpecArgs(
                 type="LoadBalancer",  # ✅ LOADBALANCER AUTOMÁTICO
-                external_traffic_policy="Local",
+                load_balancer_class=load_balancer_class,
+                external_traffic_policy=external_traffic_policy,
                 selector={"app": "caddy"},
                 ports=[
                     k8s.core.v1.ServicePortArgs(
@@ -152,15 +544,57 @@ class CaddyStack(pulumi.ComponentResource):
                     k8s.core.v1.ServicePortArgs(
                         port=443, target_port=443, protocol="TCP", name="https"
                     ),
-                ],
+                ]
+                + (
+                    [
+                        k8s.core.v1.ServicePortArgs(
+                            port=443, target_port=443, protocol="UDP", name="h3"
+                        )
+                    ]
+                    if self.config.http3
+                    else []
+                ),
             ),
             opts=pulumi.ResourceOptions(
                 provider=k8s_provider,
                 parent=self,
-                depends_on=[self.deployment],  # ✅ Garantir que o deployment existe
+                depends_on=[workload],  # ✅ Garantir que o workload existe
             ),
         )
 
+        # ✅ Métricas: Service ClusterIP, ServiceMonitor e dashboard
+        self.metrics_service = None
+        self.service_monitor = None
+        self.dashboard = None
+        if self.config.metrics.enabled:
+            self._create_metrics_resources(name, namespace, k8s_provider, workload)
+
+        # ✅ SLO: recording rules e alertas de burn rate
+        self.slo_rule = None
+        if self.config.slo:
+            if not self.service_monitor:
+                raise ValueError("CaddyConfig.slo requer metrics.service_monitor")
+            slo = self.config.slo
+            if not slo.metric:
+                slo = slo.model_copy(update={"metric": "caddy_http_request_duration_seconds"})
+            self.slo_rule = create_slo_rule(
+                name,
+                namespace,
+                slo,
+                # O Caddy registra cada request uma vez por handler da cadeia
+                # (subroute, headers, encode, tracing...); só o reverse_proxy
+                # conta cada request uma vez. Respostas servidas pelo cache
+                # de borda ou pelo rate limit ficam fora do SLO
+                {
+                    "service": f"{name}-metrics",
+                    "server": "https",
+                    "handler": "reverse_proxy",
+                },
+                opts=pulumi.ResourceOptions(
+                    provider=k8s_provider, parent=self, depends_on=[self.service_monitor]
+                ),
+            )
+
         # ✅ URL do Load Balancer para export
         self.load_balancer_url = self.service.status.apply(
             lambda status: (
@@ -170,8 +604,246 @@ class CaddyStack(pulumi.ComponentResource):
             )
         )
 
+    def _load_tenant_route(self, environment: str) -> Dict[str, Any]:
+        """Lê o shard gerado pelo tools.tenant_routes (ou um shard vazio)"""
+        path = tenants_path(environment)
+        try:
+            with open(path, "r") as f:
+                tenant_route = json.load(f)
+            pulumi.log.info(f"✅ Rotas dos tenants carregadas: {path}")
+        except FileNotFoundError:
+            tenant_route = build_tenant_route([])
+            pulumi.log.warn(f"⚠️  Rotas dos tenants não encontradas: {path}")
+        return tenant_route
+
+    def _tenants_reloader_containers(self) -> List[k8s.core.v1.ContainerArgs]:
+        """Sidecar que aplica o shard dos tenants via API admin do Caddy"""
+        if not self.tenants_config_map:
+            return []
+
+        tenants = self.config.tenants
+        script = (
+            'last=""; while true; do '
+            "current=$(md5sum /etc/caddy-tenants/tenants.json | cut -d' ' -f1); "
+            'if [ "$current" != "$last" ] && curl -sf -X PATCH '
+            "-H 'Content-Type: application/json' "
+            "--data-binary @/etc/caddy-tenants/tenants.json "
+            f"http://127.0.0.1:2019/id/{TENANT_ROUTES_ID}; then last=$current; fi; "
+            f"sleep {tenants.reload_interval_seconds}; done"
+        )
+        return [
+            k8s.core.v1.ContainerArgs(
+                name="tenants-reloader",
+                image=tenants.reloader_image,
+                command=["sh", "-c", script],
+                volume_mounts=[
+                    k8s.core.v1.VolumeMountArgs(
+                        name="caddy-tenants", mount_path="/etc/caddy-tenants"
+                    )
+                ],
+                resources=k8s.core.v1.ResourceRequirementsArgs(
+                    requests={"memory": "8Mi", "cpu": "5m"},
+                    limits={"memory": "32Mi", "cpu": "50m"},
+                ),
+            )
+        ]
+
+    def _create_metrics_resources(self, name: str, namespace: str, k8s_provider, workload):
+        """Service de métricas, ServiceMonitor e dashboard do Grafana"""
+        metrics = self.config.metrics
+        metrics_labels = {"app": "caddy", "component": "metrics"}
 
-def create_caddy(name: str, namespace: str, k8s_provider, environment: str):
+        self.metrics_service = k8s.core.v1.Service(
+            f"{name}-metrics-service",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=f"{name}-metrics",
+                namespace=namespace,
+                labels=metrics_labels,
+            ),
+            spec=k8s.core.v1.ServiceSpecArgs(
+                type="ClusterIP",
+                selector={"app": "caddy"},
+                ports=[
+                    k8s.core.v1.ServicePortArgs(
+                        port=metrics.port,
+                        target_port=metrics.port,
+                        protocol="TCP",
+                        name="metrics",
+                    )
+                ],
+            ),
+            opts=pulumi.ResourceOptions(
+                provider=k8s_provider, parent=self, depends_on=[workload]
+            ),
+        )
+
+        if metrics.service_monitor:
+            self.service_monitor = k8s.apiextensions.CustomResource(
+                f"{name}-service-monitor",
+                api_version="monitoring.coreos.com/v1",
+                kind="ServiceMonitor",
+                metadata=k8s.meta.v1.ObjectMetaArgs(
+                    name=name, namespace=namespace, labels=metrics_labels
+                ),
+                spec={
+                    "selector": {"matchLabels": metrics_labels},
+                    "endpoints": [
+                        {
+                            "port": "metrics",
+                            "path": "/metrics",
+                            "interval": metrics.scrape_interval,
+                        }
+                    ],
+                },
+                opts=pulumi.ResourceOptions(
+                    provider=k8s_provider,
+                    parent=self,
+                    depends_on=[self.metrics_service],
+                ),
+            )
+
+        if metrics.dashboard:
+            self.dashboard = k8s.core.v1.ConfigMap(
+                f"{name}-dashboard",
+                metadata=k8s.meta.v1.ObjectMetaArgs(
+                    name=f"{name}-dashboard",
+                    namespace=namespace,
+                    labels={"grafana_dashboard": "1"},
+                ),
+                data={
+                    f"{name}-{namespace}.json": json.dumps(
+                        caddy_dashboard(namespace), indent=2
+                    )
+                },
+                opts=pulumi.ResourceOptions(provider=k8s_provider, parent=self),
+            )
+
+    def _build_config(self, caddy_json: Dict[str, Any]) -> Dict[str, Any]:
+        """Aplica as opções do CaddyConfig sobre o JSON base do ambiente"""
+        if self.config.path_routes:
+            caddy_json = insert_path_routes(caddy_json, self.config.path_routes)
+        caddy_json = apply_route_options(
+            caddy_json, self.config.routes, self.namespace
+        )
+
+        storage = self._storage_config()
+        if storage:
+            caddy_json["storage"] = storage
+
+        # Tempo para drenar requests e streams ao encerrar ou recarregar
+        caddy_json.setdefault("apps", {}).setdefault("http", {})["grace_period"] = (
+            f"{self.config.grace_period_seconds}s"
+        )
+
+        lb = self.config.load_balancer
+        servers = caddy_json.get("apps", {}).get("http", {}).get("servers", {})
+
+        if self.config.http3:
+            # O NLB in-tree não suporta Services com TCP e UDP na mesma porta
+            if lb.target_type != "ip":
+                raise ValueError("http3 requer load_balancer.target_type=ip")
+            if lb.proxy_protocol:
+                raise ValueError(
+                    "http3 não é compatível com proxy_protocol; use preserve_client_ip"
+                )
+            for server in servers.values():
+                if ":443" in server.get("listen", []):
+                    server["protocols"] = ["h1", "h2", "h3"]
+
+        if lb.proxy_protocol:
+            if lb.target_type != "ip":
+                raise ValueError("proxy_protocol requer load_balancer.target_type=ip")
+            for server in servers.values():
+                # Servidores de loopback (canary) não recebem tráfego do NLB
+                if _is_loopback_server(server):
+                    continue
+                # proxy_protocol precisa vir antes do tls
+                server["listener_wrappers"] = [
+                    {
+                        "wrapper": "proxy_protocol",
+                        "timeout": "5s",
+                        "allow": lb.proxy_protocol_allow,
+                    },
+                    {"wrapper": "tls"},
+                ]
+
+        # ✅ Logs pelo LoggingProfile do stack
+        caddy_json["logging"] = self.logging_profile.caddy_logging()
+        if self.logging_profile.access_log:
+            for server in servers.values():
+                if not _is_loopback_server(server):
+                    server.setdefault("logs", {})
+
+        # ✅ Traces: rota inicial com o handler tracing, que envolve as demais
+        # rotas do servidor e propaga o traceparent para os upstreams
+        if self.otlp_endpoint:
+            for server in servers.values():
+                if not _is_loopback_server(server):
+                    server["routes"] = [
+                        {"handle": [{"handler": "tracing", "span": "caddy"}]}
+                    ] + server.get("routes", [])
+
+        if self.config.metrics.enabled:
+            http_app = caddy_json.setdefault("apps", {}).setdefault("http", {})
+            http_app["metrics"] = {"per_host": self.config.metrics.per_host}
+            # Servidor interno, fora do NLB (sem proxy protocol/h3)
+            http_app.setdefault("servers", {})["metrics"] = {
+                "listen": [f":{self.config.metrics.port}"],
+                "automatic_https": {"disable": True},
+                "routes": [
+                    {
+                        "match": [{"path": ["/metrics"]}],
+                        "handle": [{"handler": "metrics"}],
+                    }
+                ],
+            }
+
+        return caddy_json
+
+    def _storage_config(self) -> Optional[Dict[str, Any]]:
+        """Bloco `storage` do caddy.json"""
+        storage = self.config.storage
+
+        if storage.module == "redis":
+            if not storage.address:
+                raise ValueError("CaddyStorageConfig.address é obrigatório para redis")
+            redis_config = {
+                "module": "redis",
+                "address": storage.address,
+                "db": storage.db,
+                "key_prefix": storage.key_prefix,
+            }
+            if storage.password_secret:
+                redis_config["password"] = "{env.CADDY_STORAGE_PASSWORD}"
+            return redis_config
+
+        if storage.module == "s3":
+            if not storage.bucket:
+                raise ValueError("CaddyStorageConfig.bucket é obrigatório para s3")
+            return {
+                "module": "s3",
+                "host": storage.host,
+                "bucket": storage.bucket,
+                "access_id": "{env.AWS_ACCESS_KEY}",
+                "secret_key": "{env.AWS_SECRET_KEY}",
+                "prefix": storage.prefix,
+            }
+
+        if storage.module != "file_system":
+            raise ValueError(f"Storage do Caddy desconhecido: {storage.module}")
+
+        return None
+
+
+def create_caddy(
+    name: str,
+    namespace: str,
+    k8s_provider,
+    environment: str,
+    config: Optional[CaddyConfig] = None,
+    logging_profile: Optional[LoggingProfile] = None,
+    otlp_endpoint: Optional[str] = None,
+):
     """
     Cria o Caddy para um ambiente específico com LoadBalancer automático.
 
@@ -180,5 +852,16 @@ def create_caddy(name: str, namespace: str, k8s_provider, environment: str):
         namespace: Namespace Kubernetes
         k8s_provider: Provider Kubernetes
         environment: 'sandbox' ou 'production'
+        config: Réplicas, storage de certificados, PDB e HPA
+        logging_profile: Perfil de logs do stack
+        otlp_endpoint: Endpoint OTLP/gRPC do OtelCollector (traces)
     """
-    return CaddyStack(name, namespace, k8s_provider, environment)
+    return CaddyStack(
+        name,
+        namespace,
+        k8s_provider,
+        environment,
+        config,
+        logging_profile,
+        otlp_endpoint,
+    )
@@ -0,0 +1,134 @@
+from typing import Dict, List, Any
+
+
+def _timeseries_panel(
+    title: str,
+    targets: List[Dict[str, str]],
+    unit: str,
+    x: int,
+    y: int,
+    w: int = 12,
+    h: int = 8,
+) -> Dict[str, Any]:
+    return {
+        "type": "timeseries",
+        "title": title,
+        "gridPos": {"x": x, "y": y, "w": w, "h": h},
+        "datasource": {"type": "prometheus", "uid": "${datasource}"},
+        "fieldConfig": {"defaults": {"unit": unit}, "overrides": []},
+        "options": {"legend": {"displayMode": "table", "placement": "right"}},
+        "targets": [
+            {"refId": chr(ord("A") + index), **target}
+            for index, target in enumerate(targets)
+        ],
+    }
+
+
+def caddy_dashboard(namespace: str) -> Dict[str, Any]:
+    """
+    Dashboard Grafana de latência e throughput do Caddy por host.
+
+    Usa as métricas `caddy_http_*` expostas com `per_host`, então cada
+    rota (host do tenant ou serviço) aparece como uma série própria.
+    """
+    selector = 'namespace="$namespace", host=~"$host"'
+
+    def quantile(q: str) -> Dict[str, str]:
+        return {
+            "expr": (
+                f"histogram_quantile({q}, sum by (le, host) "
+                f"(rate(caddy_http_request_duration_seconds_bucket{{{selector}}}[$__rate_interval])))"
+            ),
+            "legendFormat": "{{host}}",
+        }
+
+    return {
+        "uid": f"caddy-{namespace}",
+        "title": f"Caddy / {namespace}",
+        "tags": ["caddy", "ingress", namespace],
+        "timezone": "browser",
+        "schemaVersion": 39,
+        "refresh": "30s",
+        "time": {"from": "now-6h", "to": "now"},
+        "templating": {
+            "list": [
+                {
+                    "name": "datasource",
+                    "type": "datasource",
+                    "query": "prometheus",
+                },
+                {
+                    "name": "namespace",
+                    "type": "constant",
+                    "query": namespace,
+                    "hide": 2,
+                },
+                {
+                    "name": "host",
+                    "type": "query",
+                    "datasource": {"type": "prometheus", "uid": "${datasource}"},
+                    "query": 'label_values(caddy_http_requests_total{namespace="$namespace"}, host)',
+                    "includeAll": True,
+                    "multi": True,
+                    "allValue": ".*",
+                    "refresh": 2,
+                },
+            ]
+        },
+        "panels": [
+            _timeseries_panel(
+                "Requests/s por host",
+                [
+                    {
+                        "expr": f"sum by (host) (rate(caddy_http_requests_total{{{selector}}}[$__rate_interval]))",
+                        "legendFormat": "{{host}}",
+                    }
+                ],
+                unit="reqps",
+                x=0,
+                y=0,
+            ),
+            _timeseries_panel(
+                "Erros 5xx/s por host",
+                [
+                    {
+                        "expr": (
+                            "sum by (host) (rate(caddy_http_request_duration_seconds_count"
+                            f'{{{selector}, code=~"5.."}}[$__rate_interval]))'
+                        ),
+                        "legendFormat": "{{host}}",
+                    }
+                ],
+                unit="reqps",
+                x=12,
+                y=0,
+            ),
+            _timeseries_panel("Latência p50", [quantile("0.50")], unit="s", x=0, y=8, w=8),
+            _timeseries_panel("Latência p95", [quantile("0.95")], unit="s", x=8, y=8, w=8),
+            _timeseries_panel("Latência p99", [quantile("0.99")], unit="s", x=16, y=8, w=8),
+            _timeseries_panel(
+                "Requests em andamento",
+                [
+                    {
+                        "expr": 'sum by (server) (caddy_http_requests_in_flight{namespace="$namespace"})',
+                        "legendFormat": "{{server}}",
+                    }
+                ],
+                unit="short",
+                x=0,
+                y=16,
+            ),
+            _timeseries_panel(
+                "Upstreams saudáveis",
+                [
+                    {
+                        "expr": 'sum by (upstream) (caddy_reverse_proxy_upstreams_healthy{namespace="$namespace"})',
+                        "legendFormat": "{{upstream}}",
+                    }
+                ],
+                unit="short",
+                x=12,
+                y=16,
+            ),
+        ],
+    }
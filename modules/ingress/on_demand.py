@@ -1,5 +1,114 @@
+import hashlib
 import pulumi
 import pulumi_kubernetes as k8s
+from typing import Dict, Optional, Any
+from pydantic import BaseModel
+
+from modules.base import AutoscalingConfig, create_hpa
+
+
+class OnDemandCacheConfig(BaseModel):
+    """
+    Cache (nginx sidecar) na frente do `/verify`.
+
+    Respostas positivas e negativas têm TTLs distintos e requisições
+    concorrentes para o mesmo domínio são agrupadas (proxy_cache_lock).
+    O rate limit é aplicado apenas aos cache misses, ou seja, às
+    consultas que chegam ao banco.
+    """
+
+    enabled: bool = True
+    image: str = "nginx:1.27-alpine"
+    port: int = 8080
+    positive_ttl: str = "1h"
+    negative_ttl: str = "5m"
+    # Limite de consultas ao banco por pod
+    rate_limit: str = "20r/s"
+    burst: int = 40
+
+
+class OnDemandWarmupConfig(BaseModel):
+    """
+    Pré-emissão em lote dos certificados de todos os domínios conhecidos.
+
+    Lê os domínios do banco e faz um request HTTPS para cada um, o que
+    dispara a emissão on-demand no Caddy fora do caminho do usuário.
+    Com `schedule` roda como CronJob; sem, como Job único.
+    """
+
+    enabled: bool = False
+    schedule: Optional[str] = None
+    query: str = (
+        "SELECT DISTINCT custom_domain FROM mobilizations "
+        "WHERE custom_domain IS NOT NULL AND custom_domain <> ''"
+    )
+    parallelism: int = 4
+    image: str = "alpine:3.20"
+
+
+class OnDemandConfig(BaseModel):
+    image: str = "nossas/tls-on-demand:latest"
+    replicas: int = 1
+    autoscaling: Optional[AutoscalingConfig] = None
+    # Pool de conexões com o banco (por pod).
+    # ⚠️ Os nomes das variáveis que a imagem nossas/tls-on-demand (fora deste
+    # repositório) lê para o pool não estão confirmados, então nada é enviado
+    # por padrão. Defina db_pool_size_env/db_pool_idle_timeout_env com os nomes
+    # usados pela aplicação para aplicar o pool; só então o on-demand entra no
+    # orçamento de conexões (ver `pool_configured`).
+    db_pool_size: int = 5
+    db_pool_idle_timeout_ms: int = 30000
+    db_pool_size_env: Optional[str] = None
+    db_pool_idle_timeout_env: Optional[str] = None
+    resources: Dict[str, Any] = {
+        "requests": {"memory": "64Mi", "cpu": "50m"},
+        "limits": {"memory": "128Mi", "cpu": "100m"},
+    }
+    cache: OnDemandCacheConfig = OnDemandCacheConfig()
+    warmup: OnDemandWarmupConfig = OnDemandWarmupConfig()
+
+    @property
+    def pool_configured(self) -> bool:
+        """Se o tamanho do pool é de fato enviado para a aplicação"""
+        return self.db_pool_size_env is not None
+
+
+def _nginx_config(cache: OnDemandCacheConfig, app_port: int) -> str:
+    """Configuração do nginx de cache do /verify"""
+    return f"""
+proxy_cache_path /var/cache/nginx/verify levels=1:2 keys_zone=verify:10m max_size=64m inactive=2h use_temp_path=off;
+limit_req_zone $server_port zone=verify_db:1m rate={cache.rate_limit};
+
+server {{
+    listen {cache.port};
+
+    location = /verify {{
+        proxy_pass http://127.0.0.1:8081;
+        proxy_cache verify;
+        proxy_cache_key $request_uri;
+        proxy_cache_valid 200 {cache.positive_ttl};
+        proxy_cache_valid 400 403 404 {cache.negative_ttl};
+        proxy_cache_lock on;
+        proxy_cache_use_stale error timeout updating http_500 http_502 http_503;
+        add_header X-Cache-Status $upstream_cache_status;
+    }}
+
+    location / {{
+        proxy_pass http://127.0.0.1:{app_port};
+    }}
+}}
+
+# Apenas cache misses chegam aqui (consultas ao banco)
+server {{
+    listen 127.0.0.1:8081;
+
+    location / {{
+        limit_req zone=verify_db burst={cache.burst} nodelay;
+        limit_req_status 429;
+        proxy_pass http://127.0.0.1:{app_port};
+    }}
+}}
+"""
 
 
 class OnDemandService(pulumi.ComponentResource):
@@ -13,11 +122,137 @@ class OnDemandService(pulumi.ComponentResource):
         namespace: str,
         k8s_provider,
         environment: str,
+        config: Optional[OnDemandConfig] = None,
         opts=None,
     ):
         super().__init__("custom:app:OnDemandService", name, None, opts)
 
         self.namespace = namespace
+        self.config = config or OnDemandConfig()
+
+        app_port = 3005
+        cache = self.config.cache
+
+        # Pool de conexões com o banco (nomes: ver OnDemandConfig)
+        pool_env_vars = [
+            k8s.core.v1.EnvVarArgs(name=env_name, value=str(value))
+            for env_name, value in [
+                (self.config.db_pool_size_env, self.config.db_pool_size),
+                (
+                    self.config.db_pool_idle_timeout_env,
+                    self.config.db_pool_idle_timeout_ms,
+                ),
+            ]
+            if env_name
+        ]
+
+        containers = [
+            k8s.core.v1.ContainerArgs(
+                name="on-demand",
+                image=self.config.image,
+                ports=[
+                    k8s.core.v1.ContainerPortArgs(
+                        container_port=app_port, name="http"
+                    )
+                ],
+                env=[
+                    k8s.core.v1.EnvVarArgs(
+                        name="DATABASE_URL",
+                        value_from=k8s.core.v1.EnvVarSourceArgs(
+                            secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(
+                                name="bonde-database-url",
+                                key="BONDE_DATABASE_URL",
+                            )
+                        ),
+                    ),
+                    k8s.core.v1.EnvVarArgs(
+                        name="ENVIRONMENT", value=environment
+                    ),
+                    # ✅ Adicione outras variáveis que sua app precisa
+                    # k8s.core.v1.EnvVarArgs(
+                    #     name="ALLOWED_DOMAINS",
+                    #     value="bonde.org,meurio.org.br,nossas.org",
+                    # ),
+                ]
+                + pool_env_vars,
+                resources=k8s.core.v1.ResourceRequirementsArgs(
+                    requests=self.config.resources.get("requests", {}),
+                    limits=self.config.resources.get("limits", {}),
+                ),
+                # Probes para healthz da aplicação
+                liveness_probe=k8s.core.v1.ProbeArgs(
+                    http_get=k8s.core.v1.HTTPGetActionArgs(
+                        path="/healthz",
+                        port=app_port,
+                    ),
+                    initial_delay_seconds=15,
+                    period_seconds=20,
+                ),
+                readiness_probe=k8s.core.v1.ProbeArgs(
+                    http_get=k8s.core.v1.HTTPGetActionArgs(
+                        path="/healthz", port=app_port
+                    ),
+                    initial_delay_seconds=5,
+                    period_seconds=10,
+                ),
+            )
+        ]
+        volumes = []
+        # O emptyDir do cache do nginx é descartável: não impede o scale down
+        pod_annotations = {"cluster-autoscaler.kubernetes.io/safe-to-evict": "true"}
+
+        # ✅ Cache do /verify (sidecar nginx)
+        self.cache_config_map = None
+        if cache.enabled:
+            nginx_config = _nginx_config(cache, app_port)
+            self.cache_config_map = k8s.core.v1.ConfigMap(
+                f"{name}-cache-config",
+                metadata=k8s.meta.v1.ObjectMetaArgs(
+                    name=f"{name}-cache-config", namespace=namespace
+                ),
+                data={"default.conf": nginx_config},
+                opts=pulumi.ResourceOptions(provider=k8s_provider, parent=self),
+            )
+            pod_annotations["config/revision"] = hashlib.sha256(
+                nginx_config.encode()
+            ).hexdigest()[:12]
+            containers.append(
+                k8s.core.v1.ContainerArgs(
+                    name="cache",
+                    image=cache.image,
+                    ports=[
+                        k8s.core.v1.ContainerPortArgs(
+                            container_port=cache.port, name="cache"
+                        )
+                    ],
+                    volume_mounts=[
+                        k8s.core.v1.VolumeMountArgs(
+                            name="cache-config", mount_path="/etc/nginx/conf.d"
+                        ),
+                        k8s.core.v1.VolumeMountArgs(
+                            name="cache-data", mount_path="/var/cache/nginx"
+                        ),
+                    ],
+                    resources=k8s.core.v1.ResourceRequirementsArgs(
+                        requests={"memory": "16Mi", "cpu": "10m"},
+                        limits={"memory": "64Mi", "cpu": "100m"},
+                    ),
+                )
+            )
+            volumes += [
+                k8s.core.v1.VolumeArgs(
+                    name="cache-config",
+                    config_map=k8s.core.v1.ConfigMapVolumeSourceArgs(
+                        name=self.cache_config_map.metadata["name"]
+                    ),
+                ),
+                k8s.core.v1.VolumeArgs(
+                    name="cache-data",
+                    empty_dir=k8s.core.v1.EmptyDirVolumeSourceArgs(
+                        size_limit="128Mi"
+                    ),
+                ),
+            ]
 
         # Deployment do serviço on-demand
         self.deployment = k8s.apps.v1.Deployment(
@@ -28,71 +263,40 @@ class OnDemandService(pulumi.ComponentResource):
                 labels={"app": "on-demand", "component": "backend"},
             ),
             spec=k8s.apps.v1.DeploymentSpecArgs(
-                replicas=1,
+                # Com HPA o número de réplicas é gerenciado pelo autoscaler
+                replicas=None if self.config.autoscaling else self.config.replicas,
                 selector=k8s.meta.v1.LabelSelectorArgs(
                     match_labels={"app": "on-demand"}
                 ),
                 template=k8s.core.v1.PodTemplateSpecArgs(
                     metadata=k8s.meta.v1.ObjectMetaArgs(
                         labels={"app": "on-demand"},
+                        annotations=pod_annotations,
                     ),
                     spec=k8s.core.v1.PodSpecArgs(
-                        containers=[
-                            k8s.core.v1.ContainerArgs(
-                                name="on-demand",
-                                image="nossas/tls-on-demand:latest",
-                                ports=[
-                                    k8s.core.v1.ContainerPortArgs(
-                                        container_port=3005, name="http"
-                                    )
-                                ],
-                                env=[
-                                    k8s.core.v1.EnvVarArgs(
-                                        name="DATABASE_URL",
-                                        value_from=k8s.core.v1.EnvVarSourceArgs(
-                                            secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(
-                                                name="bonde-database-url",
-                                                key="BONDE_DATABASE_URL",
-                                            )
-                                        ),
-                                    ),
-                                    k8s.core.v1.EnvVarArgs(
-                                        name="ENVIRONMENT", value=environment
-                                    ),
-                                    # ✅ Adicione outras variáveis que sua app precisa
-                                    # k8s.core.v1.EnvVarArgs(
-                                    #     name="ALLOWED_DOMAINS",
-                                    #     value="bonde.org,meurio.org.br,nossas.org",
-                                    # ),
-                                ],
-                                resources=k8s.core.v1.ResourceRequirementsArgs(
-                                    requests={"memory": "64Mi", "cpu": "50m"},
-                                    limits={"memory": "128Mi", "cpu": "100m"},
-                                ),
-                                # Probes para healthz da aplicação
-                                liveness_probe=k8s.core.v1.ProbeArgs(
-                                    http_get=k8s.core.v1.HTTPGetActionArgs(
-                                        path="/healthz",
-                                        port=3005,
-                                    ),
-                                    initial_delay_seconds=15,
-                                    period_seconds=20,
-                                ),
-                                readiness_probe=k8s.core.v1.ProbeArgs(
-                                    http_get=k8s.core.v1.HTTPGetActionArgs(
-                                        path="/healthz", port=3005
-                                    ),
-                                    initial_delay_seconds=5,
-                                    period_seconds=10,
-                                ),
-                            )
-                        ],
+                        containers=containers,
+                        volumes=volumes or None,
                     ),
                 ),
             ),
             opts=pulumi.ResourceOptions(provider=k8s_provider, parent=self),
         )
 
+        self.hpa = (
+            create_hpa(
+                name,
+                namespace,
+                target_name=name,
+                config=self.config.autoscaling,
+                labels={"app": "on-demand"},
+                opts=pulumi.ResourceOptions(
+                    provider=k8s_provider, parent=self, depends_on=[self.deployment]
+                ),
+            )
+            if self.config.autoscaling
+            else None
+        )
+
         # Service para o on-demand
         self.service = k8s.core.v1.Service(
             f"{name}-service",
@@ -106,7 +310,10 @@ class OnDemandService(pulumi.ComponentResource):
                 selector={"app": "on-demand"},
                 ports=[
                     k8s.core.v1.ServicePortArgs(
-                        port=80, target_port=3005, protocol="TCP", name="http"
+                        port=80,
+                        target_port=cache.port if cache.enabled else app_port,
+                        protocol="TCP",
+                        name="http",
                     ),
                 ],
             ),
@@ -117,12 +324,106 @@ class OnDemandService(pulumi.ComponentResource):
             ),
         )
 
+        # ✅ Pré-emissão de certificados
+        self.warmup = (
+            self._create_warmup(name, namespace, k8s_provider)
+            if self.config.warmup.enabled
+            else None
+        )
+
         # URL do serviço (interno)
         self.service_url = f"http://{name}.{namespace}.svc.cluster.local"
 
+    def _create_warmup(self, name: str, namespace: str, k8s_provider):
+        """Job/CronJob que aquece os certificados dos domínios dos tenants"""
+        warmup = self.config.warmup
+
+        script = (
+            "apk add --no-cache postgresql-client curl >/dev/null && "
+            'psql "$DATABASE_URL" -At -c "$WARMUP_QUERY" | '
+            "xargs -P \"$WARMUP_PARALLELISM\" -I{} "
+            "curl -s -o /dev/null --max-time 60 -w '%{http_code} {}\\n' https://{}/ ; "
+            "exit 0"
+        )
+        job_spec = k8s.batch.v1.JobSpecArgs(
+            backoff_limit=1,
+            ttl_seconds_after_finished=86400,
+            template=k8s.core.v1.PodTemplateSpecArgs(
+                metadata=k8s.meta.v1.ObjectMetaArgs(
+                    labels={"app": "on-demand", "component": "warmup"}
+                ),
+                spec=k8s.core.v1.PodSpecArgs(
+                    restart_policy="Never",
+                    containers=[
+                        k8s.core.v1.ContainerArgs(
+                            name="warmup",
+                            image=warmup.image,
+                            command=["sh", "-c", script],
+                            env=[
+                                k8s.core.v1.EnvVarArgs(
+                                    name="DATABASE_URL",
+                                    value_from=k8s.core.v1.EnvVarSourceArgs(
+                                        secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(
+                                            name="bonde-database-url",
+                                            key="BONDE_DATABASE_URL",
+                                        )
+                                    ),
+                                ),
+                                k8s.core.v1.EnvVarArgs(
+                                    name="WARMUP_QUERY", value=warmup.query
+                                ),
+                                k8s.core.v1.EnvVarArgs(
+                                    name="WARMUP_PARALLELISM",
+                                    value=str(warmup.parallelism),
+                                ),
+                            ],
+                            resources=k8s.core.v1.ResourceRequirementsArgs(
+                                requests={"memory": "32Mi", "cpu": "10m"},
+                                limits={"memory": "128Mi", "cpu": "200m"},
+                            ),
+                        )
+                    ],
+                ),
+            ),
+        )
+        metadata = k8s.meta.v1.ObjectMetaArgs(
+            name=f"{name}-warmup",
+            namespace=namespace,
+            labels={"app": "on-demand", "component": "warmup"},
+        )
+
+        if warmup.schedule:
+            return k8s.batch.v1.CronJob(
+                f"{name}-warmup",
+                metadata=metadata,
+                spec=k8s.batch.v1.CronJobSpecArgs(
+                    schedule=warmup.schedule,
+                    concurrency_policy="Forbid",
+                    job_template=k8s.batch.v1.JobTemplateSpecArgs(spec=job_spec),
+                ),
+                opts=pulumi.ResourceOptions(provider=k8s_provider, parent=self),
+            )
+
+        # Job único: não bloquear o deploy aguardando a conclusão
+        metadata.annotations = {"pulumi.com/skipAwait": "true"}
+        return k8s.batch.v1.Job(
+            f"{name}-warmup",
+            metadata=metadata,
+            spec=job_spec,
+            opts=pulumi.ResourceOptions(
+                provider=k8s_provider, parent=self, depends_on=[self.service]
+            ),
+        )
+
 
-def create_on_demand_service(name: str, namespace: str, k8s_provider, environment: str):
+def create_on_demand_service(
+    name: str,
+    namespace: str,
+    k8s_provider,
+    environment: str,
+    config: Optional[OnDemandConfig] = None,
+):
     """
     Cria o serviço on-demand básico
     """
-    return OnDemandService(name, namespace, k8s_provider, environment)
+    return OnDemandService(name, namespace, k8s_provider, environment, config)
@@ -0,0 +1,476 @@
+import copy
+from typing import Dict, List, Optional, Any, Tuple
+from pydantic import BaseModel
+
+
+class CaddyCacheConfig(BaseModel):
+    """
+    Cache de respostas na borda (github.com/caddyserver/cache-handler / Souin).
+
+    `stale` define por quanto tempo uma resposta expirada ainda pode ser
+    servida enquanto é revalidada no upstream (stale-while-revalidate).
+    """
+
+    ttl: str = "60s"
+    stale: str = "300s"
+    default_cache_control: Optional[str] = None
+    allowed_http_verbs: List[str] = ["GET", "HEAD"]
+
+
+class CaddyLoadBalancingConfig(BaseModel):
+    """
+    Balanceamento direto para os pods, sem passar pelo kube-proxy.
+
+    Com `dynamic` o Caddy resolve o registro SRV do Service headless
+    (`<serviço>-headless`, porta nomeada "http") e distribui entre os pods.
+    Pods não-prontos saem do DNS pelo readiness probe do Kubernetes; o
+    health check passivo descarta imediatamente pods que falham. O health
+    check ativo do Caddy só se aplica a upstreams estáticos.
+    """
+
+    dynamic: bool = False
+    refresh: str = "5s"
+    # least_conn, ip_hash, round_robin, random, first...
+    selection_policy: str = "least_conn"
+    retries: int = 2
+    try_duration: str = "5s"
+    try_interval: str = "250ms"
+    # Health check ativo (upstreams estáticos)
+    health_uri: Optional[str] = None
+    health_interval: str = "10s"
+    health_timeout: str = "2s"
+    # Health check passivo
+    fail_duration: str = "30s"
+    max_fails: int = 1
+    unhealthy_status: List[int] = [502, 503, 504]
+
+
+class CaddyRateLimitConfig(BaseModel):
+    """
+    Rate limit na borda (github.com/mholt/caddy-ratelimit).
+
+    Requests acima do limite recebem 429 com Retry-After, sem chegar ao
+    upstream. `key` aceita placeholders, ex.: IP do cliente (padrão) ou
+    `{http.request.header.Authorization}` para limitar por token.
+    """
+
+    max_events: int = 100
+    window: str = "1m"
+    key: str = "{http.request.remote.host}"
+
+
+class CaddyTransportConfig(BaseModel):
+    """Pool de conexões keepalive e timeouts do Caddy para o upstream"""
+
+    dial_timeout: str = "3s"
+    # Tempo máximo até o upstream começar a responder (headers)
+    response_header_timeout: Optional[str] = "30s"
+    read_timeout: Optional[str] = None
+    keepalive_idle_timeout: str = "90s"
+    max_idle_conns: int = 256
+    max_idle_conns_per_host: int = 64
+
+
+class CaddyCanaryConfig(BaseModel):
+    """
+    Divide o tráfego de uma rota entre o serviço estável e um canary.
+
+    Cada lado passa por um servidor de loopback próprio do Caddy
+    (`canary-<serviço>-stable` / `canary-<serviço>-canary`), então as
+    métricas `caddy_http_*` separam os dois pelo label `server`. O cookie
+    mantém cada usuário no mesmo lado durante o rollout.
+    """
+
+    upstream: str
+    weight: int = 0  # % do tráfego enviado ao canary (0-100)
+    cookie: str = "bonde_canary"
+    port: int = 9300  # Portas de loopback: port (estável) e port + 1 (canary)
+
+
+class CaddyRouteConfig(BaseModel):
+    # Compressão de respostas, na ordem de preferência (ex.: ["zstd", "gzip"])
+    encode: List[str] = []
+    encode_minimum_length: int = 512
+    # Sobrescreve o Cache-Control das respostas do upstream
+    cache_control: Optional[str] = None
+    cache: Optional[CaddyCacheConfig] = None
+    load_balancing: Optional[CaddyLoadBalancingConfig] = None
+    transport: Optional[CaddyTransportConfig] = None
+    canary: Optional[CaddyCanaryConfig] = None
+    # Proteção contra sobrecarga
+    rate_limit: Optional[CaddyRateLimitConfig] = None
+    # Tamanho máximo do corpo do request em bytes (413 acima disso)
+    max_request_body: Optional[int] = None
+    # Requests simultâneos por upstream; com todos cheios o Caddy responde
+    # 503 após o try_duration. Não se aplica a upstreams dinâmicos (SRV).
+    max_requests: Optional[int] = None
+    # Websockets/streams: por quanto tempo manter conexões abertas após um
+    # reload da configuração e a duração máxima de cada stream
+    stream_close_delay: Optional[str] = None
+    stream_timeout: Optional[str] = None
+    # Serviço que recebe os upgrades para websocket (ex.: pool de
+    # subscriptions do Hasura); o restante do tráfego segue para a rota
+    websocket_upstream: Optional[str] = None
+
+
+class CaddyPathRouteConfig(BaseModel):
+    """
+    Rota por host e path gerada pelo stack a partir da configuração de outro
+    componente (ex.: /webhook/* do N8N para os processadores de webhook, que
+    só existem em queue mode). Entra antes da rota do mesmo host no JSON base
+    e recebe as opções de `CaddyConfig.routes` pelo serviço de destino.
+    """
+
+    host: str
+    paths: List[str]
+    upstream: str  # "serviço:porta"
+
+
+def route_upstream(route: Dict[str, Any]) -> Optional[str]:
+    """Nome do serviço de destino de uma rota (ex.: "public" para "public:80")"""
+    for handler in route.get("handle", []):
+        if handler.get("handler") != "reverse_proxy":
+            continue
+        for upstream in handler.get("upstreams", []):
+            dial = upstream.get("dial")
+            if dial:
+                return dial.split(":")[0]
+    return None
+
+
+def build_guard_handlers(
+    options: CaddyRouteConfig, service: str = "default"
+) -> List[Dict[str, Any]]:
+    """Limites (rate_limit → request_body) que rejeitam o request antes de qualquer outro trabalho"""
+    handlers = []
+
+    if options.rate_limit:
+        handlers.append(
+            {
+                "handler": "rate_limit",
+                "rate_limits": {
+                    service: {
+                        "key": options.rate_limit.key,
+                        "window": options.rate_limit.window,
+                        "max_events": options.rate_limit.max_events,
+                    }
+                },
+            }
+        )
+
+    if options.max_request_body:
+        handlers.append(
+            {"handler": "request_body", "max_size": options.max_request_body}
+        )
+
+    return handlers
+
+
+def build_response_handlers(options: CaddyRouteConfig) -> List[Dict[str, Any]]:
+    """
+    Handlers de resposta, na ordem do Caddyfile: cache → encode → headers,
+    de forma que o cache armazena a resposta já comprimida e com o
+    Cache-Control final.
+    """
+    handlers = []
+
+    if options.cache:
+        cache_handler = {
+            "handler": "cache",
+            "ttl": options.cache.ttl,
+            "stale": options.cache.stale,
+            "allowed_http_verbs": options.cache.allowed_http_verbs,
+        }
+        if options.cache.default_cache_control:
+            cache_handler["default_cache_control"] = (
+                options.cache.default_cache_control
+            )
+        handlers.append(cache_handler)
+
+    if options.encode:
+        handlers.append(
+            {
+                "handler": "encode",
+                "encodings": {encoding: {} for encoding in options.encode},
+                "prefer": options.encode,
+                "minimum_length": options.encode_minimum_length,
+            }
+        )
+
+    if options.cache_control:
+        handlers.append(
+            {
+                "handler": "headers",
+                "response": {
+                    "set": {"Cache-Control": [options.cache_control]},
+                    "deferred": True,
+                },
+            }
+        )
+
+    return handlers
+
+
+def build_reverse_proxy(
+    service: str,
+    handler: Dict[str, Any],
+    options: CaddyRouteConfig,
+    namespace: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Aplica balanceamento, health checks e transport ao reverse_proxy"""
+    handler = dict(handler)
+    lb = options.load_balancing
+
+    if lb:
+        if lb.dynamic:
+            domain = f"{service}-headless"
+            if namespace:
+                domain = f"{domain}.{namespace}.svc.cluster.local"
+            handler.pop("upstreams", None)
+            handler["dynamic_upstreams"] = {
+                "source": "srv",
+                "service": "http",
+                "proto": "tcp",
+                "name": domain,
+                "refresh": lb.refresh,
+            }
+
+        handler["load_balancing"] = {
+            "selection_policy": {"policy": lb.selection_policy},
+            "retries": lb.retries,
+            "try_duration": lb.try_duration,
+            "try_interval": lb.try_interval,
+        }
+
+        health_checks = {
+            "passive": {
+                "fail_duration": lb.fail_duration,
+                "max_fails": lb.max_fails,
+                "unhealthy_status": lb.unhealthy_status,
+            }
+        }
+        if lb.health_uri and not lb.dynamic:
+            health_checks["active"] = {
+                "uri": lb.health_uri,
+                "interval": lb.health_interval,
+                "timeout": lb.health_timeout,
+            }
+        handler["health_checks"] = health_checks
+
+    if options.stream_close_delay:
+        handler["stream_close_delay"] = options.stream_close_delay
+    if options.stream_timeout:
+        handler["stream_timeout"] = options.stream_timeout
+
+    if options.max_requests and "upstreams" in handler:
+        handler["upstreams"] = [
+            {**upstream, "max_requests": options.max_requests}
+            for upstream in handler["upstreams"]
+        ]
+
+    if options.transport:
+        handler["transport"] = {
+            "protocol": "http",
+            "dial_timeout": options.transport.dial_timeout,
+            "keep_alive": {
+                "enabled": True,
+                "idle_timeout": options.transport.keepalive_idle_timeout,
+                "max_idle_conns": options.transport.max_idle_conns,
+                "max_idle_conns_per_host": options.transport.max_idle_conns_per_host,
+            },
+        }
+        if options.transport.response_header_timeout:
+            handler["transport"]["response_header_timeout"] = (
+                options.transport.response_header_timeout
+            )
+        if options.transport.read_timeout:
+            handler["transport"]["read_timeout"] = options.transport.read_timeout
+
+    return handler
+
+
+def build_route_handlers(
+    options: CaddyRouteConfig, service: str = "default"
+) -> List[Dict[str, Any]]:
+    """Handlers inseridos antes do reverse_proxy de uma rota"""
+    return build_guard_handlers(options, service) + build_response_handlers(options)
+
+
+def build_websocket_split(
+    service: str,
+    handlers: List[Dict[str, Any]],
+    options: CaddyRouteConfig,
+    namespace: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Subroute que envia os upgrades para websocket ao `websocket_upstream` e o
+    restante (com cache/encode/headers) aos handlers originais da rota.
+    """
+    upstream = options.websocket_upstream
+    websocket_handler = build_reverse_proxy(
+        upstream,
+        {"handler": "reverse_proxy", "upstreams": [{"dial": f"{upstream}:80"}]},
+        options,
+        namespace,
+    )
+    return {
+        "handler": "subroute",
+        "routes": [
+            {
+                "match": [{"header": {"Upgrade": ["websocket", "WebSocket"]}}],
+                "handle": [websocket_handler],
+                "terminal": True,
+            },
+            {"handle": build_response_handlers(options) + handlers},
+        ],
+    }
+
+
+def canary_server_name(service: str, side: str) -> str:
+    """Nome do servidor de loopback do canary (label `server` das métricas)"""
+    return f"canary-{service}-{side}"
+
+
+def build_canary(
+    service: str,
+    handler: Dict[str, Any],
+    routes: Dict[str, CaddyRouteConfig],
+    namespace: Optional[str] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    Gera o reverse_proxy que divide o tráfego entre estável e canary.
+
+    Returns:
+        O handler da rota pública e os servidores de loopback de cada lado
+    """
+    canary = routes[service].canary
+    weight = max(0, min(100, canary.weight))
+    sides = [
+        ("stable", service, canary.port, 100 - weight),
+        ("canary", canary.upstream, canary.port + 1, weight),
+    ]
+
+    servers = {}
+    for side, upstream, port, _ in sides:
+        upstream_handler = {
+            "handler": "reverse_proxy",
+            "upstreams": [{"dial": f"{upstream}:80"}],
+        }
+        options = routes.get(upstream, CaddyRouteConfig())
+        if upstream == service:
+            options = options.model_copy(update={"canary": None})
+        servers[canary_server_name(service, side)] = {
+            "listen": [f"127.0.0.1:{port}"],
+            "automatic_https": {"disable": True},
+            "routes": [
+                {
+                    "handle": [
+                        build_reverse_proxy(
+                            upstream, upstream_handler, options, namespace
+                        )
+                    ]
+                }
+            ],
+        }
+
+    handler = dict(handler)
+    handler["upstreams"] = [{"dial": f"127.0.0.1:{port}"} for _, _, port, _ in sides]
+    handler["load_balancing"] = {
+        "selection_policy": {
+            "policy": "cookie",
+            "name": canary.cookie,
+            "fallback": {
+                "policy": "weighted_round_robin",
+                "weights": [side_weight for _, _, _, side_weight in sides],
+            },
+        }
+    }
+    return handler, servers
+
+
+def insert_path_routes(
+    caddy_json: Dict[str, Any],
+    path_routes: List[CaddyPathRouteConfig],
+    server: str = "https",
+) -> Dict[str, Any]:
+    """
+    Insere cada rota de path antes da primeira rota do mesmo host ou, se o
+    host não tiver rota, antes da catch-all (a primeira sem match)
+    """
+    caddy_json = copy.deepcopy(caddy_json)
+    routes = caddy_json["apps"]["http"]["servers"][server]["routes"]
+    for path_route in path_routes:
+        index = next(
+            (
+                i
+                for i, route in enumerate(routes)
+                if not route.get("match")
+                or any(
+                    path_route.host in match.get("host", [])
+                    for match in route["match"]
+                )
+            ),
+            len(routes),
+        )
+        routes.insert(
+            index,
+            {
+                "match": [{"host": [path_route.host], "path": path_route.paths}],
+                "handle": [
+                    {
+                        "handler": "reverse_proxy",
+                        "upstreams": [{"dial": path_route.upstream}],
+                    }
+                ],
+            },
+        )
+    return caddy_json
+
+
+def apply_route_options(
+    caddy_json: Dict[str, Any],
+    routes: Dict[str, CaddyRouteConfig],
+    namespace: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Gera as rotas do Caddy aplicando as opções por serviço de destino.
+
+    Args:
+        caddy_json: Configuração base do ambiente (config/caddy/caddy-<env>.json)
+        routes: Opções por nome de serviço (ex.: {"public": CaddyRouteConfig(...)})
+        namespace: Namespace dos Services headless usados em upstreams dinâmicos
+    """
+    caddy_json = copy.deepcopy(caddy_json)
+    servers = caddy_json.get("apps", {}).get("http", {}).get("servers", {})
+    canary_servers = {}
+
+    for server in servers.values():
+        for route in server.get("routes", []):
+            service = route_upstream(route)
+            options = routes.get(service)
+            if not options:
+                continue
+
+            handlers = []
+            for handler in route["handle"]:
+                if handler.get("handler") != "reverse_proxy":
+                    handlers.append(handler)
+                elif options.canary and options.canary.weight > 0:
+                    handler, loopback = build_canary(
+                        service, handler, routes, namespace
+                    )
+                    canary_servers.update(loopback)
+                    handlers.append(handler)
+                else:
+                    handlers.append(
+                        build_reverse_proxy(service, handler, options, namespace)
+                    )
+            if options.websocket_upstream:
+                route["handle"] = build_guard_handlers(options, service) + [
+                    build_websocket_split(service, handlers, options, namespace)
+                ]
+            else:
+                route["handle"] = build_route_handlers(options, service) + handlers
+
+    servers.update(canary_servers)
+    return caddy_json
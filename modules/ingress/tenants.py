@@ -0,0 +1,111 @@
+"""
+Shard de rotas dos domínios dos tenants no Caddy.
+
+O shard é um `map` host → (upstream, tenant) avaliado na borda, que define
+o header do tenant e, para tenants fora do upstream padrão, faz o proxy
+direto. Domínios não mapeados seguem para a rota catch-all (public).
+O CLI `python -m tools.tenant_routes` gera o shard a partir do banco.
+"""
+import os
+from typing import Dict, List, Any
+
+TENANT_ROUTES_ID = "tenant-routes"
+DEFAULT_UPSTREAM = "public:80"
+DEFAULT_HEADER = "X-Bonde-Tenant"
+
+
+def build_tenant_route(
+    tenants: List[Dict[str, Any]],
+    header: str = DEFAULT_HEADER,
+    default_upstream: str = DEFAULT_UPSTREAM,
+) -> Dict[str, Any]:
+    """
+    Gera a rota (identificada por @id) com o map dos tenants.
+
+    Args:
+        tenants: Linhas com domain, tenant e upstream (opcional)
+        header: Header de request com o identificador do tenant
+        default_upstream: Upstream da rota catch-all
+    """
+    mappings = {}
+    for row in tenants:
+        domain = str(row["domain"]).strip().lower().rstrip(".")
+        if not domain:
+            continue
+        mappings[domain] = [
+            str(row.get("upstream") or default_upstream),
+            str(row.get("tenant") or ""),
+        ]
+
+    return {
+        "@id": TENANT_ROUTES_ID,
+        "handle": [
+            {
+                "handler": "subroute",
+                "routes": [
+                    {
+                        "handle": [
+                            {
+                                "handler": "map",
+                                "source": "{http.request.host}",
+                                "destinations": ["{tenant_upstream}", "{tenant_id}"],
+                                "mappings": [
+                                    {"input": domain, "outputs": outputs}
+                                    for domain, outputs in sorted(mappings.items())
+                                ],
+                                "defaults": [default_upstream, ""],
+                            },
+                            {
+                                "handler": "headers",
+                                "request": {"set": {header: ["{tenant_id}"]}},
+                            },
+                        ]
+                    },
+                    # Tenants fora do upstream padrão
+                    {
+                        "match": [
+                            {"not": [{"vars": {"{tenant_upstream}": [default_upstream]}}]}
+                        ],
+                        "handle": [
+                            {
+                                "handler": "reverse_proxy",
+                                "upstreams": [{"dial": "{tenant_upstream}"}],
+                            }
+                        ],
+                    },
+                ],
+            }
+        ],
+    }
+
+
+def insert_tenant_route(
+    caddy_json: Dict[str, Any], tenant_route: Dict[str, Any], server: str = "https"
+) -> Dict[str, Any]:
+    """
+    Insere o shard imediatamente antes da rota catch-all (a última sem match;
+    rotas iniciais sem match, como a do tracing, envolvem as demais)
+    """
+    routes = caddy_json["apps"]["http"]["servers"][server]["routes"]
+    index = next(
+        (
+            i
+            for i in reversed(range(len(routes)))
+            if not routes[i].get("match")
+        ),
+        len(routes),
+    )
+    routes.insert(index, tenant_route)
+    return caddy_json
+
+
+def tenants_path(environment: str) -> str:
+    """Shard dos tenants do ambiente (gerado por tools.tenant_routes)"""
+    return os.path.join(
+        os.path.dirname(__file__),
+        "..",
+        "..",
+        "config",
+        "caddy",
+        f"tenants-{environment}.json",
+    )
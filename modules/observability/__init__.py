@@ -0,0 +1,5 @@
+from .logging_profile import LoggingProfile, LoggingSamplingConfig
+from .apm import ApmProfile
+from .fluent_bit import FluentBit, FluentBitConfig
+from .slo import SloConfig, build_slo_rules, create_slo_rule
+from .otel import OtelCollector, OtelCollectorConfig, OtelSamplingConfig
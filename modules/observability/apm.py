@@ -0,0 +1,63 @@
+from typing import Dict, Optional, Any
+from pydantic import BaseModel
+
+# Secrets criados por tools/envs.py (chave = nome da variável)
+APM_SECRETS = {
+    "ELASTIC_APM_SERVER_URL": "elastic-apm-server-url",
+    "ELASTIC_APM_SECRET_TOKEN": "elastic-apm-secret-token",
+}
+
+
+class ApmProfile(BaseModel):
+    """
+    Padrões do Elastic APM para todos os serviços do stack.
+
+    Os serviços com `apm` no YAML recebem as variáveis do agente
+    (ELASTIC_APM_*) com o ambiente e a taxa de amostragem daqui, a menos que
+    o próprio serviço defina outra. Com `central_config` o agente também
+    consulta o APM Server, permitindo ajustar a amostragem pelo Kibana sem
+    novo deploy.
+    """
+
+    enabled: bool = True
+    environment: str = "sandbox"
+    # Fração das transações com spans detalhados (as demais só contam métricas)
+    transaction_sample_rate: float = 1.0
+    central_config: bool = True
+    # Spans mais curtos que isso são descartados pelo agente
+    span_min_duration: str = "5ms"
+
+    @classmethod
+    def for_environment(cls, environment: str) -> "ApmProfile":
+        """Perfil padrão de um ambiente (ver APM_ENVIRONMENT_DEFAULTS)"""
+        return cls(
+            environment=environment, **APM_ENVIRONMENT_DEFAULTS.get(environment, {})
+        )
+
+    def env(
+        self, service_name: str, transaction_sample_rate: Optional[float] = None
+    ) -> Dict[str, str]:
+        """Variáveis do agente para um serviço"""
+        sample_rate = (
+            self.transaction_sample_rate
+            if transaction_sample_rate is None
+            else transaction_sample_rate
+        )
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(
+                f"transaction_sample_rate de {service_name} deve estar entre 0 e 1: {sample_rate}"
+            )
+        return {
+            "ELASTIC_APM_ACTIVE": str(self.enabled).lower(),
+            "ELASTIC_APM_SERVICE_NAME": service_name,
+            "ELASTIC_APM_ENVIRONMENT": self.environment,
+            "ELASTIC_APM_TRANSACTION_SAMPLE_RATE": f"{sample_rate:g}",
+            "ELASTIC_APM_CENTRAL_CONFIG": str(self.central_config).lower(),
+            "ELASTIC_APM_SPAN_MIN_DURATION": self.span_min_duration,
+        }
+
+
+APM_ENVIRONMENT_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "sandbox": {"transaction_sample_rate": 1.0},
+    "production": {"transaction_sample_rate": 0.1, "span_min_duration": "10ms"},
+}
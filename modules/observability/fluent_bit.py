@@ -0,0 +1,337 @@
+import hashlib
+from typing import Dict, List, Optional, Any
+from urllib.parse import urlparse
+from pydantic import BaseModel
+import pulumi
+import pulumi_kubernetes as k8s
+
+# Diretório no node com o buffer em disco e a posição de leitura dos arquivos
+STATE_PATH = "/var/fluent-bit/state"
+
+
+class FluentBitConfig(BaseModel):
+    name: str = "fluent-bit"
+    namespace: str
+    image: str = "cr.fluentbit.io/fluent/fluent-bit:3.1"
+    # Containers com logs em JSON (Caddy e Hasura), expandidos em campos
+    json_containers: List[str] = ["caddy", "hasura"]
+    # Elasticsearch (secrets elasticsearch-cloud-id / elasticsearch-password)
+    elasticsearch_user: str = "elastic"
+    index_prefix: Optional[str] = None  # padrão: bonde-<namespace>
+    # Stand-in HTTP para testes (ex.: "http://log-sink:8080/bulk"), no lugar
+    # do Elasticsearch
+    sink_url: Optional[str] = None
+    # Backpressure: com storage.type filesystem o Mem_Buf_Limit não pausa o
+    # tail (os chunks vão para o disco); a pausa vem de
+    # storage.max_chunks_up + storage.pause_on_chunks_overlimit. Cada chunk
+    # ocupa até ~2MB em memória: 32 chunks (~64MB) cabem no limite de
+    # memória do container. Ajuste os dois juntos
+    max_chunks_up: int = 32
+    # Limite do buffer em disco por output; os chunks mais antigos são descartados
+    storage_limit: str = "1G"
+    flush_seconds: int = 5
+    workers: int = 2
+    tolerations: List[Dict[str, Any]] = [{"operator": "Exists"}]
+    resources: Dict[str, Any] = {
+        "requests": {"memory": "64Mi", "cpu": "50m"},
+        "limits": {"memory": "128Mi", "cpu": "200m"},
+    }
+
+
+class FluentBit(pulumi.ComponentResource):
+    """
+    Fluent Bit em DaemonSet, enviando os logs dos containers do namespace
+    ao Elasticsearch.
+
+    Lê /var/log/containers do node, adiciona os metadados do Kubernetes,
+    expande os logs JSON de `json_containers` e envia em lotes (bulk). Os
+    chunks ficam em disco no node (`storage.type filesystem`): se o
+    Elasticsearch ficar lento ou fora, o envio é refeito sem bloquear as
+    aplicações e sem perder logs entre restarts do Fluent Bit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: FluentBitConfig,
+        opts: Optional[pulumi.ResourceOptions] = None,
+    ):
+        super().__init__("custom:observability:FluentBit", name, {}, opts)
+
+        self.config = config
+
+        self.service_account = self._create_rbac()
+        self.config_map = self._create_config_map()
+        self.daemon_set = self._create_daemon_set()
+
+        self.register_outputs(
+            {
+                "daemon_set_name": self.daemon_set.metadata.name,
+                "output": "http" if config.sink_url else "es",
+            }
+        )
+
+    def _output_section(self) -> List[str]:
+        """Output para o Elasticsearch (ou o stand-in HTTP)"""
+        common = [
+            "    Match                    kube.*",
+            "    Retry_Limit              False",
+            f"    Workers                  {self.config.workers}",
+            f"    storage.total_limit_size {self.config.storage_limit}",
+        ]
+
+        if self.config.sink_url:
+            sink = urlparse(self.config.sink_url)
+            return [
+                "[OUTPUT]",
+                "    Name                     http",
+                f"    Host                     {sink.hostname}",
+                f"    Port                     {sink.port or (443 if sink.scheme == 'https' else 80)}",
+                f"    URI                      {sink.path or '/'}",
+                "    Format                   json_lines",
+                f"    tls                      {'On' if sink.scheme == 'https' else 'Off'}",
+                *common,
+            ]
+
+        index_prefix = self.config.index_prefix or f"bonde-{self.config.namespace}"
+        return [
+            "[OUTPUT]",
+            "    Name                     es",
+            "    Cloud_ID                 ${ELASTICSEARCH_CLOUD_ID}",
+            f"    Cloud_Auth               {self.config.elasticsearch_user}:${{ELASTICSEARCH_PASSWORD}}",
+            "    tls                      On",
+            "    Logstash_Format          On",
+            f"    Logstash_Prefix          {index_prefix}",
+            "    Suppress_Type_Name       On",
+            "    Replace_Dots             On",
+            "    Buffer_Size              False",
+            "    Trace_Error              On",
+            *common,
+        ]
+
+    def _fluent_bit_conf(self) -> str:
+        """fluent-bit.conf (formato clássico)"""
+        namespace = self.config.namespace
+        lines = [
+            "[SERVICE]",
+            f"    Flush                     {self.config.flush_seconds}",
+            "    Log_Level                 info",
+            "    Parsers_File              /fluent-bit/etc/parsers.conf",
+            "    HTTP_Server               On",
+            "    HTTP_Listen               0.0.0.0",
+            "    HTTP_Port                 2020",
+            "    Health_Check              On",
+            f"    storage.path              {STATE_PATH}/buffer",
+            "    storage.sync              normal",
+            "    storage.backlog.mem_limit 5M",
+            f"    storage.max_chunks_up     {self.config.max_chunks_up}",
+            "",
+            "[INPUT]",
+            "    Name              tail",
+            "    Tag               kube.*",
+            # Arquivos <pod>_<namespace>_<container>-<id>.log do namespace
+            f"    Path              /var/log/containers/*_{namespace}_*.log",
+            "    multiline.parser  docker, cri",
+            f"    DB                {STATE_PATH}/tail.db",
+            "    Skip_Long_Lines   On",
+            "    Refresh_Interval  10",
+            "    storage.type      filesystem",
+            # Backpressure: com chunks demais em memória o tail pausa em vez
+            # de continuar lendo para o disco
+            "    storage.pause_on_chunks_overlimit On",
+            "",
+            "[FILTER]",
+            "    Name                kubernetes",
+            "    Match               kube.*",
+            "    Kube_Tag_Prefix     kube.var.log.containers.",
+            "    Merge_Log           Off",
+            "    Labels              On",
+            "    Annotations         Off",
+            "",
+        ]
+        for container in self.config.json_containers:
+            lines += [
+                "[FILTER]",
+                "    Name         parser",
+                f"    Match        kube.*_{namespace}_{container}-*",
+                "    Key_Name     log",
+                "    Parser       json",
+                "    Reserve_Data On",
+                "",
+            ]
+        lines += self._output_section() + [""]
+        return "\n".join(lines)
+
+    def _create_rbac(self) -> k8s.core.v1.ServiceAccount:
+        """ServiceAccount com leitura dos pods do namespace (filtro kubernetes)"""
+        labels = {"app": self.config.name}
+        service_account = k8s.core.v1.ServiceAccount(
+            f"{self.config.name}-sa",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.config.name, namespace=self.config.namespace, labels=labels
+            ),
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+        role = k8s.rbac.v1.Role(
+            f"{self.config.name}-role",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.config.name, namespace=self.config.namespace, labels=labels
+            ),
+            rules=[
+                k8s.rbac.v1.PolicyRuleArgs(
+                    api_groups=[""], resources=["pods"], verbs=["get", "list", "watch"]
+                )
+            ],
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+        k8s.rbac.v1.RoleBinding(
+            f"{self.config.name}-rolebinding",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.config.name, namespace=self.config.namespace, labels=labels
+            ),
+            role_ref=k8s.rbac.v1.RoleRefArgs(
+                api_group="rbac.authorization.k8s.io",
+                kind="Role",
+                name=role.metadata["name"],
+            ),
+            subjects=[
+                k8s.rbac.v1.SubjectArgs(
+                    kind="ServiceAccount",
+                    name=service_account.metadata["name"],
+                    namespace=self.config.namespace,
+                )
+            ],
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+        return service_account
+
+    def _create_config_map(self) -> k8s.core.v1.ConfigMap:
+        """ConfigMap com o fluent-bit.conf"""
+        return k8s.core.v1.ConfigMap(
+            f"{self.config.name}-config",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=f"{self.config.name}-config",
+                namespace=self.config.namespace,
+                labels={"app": self.config.name},
+            ),
+            data={"fluent-bit.conf": self._fluent_bit_conf()},
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+
+    def _create_daemon_set(self) -> k8s.apps.v1.DaemonSet:
+        """DaemonSet do Fluent Bit (um por node)"""
+        env_vars = []
+        if not self.config.sink_url:
+            for env_name, secret_name in [
+                ("ELASTICSEARCH_CLOUD_ID", "elasticsearch-cloud-id"),
+                ("ELASTICSEARCH_PASSWORD", "elasticsearch-password"),
+            ]:
+                env_vars.append(
+                    k8s.core.v1.EnvVarArgs(
+                        name=env_name,
+                        value_from=k8s.core.v1.EnvVarSourceArgs(
+                            secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(
+                                name=secret_name, key=env_name
+                            )
+                        ),
+                    )
+                )
+
+        revision = hashlib.sha256(self._fluent_bit_conf().encode()).hexdigest()[:12]
+
+        return k8s.apps.v1.DaemonSet(
+            f"{self.config.name}-daemonset",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.config.name,
+                namespace=self.config.namespace,
+                labels={"app": self.config.name},
+            ),
+            spec=k8s.apps.v1.DaemonSetSpecArgs(
+                selector=k8s.meta.v1.LabelSelectorArgs(
+                    match_labels={"app": self.config.name}
+                ),
+                template=k8s.core.v1.PodTemplateSpecArgs(
+                    metadata=k8s.meta.v1.ObjectMetaArgs(
+                        labels={"app": self.config.name},
+                        # ✅ Rolling update quando a configuração mudar
+                        annotations={"config/revision": revision},
+                    ),
+                    spec=k8s.core.v1.PodSpecArgs(
+                        service_account_name=self.service_account.metadata["name"],
+                        tolerations=self.config.tolerations or None,
+                        containers=[
+                            k8s.core.v1.ContainerArgs(
+                                name="fluent-bit",
+                                image=self.config.image,
+                                args=[
+                                    "/fluent-bit/bin/fluent-bit",
+                                    "-c",
+                                    "/fluent-bit/etc/conf/fluent-bit.conf",
+                                ],
+                                env=env_vars,
+                                ports=[
+                                    k8s.core.v1.ContainerPortArgs(
+                                        container_port=2020, name="http"
+                                    )
+                                ],
+                                volume_mounts=[
+                                    k8s.core.v1.VolumeMountArgs(
+                                        name="config",
+                                        mount_path="/fluent-bit/etc/conf",
+                                        read_only=True,
+                                    ),
+                                    k8s.core.v1.VolumeMountArgs(
+                                        name="varlog",
+                                        mount_path="/var/log",
+                                        read_only=True,
+                                    ),
+                                    k8s.core.v1.VolumeMountArgs(
+                                        name="state", mount_path=STATE_PATH
+                                    ),
+                                ],
+                                resources=k8s.core.v1.ResourceRequirementsArgs(
+                                    requests=self.config.resources.get("requests", {}),
+                                    limits=self.config.resources.get("limits", {}),
+                                ),
+                                liveness_probe=k8s.core.v1.ProbeArgs(
+                                    http_get=k8s.core.v1.HTTPGetActionArgs(
+                                        path="/", port=2020
+                                    ),
+                                    initial_delay_seconds=10,
+                                    period_seconds=30,
+                                ),
+                                readiness_probe=k8s.core.v1.ProbeArgs(
+                                    http_get=k8s.core.v1.HTTPGetActionArgs(
+                                        path="/api/v1/health", port=2020
+                                    ),
+                                    period_seconds=10,
+                                ),
+                            )
+                        ],
+                        volumes=[
+                            k8s.core.v1.VolumeArgs(
+                                name="config",
+                                config_map=k8s.core.v1.ConfigMapVolumeSourceArgs(
+                                    name=self.config_map.metadata["name"]
+                                ),
+                            ),
+                            k8s.core.v1.VolumeArgs(
+                                name="varlog",
+                                host_path=k8s.core.v1.HostPathVolumeSourceArgs(
+                                    path="/var/log"
+                                ),
+                            ),
+                            # Buffer e posição de leitura sobrevivem a restarts
+                            k8s.core.v1.VolumeArgs(
+                                name="state",
+                                host_path=k8s.core.v1.HostPathVolumeSourceArgs(
+                                    path=f"{STATE_PATH}/{self.config.namespace}",
+                                    type="DirectoryOrCreate",
+                                ),
+                            ),
+                        ],
+                    ),
+                ),
+            ),
+            opts=pulumi.ResourceOptions(parent=self),
+        )
@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional, Any
+from pydantic import BaseModel
+
+# Nível do perfil → nível equivalente em cada componente
+LEVELS = ["debug", "info", "warn", "error"]
+CADDY_LEVELS = {"debug": "DEBUG", "info": "INFO", "warn": "WARN", "error": "ERROR"}
+
+
+class LoggingSamplingConfig(BaseModel):
+    """
+    Amostragem de logs de alto volume (access log do Caddy): por intervalo,
+    registra os `first` primeiros e depois 1 a cada `thereafter`.
+    """
+
+    interval_seconds: float = 1
+    first: int = 100
+    thereafter: int = 100
+
+
+class LoggingProfile(BaseModel):
+    """
+    Perfil de logs do stack, aplicado a todos os componentes.
+
+    - WebService: LOG_LEVEL (um LOG_LEVEL no YAML do serviço tem prioridade)
+    - HasuraGateway: HASURA_GRAPHQL_LOG_LEVEL e ENABLED_LOG_TYPES
+    - N8NOrchestrator: N8N_LOG_LEVEL
+    - CaddyStack: nível dos logs e access log (com amostragem)
+
+    `overrides` ajusta o nível de um componente específico
+    (ex.: {"hasura": "debug"}) sem mudar o restante do stack.
+    """
+
+    level: str = "info"  # debug, info, warn, error
+    overrides: Dict[str, str] = {}  # webservice, hasura, n8n, caddy
+    # query-log registra cada query: caro em CPU e I/O, apenas para debug
+    hasura_log_types: List[str] = ["startup", "http-log", "webhook-log", "websocket-log"]
+    access_log: bool = True
+    access_log_sampling: Optional[LoggingSamplingConfig] = None
+
+    @classmethod
+    def for_environment(cls, environment: str) -> "LoggingProfile":
+        """Perfil padrão de um ambiente (ver LOGGING_ENVIRONMENT_DEFAULTS)"""
+        return cls(**LOGGING_ENVIRONMENT_DEFAULTS.get(environment, {}))
+
+    def level_for(self, component: str) -> str:
+        level = self.overrides.get(component, self.level)
+        if level not in LEVELS:
+            raise ValueError(f"Nível de log desconhecido para {component}: {level}")
+        return level
+
+    def caddy_logging(self) -> Dict[str, Any]:
+        """Bloco `logging` do JSON do Caddy"""
+        logs: Dict[str, Any] = {
+            "default": {
+                "level": CADDY_LEVELS[self.level_for("caddy")],
+                "exclude": ["http.log.access"],
+            }
+        }
+        if self.access_log:
+            access: Dict[str, Any] = {"level": "INFO", "include": ["http.log.access"]}
+            if self.access_log_sampling:
+                sampling = self.access_log_sampling
+                access["sampling"] = {
+                    # time.Duration no JSON do Caddy: inteiro em nanossegundos
+                    "interval": int(sampling.interval_seconds * 1_000_000_000),
+                    "first": sampling.first,
+                    "thereafter": sampling.thereafter,
+                }
+            logs["access"] = access
+        return {"logs": logs}
+
+
+LOGGING_ENVIRONMENT_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "sandbox": {"level": "info"},
+    "production": {
+        "level": "warn",
+        "hasura_log_types": ["startup", "http-log", "webhook-log"],
+        "access_log_sampling": {"interval_seconds": 1, "first": 50, "thereafter": 20},
+    },
+}
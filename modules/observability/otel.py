@@ -0,0 +1,380 @@
+import hashlib
+import json
+from typing import Dict, List, Optional, Any
+from pydantic import BaseModel
+import pulumi
+import pulumi_kubernetes as k8s
+
+from modules.base import create_pod_disruption_budget
+from .apm import APM_SECRETS
+
+OTLP_GRPC_PORT = 4317
+OTLP_HTTP_PORT = 4318
+
+
+class OtelSamplingConfig(BaseModel):
+    """
+    Tail sampling no gateway: a decisão é tomada com o trace completo.
+
+    Mantém todos os traces com erro e os mais lentos que `latency_threshold_ms`;
+    do restante, apenas `baseline_percentage`% seguem para o Elastic.
+    """
+
+    latency_threshold_ms: int = 1000
+    baseline_percentage: float = 5
+    # Tempo de espera pelos spans de um trace antes de decidir
+    decision_wait: str = "10s"
+    # Traces mantidos em memória aguardando decisão
+    num_traces: int = 50000
+
+
+class OtelCollectorConfig(BaseModel):
+    name: str = "otel"
+    namespace: str
+    image: str = "otel/opentelemetry-collector-contrib:0.111.0"
+    gateway_replicas: int = 2
+    sampling: OtelSamplingConfig = OtelSamplingConfig()
+    # Endpoint OTLP (gRPC) alternativo ao Elastic APM, ex.: um sink local
+    # para testes ("otlp-sink:4317"). Sem TLS nem autenticação.
+    sink_endpoint: Optional[str] = None
+    batch_size: int = 1024
+    batch_timeout: str = "5s"
+    agent_resources: Dict[str, Any] = {
+        "requests": {"memory": "64Mi", "cpu": "50m"},
+        "limits": {"memory": "256Mi", "cpu": "200m"},
+    }
+    gateway_resources: Dict[str, Any] = {
+        "requests": {"memory": "256Mi", "cpu": "100m"},
+        "limits": {"memory": "1Gi", "cpu": "500m"},
+    }
+
+
+class OtelCollector(pulumi.ComponentResource):
+    """
+    Coletor OpenTelemetry em duas camadas.
+
+    - agent (DaemonSet): recebe OTLP dos pods do próprio node (Service com
+      internalTrafficPolicy Local) e distribui os spans entre os gateways
+      pelo traceID, para que cada trace chegue inteiro a um único gateway
+    - gateway (Deployment): aplica o tail sampling, agrupa em lotes e exporta
+      para o Elastic APM (secrets elastic-apm-*) ou para `sink_endpoint`
+
+    Os componentes recebem `grpc_endpoint`/`http_endpoint` como
+    OTEL_EXPORTER_OTLP_ENDPOINT.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: OtelCollectorConfig,
+        opts: Optional[pulumi.ResourceOptions] = None,
+    ):
+        super().__init__("custom:observability:OtelCollector", name, {}, opts)
+
+        self.config = config
+        self.agent_name = f"{config.name}-agent"
+        self.gateway_name = f"{config.name}-gateway"
+
+        self.agent_config_map = self._create_config_map(
+            self.agent_name, self._agent_config()
+        )
+        self.gateway_config_map = self._create_config_map(
+            self.gateway_name, self._gateway_config()
+        )
+        self.agent = self._create_agent()
+        self.agent_service = self._create_service(self.agent_name)
+        self.gateway = self._create_gateway()
+        # Headless: o exporter loadbalancing resolve os IPs dos gateways via DNS
+        self.gateway_service = self._create_service(self.gateway_name, headless=True)
+        self.gateway_pdb = (
+            create_pod_disruption_budget(
+                self.gateway_name,
+                config.namespace,
+                match_labels={"app": self.gateway_name},
+                min_available=1,
+                opts=pulumi.ResourceOptions(parent=self),
+            )
+            if config.gateway_replicas > 1
+            else None
+        )
+
+        host = f"{self.agent_name}.{config.namespace}.svc.cluster.local"
+        self.grpc_endpoint = f"http://{host}:{OTLP_GRPC_PORT}"
+        self.http_endpoint = f"http://{host}:{OTLP_HTTP_PORT}"
+
+        self.register_outputs(
+            {
+                "grpc_endpoint": self.grpc_endpoint,
+                "http_endpoint": self.http_endpoint,
+            }
+        )
+
+    def _agent_config(self) -> Dict[str, Any]:
+        """Configuração do agent: OTLP → loadbalancing (por traceID)"""
+        return {
+            "receivers": {
+                "otlp": {
+                    "protocols": {
+                        "grpc": {"endpoint": f"0.0.0.0:{OTLP_GRPC_PORT}"},
+                        "http": {"endpoint": f"0.0.0.0:{OTLP_HTTP_PORT}"},
+                    }
+                }
+            },
+            "processors": {
+                "memory_limiter": {
+                    "check_interval": "1s",
+                    "limit_percentage": 80,
+                    "spike_limit_percentage": 25,
+                },
+                "batch": {"timeout": "1s"},
+            },
+            "exporters": {
+                "loadbalancing": {
+                    "routing_key": "traceID",
+                    "protocol": {"otlp": {"tls": {"insecure": True}}},
+                    "resolver": {
+                        "dns": {
+                            "hostname": f"{self.gateway_name}.{self.config.namespace}.svc.cluster.local",
+                            "port": OTLP_GRPC_PORT,
+                        }
+                    },
+                }
+            },
+            "service": {
+                "pipelines": {
+                    "traces": {
+                        "receivers": ["otlp"],
+                        "processors": ["memory_limiter", "batch"],
+                        "exporters": ["loadbalancing"],
+                    }
+                }
+            },
+        }
+
+    def _gateway_config(self) -> Dict[str, Any]:
+        """Configuração do gateway: tail sampling → batch → exporter"""
+        sampling = self.config.sampling
+        if self.config.sink_endpoint:
+            exporter = {
+                "endpoint": self.config.sink_endpoint,
+                "tls": {"insecure": True},
+            }
+        else:
+            exporter = {
+                "endpoint": "${env:ELASTIC_APM_SERVER_URL}",
+                "headers": {"Authorization": "Bearer ${env:ELASTIC_APM_SECRET_TOKEN}"},
+            }
+
+        return {
+            "receivers": {
+                "otlp": {
+                    "protocols": {"grpc": {"endpoint": f"0.0.0.0:{OTLP_GRPC_PORT}"}}
+                }
+            },
+            "processors": {
+                "memory_limiter": {
+                    "check_interval": "1s",
+                    "limit_percentage": 80,
+                    "spike_limit_percentage": 25,
+                },
+                "tail_sampling": {
+                    "decision_wait": sampling.decision_wait,
+                    "num_traces": sampling.num_traces,
+                    "policies": [
+                        {
+                            "name": "errors",
+                            "type": "status_code",
+                            "status_code": {"status_codes": ["ERROR"]},
+                        },
+                        {
+                            "name": "slow",
+                            "type": "latency",
+                            "latency": {"threshold_ms": sampling.latency_threshold_ms},
+                        },
+                        {
+                            "name": "baseline",
+                            "type": "probabilistic",
+                            "probabilistic": {
+                                "sampling_percentage": sampling.baseline_percentage
+                            },
+                        },
+                    ],
+                },
+                "batch": {
+                    "send_batch_size": self.config.batch_size,
+                    "timeout": self.config.batch_timeout,
+                },
+            },
+            "exporters": {"otlp": exporter},
+            "service": {
+                "pipelines": {
+                    "traces": {
+                        "receivers": ["otlp"],
+                        "processors": ["memory_limiter", "tail_sampling", "batch"],
+                        "exporters": ["otlp"],
+                    }
+                }
+            },
+        }
+
+    def _create_config_map(self, name: str, config: Dict[str, Any]) -> k8s.core.v1.ConfigMap:
+        """ConfigMap com o config.yaml do coletor (JSON é YAML válido)"""
+        return k8s.core.v1.ConfigMap(
+            f"{name}-config",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=f"{name}-config",
+                namespace=self.config.namespace,
+                labels={"app": name},
+            ),
+            data={"config.yaml": json.dumps(config, indent=2)},
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+
+    def _pod_template(
+        self,
+        name: str,
+        config: Dict[str, Any],
+        resources: Dict[str, Any],
+        ports: List[int],
+        env: Optional[List[k8s.core.v1.EnvVarArgs]] = None,
+    ) -> k8s.core.v1.PodTemplateSpecArgs:
+        """Pod do coletor com o config.yaml montado do ConfigMap"""
+        revision = hashlib.sha256(json.dumps(config).encode()).hexdigest()[:12]
+        return k8s.core.v1.PodTemplateSpecArgs(
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                labels={"app": name},
+                # ✅ Rolling update quando a configuração mudar
+                annotations={"config/revision": revision},
+            ),
+            spec=k8s.core.v1.PodSpecArgs(
+                containers=[
+                    k8s.core.v1.ContainerArgs(
+                        name="otel-collector",
+                        image=self.config.image,
+                        args=["--config=/etc/otel/config.yaml"],
+                        ports=[
+                            k8s.core.v1.ContainerPortArgs(
+                                container_port=port,
+                                name="otlp-grpc" if port == OTLP_GRPC_PORT else "otlp-http",
+                            )
+                            for port in ports
+                        ],
+                        env=env,
+                        volume_mounts=[
+                            k8s.core.v1.VolumeMountArgs(
+                                name="otel-config", mount_path="/etc/otel", read_only=True
+                            )
+                        ],
+                        resources=k8s.core.v1.ResourceRequirementsArgs(
+                            requests=resources.get("requests", {}),
+                            limits=resources.get("limits", {}),
+                        ),
+                    )
+                ],
+                volumes=[
+                    k8s.core.v1.VolumeArgs(
+                        name="otel-config",
+                        config_map=k8s.core.v1.ConfigMapVolumeSourceArgs(
+                            name=f"{name}-config"
+                        ),
+                    )
+                ],
+            ),
+        )
+
+    def _create_agent(self) -> k8s.apps.v1.DaemonSet:
+        """DaemonSet do agent (um coletor por node)"""
+        return k8s.apps.v1.DaemonSet(
+            f"{self.agent_name}-daemonset",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.agent_name,
+                namespace=self.config.namespace,
+                labels={"app": self.agent_name},
+            ),
+            spec=k8s.apps.v1.DaemonSetSpecArgs(
+                selector=k8s.meta.v1.LabelSelectorArgs(
+                    match_labels={"app": self.agent_name}
+                ),
+                template=self._pod_template(
+                    self.agent_name,
+                    self._agent_config(),
+                    self.config.agent_resources,
+                    [OTLP_GRPC_PORT, OTLP_HTTP_PORT],
+                ),
+            ),
+            opts=pulumi.ResourceOptions(
+                parent=self, depends_on=[self.agent_config_map]
+            ),
+        )
+
+    def _create_gateway(self) -> k8s.apps.v1.Deployment:
+        """Deployment do gateway (tail sampling e exportação)"""
+        env = None
+        if not self.config.sink_endpoint:
+            env = [
+                k8s.core.v1.EnvVarArgs(
+                    name=env_name,
+                    value_from=k8s.core.v1.EnvVarSourceArgs(
+                        secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(
+                            name=secret_name, key=env_name
+                        )
+                    ),
+                )
+                for env_name, secret_name in APM_SECRETS.items()
+            ]
+
+        return k8s.apps.v1.Deployment(
+            f"{self.gateway_name}-deployment",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=self.gateway_name,
+                namespace=self.config.namespace,
+                labels={"app": self.gateway_name},
+            ),
+            spec=k8s.apps.v1.DeploymentSpecArgs(
+                replicas=self.config.gateway_replicas,
+                selector=k8s.meta.v1.LabelSelectorArgs(
+                    match_labels={"app": self.gateway_name}
+                ),
+                template=self._pod_template(
+                    self.gateway_name,
+                    self._gateway_config(),
+                    self.config.gateway_resources,
+                    [OTLP_GRPC_PORT],
+                    env,
+                ),
+            ),
+            opts=pulumi.ResourceOptions(
+                parent=self, depends_on=[self.gateway_config_map]
+            ),
+        )
+
+    def _create_service(self, name: str, headless: bool = False) -> k8s.core.v1.Service:
+        """Service OTLP do agent (tráfego local ao node) ou do gateway (headless)"""
+        ports = [
+            k8s.core.v1.ServicePortArgs(
+                port=OTLP_GRPC_PORT, target_port=OTLP_GRPC_PORT, name="otlp-grpc"
+            )
+        ]
+        if not headless:
+            ports.append(
+                k8s.core.v1.ServicePortArgs(
+                    port=OTLP_HTTP_PORT, target_port=OTLP_HTTP_PORT, name="otlp-http"
+                )
+            )
+
+        return k8s.core.v1.Service(
+            f"{name}-service",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=name,
+                namespace=self.config.namespace,
+                labels={"app": name},
+            ),
+            spec=k8s.core.v1.ServiceSpecArgs(
+                selector={"app": name},
+                ports=ports,
+                type="ClusterIP",
+                cluster_ip="None" if headless else None,
+                internal_traffic_policy=None if headless else "Local",
+            ),
+            opts=pulumi.ResourceOptions(parent=self),
+        )
@@ -0,0 +1,177 @@
+import re
+from typing import Dict, List, Optional, Any
+from pydantic import BaseModel
+import pulumi
+import pulumi_kubernetes as k8s
+
+# Janelas das recording rules usadas pelos alertas
+SLI_WINDOWS = ["5m", "30m", "1h", "2h", "6h", "1d", "3d"]
+
+# Alertas multi-window de burn rate (SRE Workbook): fração do error budget
+# consumida na janela longa, janela longa, janela curta e severidade
+BURN_RATE_ALERTS = [
+    (0.02, "1h", "5m", "page"),
+    (0.05, "6h", "30m", "page"),
+    (0.10, "1d", "2h", "ticket"),
+    (0.10, "3d", "6h", "ticket"),
+]
+
+DURATION_HOURS = {"m": 1 / 60, "h": 1, "d": 24, "w": 24 * 7}
+
+
+class SloConfig(BaseModel):
+    """
+    Objetivos de disponibilidade e latência de um componente.
+
+    - availability: fração das requisições sem erro 5xx na janela
+    - latency_threshold_seconds / latency_target: fração das requisições
+      mais rápidas que o limite (0.95 = p95). O limite precisa ser um dos
+      buckets (`le`) do histograma
+    - metric: histograma Prometheus (padrão definido pelo componente)
+    """
+
+    availability: float = 0.995
+    latency_threshold_seconds: float = 0.5
+    latency_target: float = 0.95
+    window: str = "30d"
+    metric: Optional[str] = None
+    status_label: str = "code"
+
+
+def duration_hours(duration: str) -> float:
+    """Converte uma duração do Prometheus (ex.: 30d, 6h, 5m) em horas"""
+    match = re.fullmatch(r"(\d+)([mhdw])", duration)
+    if not match:
+        raise ValueError(f"Duração inválida: {duration}")
+    return int(match.group(1)) * DURATION_HOURS[match.group(2)]
+
+
+def burn_rate(budget_fraction: float, long_window: str, slo_window: str) -> float:
+    """Burn rate que consome `budget_fraction` do error budget em `long_window`"""
+    return round(budget_fraction * duration_hours(slo_window) / duration_hours(long_window), 2)
+
+
+def latency_quantile_record(slo: SloConfig) -> str:
+    """Nome da recording rule do quantil do objetivo (0.95 → slo:latency_p95:5m)"""
+    return f"slo:latency_p{slo.latency_target * 100:g}:5m".replace(".", "_")
+
+
+def build_slo_rules(
+    name: str, namespace: str, slo: SloConfig, selector: Dict[str, str]
+) -> Dict[str, Any]:
+    """
+    Spec do PrometheusRule de um SLO.
+
+    Args:
+        name: Nome do SLO (label `slo` das séries e alertas)
+        namespace: Namespace do componente; entra no seletor e nos labels das
+            séries, já que o Prometheus é compartilhado entre os ambientes
+        slo: Objetivos
+        selector: Labels que isolam as séries do componente no histograma
+    """
+    if not slo.metric:
+        raise ValueError(f"SLO {name}: metric não definida")
+    for target in [slo.availability, slo.latency_target]:
+        if not 0 < target < 1:
+            raise ValueError(f"SLO {name}: objetivos devem estar entre 0 e 1")
+
+    duration_hours(slo.window)  # valida a janela antes de gerar as regras
+
+    selector = {**selector, "namespace": namespace}
+    labels = ",".join(f'{key}="{value}"' for key, value in sorted(selector.items()))
+    errors = f'{labels},{slo.status_label}=~"5.."'
+    fast = f'{labels},le="{slo.latency_threshold_seconds:g}"'
+    count = f"{slo.metric}_count"
+    bucket = f"{slo.metric}_bucket"
+    rule_labels = {"slo": name, "namespace": namespace}
+    series = f'slo="{name}",namespace="{namespace}"'
+
+    recording_rules: List[Dict[str, Any]] = []
+    for window in SLI_WINDOWS:
+        total = f"sum(rate({count}{{{labels}}}[{window}]))"
+        recording_rules += [
+            {
+                "record": f"slo:sli_error:ratio_rate{window}",
+                "expr": f"sum(rate({count}{{{errors}}}[{window}])) / {total}",
+                "labels": rule_labels,
+            },
+            {
+                "record": f"slo:sli_latency_error:ratio_rate{window}",
+                "expr": f"1 - sum(rate({bucket}{{{fast}}}[{window}])) / {total}",
+                "labels": rule_labels,
+            },
+        ]
+    recording_rules.append(
+        {
+            "record": latency_quantile_record(slo),
+            "expr": (
+                f"histogram_quantile({slo.latency_target:g}, "
+                f"sum by (le) (rate({bucket}{{{labels}}}[5m])))"
+            ),
+            "labels": rule_labels,
+        }
+    )
+
+    alert_rules: List[Dict[str, Any]] = []
+    for sli, target, description in [
+        ("sli_error", slo.availability, "taxa de erro"),
+        ("sli_latency_error", slo.latency_target, f"latência acima de {slo.latency_threshold_seconds:g}s"),
+    ]:
+        budget = round(1 - target, 6)
+        for budget_fraction, long_window, short_window, severity in BURN_RATE_ALERTS:
+            factor = burn_rate(budget_fraction, long_window, slo.window)
+            threshold = round(factor * budget, 6)
+            alert_rules.append(
+                {
+                    "alert": f"SLOBurnRate{'Errors' if sli == 'sli_error' else 'Latency'}",
+                    "expr": (
+                        f"slo:{sli}:ratio_rate{long_window}{{{series}}} > {threshold} "
+                        f"and slo:{sli}:ratio_rate{short_window}{{{series}}} > {threshold}"
+                    ),
+                    "labels": {
+                        **rule_labels,
+                        "severity": severity,
+                        "long_window": long_window,
+                    },
+                    "annotations": {
+                        "summary": (
+                            f"{name}: {description} consumindo o error budget "
+                            f"{factor:g}x mais rápido que o sustentável"
+                        ),
+                        "description": (
+                            f"{budget_fraction:.0%} do error budget de {slo.window} "
+                            f"(objetivo {target:.2%}) consumido em {long_window}"
+                        ),
+                    },
+                }
+            )
+
+    return {
+        "groups": [
+            {"name": f"slo-{name}-recording", "rules": recording_rules},
+            {"name": f"slo-{name}-alerts", "rules": alert_rules},
+        ]
+    }
+
+
+def create_slo_rule(
+    name: str,
+    namespace: str,
+    slo: SloConfig,
+    selector: Dict[str, str],
+    opts: Optional[pulumi.ResourceOptions] = None,
+) -> k8s.apiextensions.CustomResource:
+    """
+    PrometheusRule com as recording rules e os alertas de burn rate do SLO
+    (requer o kube-prometheus-stack do stack shared).
+    """
+    return k8s.apiextensions.CustomResource(
+        f"{name}-slo",
+        api_version="monitoring.coreos.com/v1",
+        kind="PrometheusRule",
+        metadata=k8s.meta.v1.ObjectMetaArgs(
+            name=f"{name}-slo", namespace=namespace, labels={"slo": name}
+        ),
+        spec=build_slo_rules(name, namespace, slo, selector),
+        opts=opts,
+    )
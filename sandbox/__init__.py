@@ -1,45 +1,276 @@
+from typing import Optional
+from urllib.parse import urlparse
+
 import pulumi
+import pulumi_aws as aws
 import pulumi_kubernetes as k8s
 
 from tools.loader import load_service_configs
 from tools.envs import load_env_secrets
-from modules.ingress import create_caddy, create_on_demand_service
+from tools.db_budget import (
+    ConnectionUsage,
+    check_budget,
+    estimate_hasura,
+    estimate_n8n,
+    estimate_webservices,
+    load_max_connections,
+)
+from modules.ingress import (
+    create_caddy,
+    create_on_demand_service,
+    CaddyConfig,
+    CaddyLoadBalancerConfig,
+    CaddyMetricsConfig,
+    CaddyStorageConfig,
+    CaddyTenantsConfig,
+    CaddyRouteConfig,
+    CaddyCacheConfig,
+    CaddyLoadBalancingConfig,
+    CaddyTransportConfig,
+    CaddyCanaryConfig,
+    CaddyRateLimitConfig,
+    CaddyPathRouteConfig,
+    OnDemandConfig,
+    OnDemandWarmupConfig,
+)
+from modules.base import AutoscalingConfig
+from modules.observability import (
+    LoggingProfile,
+    ApmProfile,
+    OtelCollector,
+    OtelCollectorConfig,
+    FluentBit,
+    FluentBitConfig,
+    SloConfig,
+)
+from modules.data import PgBouncer, PgBouncerConfig
 from modules.apps.webservice import WebService
-from modules.apps.api import HasuraGateway
-from modules.apps.workflows import N8NOrchestrator, N8NConfig
+from modules.apps.api import HasuraGateway, HasuraConfig, HasuraPoolConfig
+from modules.apps.workflows import (
+    N8NOrchestrator,
+    N8NConfig,
+    N8NExecutionsConfig,
+    N8NQueueConfig,
+)
 
 
-def create_sandbox_env():
+def create_sandbox_env(
+    hasura_config: Optional[HasuraConfig] = None,
+    logging_profile: Optional[LoggingProfile] = None,
+    apm_profile: Optional[ApmProfile] = None,
+):
     """
     Stack SANDBOX: Ambiente completo com conexão automática ALB → Caddy
+
+    Args:
+        hasura_config: Perfil do Hasura (padrão: HasuraConfig.for_environment("sandbox"))
+        logging_profile: Perfil de logs (padrão: LoggingProfile.for_environment("sandbox"))
+        apm_profile: Padrões do Elastic APM (padrão: ApmProfile.for_environment("sandbox"))
     """
+    logging_profile = logging_profile or LoggingProfile.for_environment("sandbox")
+    apm_profile = apm_profile or ApmProfile.for_environment("sandbox")
     shared_stack = pulumi.StackReference("nossas/infra-eks/shared")
     kubeconfig = shared_stack.get_output("kubeconfig")
 
     sandbox_provider = k8s.Provider("k8s-sandbox", kubeconfig=kubeconfig)
 
+    # NLB com targets IP (aws-load-balancer-controller). O IP do cliente é
+    # preservado no target group, já que o PROXY protocol não funciona com
+    # o listener UDP do HTTP/3.
+    caddy_load_balancer = CaddyLoadBalancerConfig(
+        target_type="ip", preserve_client_ip=True
+    )
+
     namespace = pulumi.get_stack()
     sandbox_namespace = k8s.core.v1.Namespace(
         "sandbox-ns",
-        metadata=k8s.meta.v1.ObjectMetaArgs(name=namespace),
+        metadata=k8s.meta.v1.ObjectMetaArgs(
+            name=namespace,
+            # Pod readiness gates do aws-load-balancer-controller
+            labels=caddy_load_balancer.namespace_labels,
+        ),
         opts=pulumi.ResourceOptions(provider=sandbox_provider),
     )
 
+    # ✅ Coletor OpenTelemetry (tail sampling antes do Elastic APM)
+    otel_collector = OtelCollector(
+        "otel",
+        config=OtelCollectorConfig(namespace=namespace, gateway_replicas=1),
+        opts=pulumi.ResourceOptions(
+            provider=sandbox_provider, depends_on=[sandbox_namespace]
+        ),
+    )
+
+    # ✅ Logs dos containers do namespace no Elasticsearch
+    FluentBit(
+        "fluent-bit",
+        config=FluentBitConfig(namespace=namespace),
+        opts=pulumi.ResourceOptions(
+            provider=sandbox_provider, depends_on=[sandbox_namespace]
+        ),
+    )
+
     # ✅ On-Demand para ser utilizado no Caddy
     on_demand_service = create_on_demand_service(
-        "on-demand", namespace, sandbox_provider, "sandbox"
+        "on-demand",
+        namespace,
+        sandbox_provider,
+        "sandbox",
+        config=OnDemandConfig(
+            autoscaling=AutoscalingConfig(min_replicas=1, max_replicas=3),
+            warmup=OnDemandWarmupConfig(enabled=True, schedule="0 4 * * *"),
+        ),
+    )
+
+    # ✅ Bucket S3 para storage compartilhado de certificados do Caddy
+    # (sobrevive a reschedules, ao contrário de um Redis em emptyDir). Usa as
+    # credenciais dos secrets aws-access-key/aws-secret-key.
+    caddy_certificates_bucket = f"bonde-caddy-certificates-{namespace}"
+    caddy_bucket = aws.s3.Bucket("caddy-certificates", bucket=caddy_certificates_bucket)
+    aws.s3.BucketPublicAccessBlock(
+        "caddy-certificates",
+        bucket=caddy_bucket.id,
+        block_public_acls=True,
+        block_public_policy=True,
+        ignore_public_acls=True,
+        restrict_public_buckets=True,
     )
 
+    # ✅ Configurações dos serviços (também usadas nas rotas de canary do Caddy)
+    service_loaded_configs = load_service_configs("sandbox")
+
+    caddy_routes = {
+        # Páginas de campanha: cache na borda para absorver picos
+        "public": CaddyRouteConfig(
+            encode=["zstd", "gzip"],
+            cache=CaddyCacheConfig(ttl="60s", stale="300s"),
+            load_balancing=CaddyLoadBalancingConfig(dynamic=True),
+            transport=CaddyTransportConfig(),
+        ),
+        "client-admin": CaddyRouteConfig(encode=["zstd", "gzip"]),
+        "client-accounts": CaddyRouteConfig(encode=["zstd", "gzip"]),
+        "client-canary": CaddyRouteConfig(encode=["zstd", "gzip"]),
+        "api-graphql": CaddyRouteConfig(
+            encode=["zstd", "gzip"],
+            cache_control="no-store",
+            load_balancing=CaddyLoadBalancingConfig(dynamic=True),
+            transport=CaddyTransportConfig(response_header_timeout="60s"),
+            # Subscriptions sobrevivem aos reloads do Caddy (ex.: rotas dos tenants)
+            stream_close_delay="10m",
+            stream_timeout="24h",
+            # Websockets vão para o pool de subscriptions do Hasura
+            websocket_upstream="api-graphql-subscriptions",
+            rate_limit=CaddyRateLimitConfig(max_events=300, window="1m"),
+            max_request_body=1024 * 1024,  # 1MB: queries e mutations
+        ),
+        "api-rest": CaddyRouteConfig(
+            encode=["zstd", "gzip"],
+            transport=CaddyTransportConfig(),
+            max_requests=64,
+        ),
+        # Webhooks recebem rajadas de integrações externas (processadores
+        # de webhook do N8N em queue mode)
+        "n8n-webhook": CaddyRouteConfig(
+            transport=CaddyTransportConfig(response_header_timeout="120s"),
+            rate_limit=CaddyRateLimitConfig(max_events=120, window="1m"),
+            max_request_body=10 * 1024 * 1024,
+            max_requests=32,
+        ),
+    }
+    for service_name, service_config in service_loaded_configs.items():
+        canary = service_config.canary
+        if not canary:
+            continue
+        stable_route = caddy_routes.get(canary.canary_of, CaddyRouteConfig())
+        caddy_routes[canary.canary_of] = stable_route.model_copy(
+            update={
+                "canary": CaddyCanaryConfig(
+                    upstream=service_name, weight=canary.weight, cookie=canary.cookie
+                )
+            }
+        )
+
+    n8n_config = N8NConfig(
+        name="n8n",
+        namespace=namespace,
+        webhook_url="https://n8n.sandbox.bonde.org",
+        image="n8nio/n8n:latest",
+        replicas=1,
+        queue=N8NQueueConfig(
+            enabled=True,
+            worker_autoscaling=AutoscalingConfig(min_replicas=1, max_replicas=4),
+            webhook_replicas=1,
+        ),
+        # Sandbox: guarda só os erros por 7 dias
+        executions=N8NExecutionsConfig(max_age_hours=168, max_count=5000),
+    )
+
+    # Webhooks de produção do N8N vão para os processadores de webhook
+    # (apenas em queue mode; senão seguem com o processo principal)
+    caddy_path_routes = []
+    if n8n_config.webhook_service:
+        caddy_path_routes.append(
+            CaddyPathRouteConfig(
+                host=urlparse(n8n_config.webhook_url).hostname,
+                paths=["/webhook/*"],
+                upstream=f"{n8n_config.webhook_service}:{n8n_config.service_port}",
+            )
+        )
+
     # ✅ Caddy com LoadBalancer automático
-    caddy = create_caddy("caddy", namespace, sandbox_provider, "sandbox")
+    caddy = create_caddy(
+        "caddy",
+        namespace,
+        sandbox_provider,
+        "sandbox",
+        config=CaddyConfig(
+            image="nossas/bonde-caddy:latest",
+            replicas=2,
+            storage=CaddyStorageConfig(module="s3", bucket=caddy_certificates_bucket),
+            min_available=1,
+            autoscaling=AutoscalingConfig(min_replicas=2, max_replicas=4),
+            load_balancer=caddy_load_balancer,
+            # Sem estado (certificados no S3): pode rodar no pool spot
+            tolerations=[
+                {
+                    "key": "node.bonde.org/capacity",
+                    "operator": "Equal",
+                    "value": "spot",
+                    "effect": "NoSchedule",
+                }
+            ],
+            http3=True,
+            metrics=CaddyMetricsConfig(enabled=True, service_monitor=True),
+            slo=SloConfig(availability=0.995, latency_threshold_seconds=1),
+            tenants=CaddyTenantsConfig(enabled=True),
+            routes=caddy_routes,
+            path_routes=caddy_path_routes,
+        ),
+        logging_profile=logging_profile,
+        otlp_endpoint=otel_collector.grpc_endpoint,
+    )
+
+    # ✅ PgBouncer na frente do banco compartilhado do bonde
+    pgbouncer = PgBouncer(
+        "pgbouncer",
+        config=PgBouncerConfig(namespace=namespace),
+        database_url=pulumi.Config("apps").require_secret("bonde-database-url"),
+        opts=pulumi.ResourceOptions(
+            provider=sandbox_provider, depends_on=[sandbox_namespace]
+        ),
+    )
 
     env_secrets = load_env_secrets(
-        namespace=sandbox_namespace, provider=sandbox_provider
+        namespace=sandbox_namespace,
+        provider=sandbox_provider,
+        pooled_database_url=pgbouncer.database_urls["bonde"],
+        pooled_session_database_url=pgbouncer.database_urls["bonde_session"],
+        # Falha o preview sem apps:n8n-encryption-key
+        n8n_queue_mode=n8n_config.queue.enabled,
     )
 
     # bonde-public
-    # ✅ Carregar e criar todos os serviços
-    service_loaded_configs = load_service_configs("sandbox")
+    # ✅ Criar todos os serviços
     created_services = {}
 
     for service_name, service_config in service_loaded_configs.items():
@@ -48,6 +279,9 @@ def create_sandbox_env():
         service = WebService(
             service_name,
             config=service_config,
+            logging_profile=logging_profile,
+            apm_profile=apm_profile,
+            otlp_endpoint=otel_collector.http_endpoint,
             opts=pulumi.ResourceOptions(
                 provider=sandbox_provider,
                 depends_on=[sandbox_namespace, caddy, on_demand_service],
@@ -59,15 +293,15 @@ def create_sandbox_env():
     pulumi.log.info("🚀 Criando N8N Orchestrator")
     n8n_orchestrator = N8NOrchestrator(
         name="n8n",
-        config=N8NConfig(
-            name="n8n",
-            namespace=namespace,
-            webhook_url="https://n8n.sandbox.bonde.org",
-            image="n8nio/n8n:latest",
-            replicas=1,
-        ),
+        config=n8n_config,
+        logging_profile=logging_profile,
         opts=pulumi.ResourceOptions(
             provider=sandbox_provider,
+            depends_on=[
+                secret
+                for secret in [env_secrets.get("n8n_encryption_key")]
+                if secret is not None
+            ],
         ),
     )
 
@@ -83,13 +317,21 @@ def create_sandbox_env():
         for service_name in hasura_services.keys()
     }
 
-    hasura_env_vars.update({"N8N_WEBHOOK_URL": "http://n8n:80/webhook"})
+    hasura_env_vars.update(
+        {"N8N_WEBHOOK_URL": f"{n8n_orchestrator.webhook_service_url}/webhook"}
+    )
 
+    hasura_config = hasura_config or HasuraConfig.for_environment("sandbox")
     hasura_gateway = HasuraGateway(
         name="api-graphql",
         namespace=namespace,
         replicas=1,
         enable_console=True,  # Apenas em sandbox
+        config=hasura_config,
+        logging_profile=logging_profile,
+        otlp_endpoint=otel_collector.http_endpoint,
+        headless_service=True,  # Upstream dinâmico no Caddy
+        subscription_pool=HasuraPoolConfig(replicas=1),
         env_vars=hasura_env_vars,
         opts=pulumi.ResourceOptions(
             provider=sandbox_provider,
@@ -100,8 +342,55 @@ def create_sandbox_env():
         ),
     )
 
+    # ✅ Orçamento de conexões com o Postgres (falha o preview se estourar)
+    pgbouncer_config = pgbouncer.config
+    connection_usages = estimate_webservices(
+        service_loaded_configs,
+        pooled=True,
+        read_replicas=pulumi.Config("apps").get_secret("bonde-database-read-urls")
+        is not None,
+    ) + [
+        estimate_hasura(
+            "api-graphql",
+            hasura_gateway.total_replicas,
+            hasura_config.pg_connections,
+            hasura_config.pg_stripes,
+        ),
+        estimate_n8n("n8n", n8n_orchestrator.config),
+        ConnectionUsage(
+            component="pgbouncer",
+            database="bonde",
+            replicas=pgbouncer_config.replicas,
+            per_replica=sum(pool.pool_size for pool in pgbouncer_config.pools),
+        ),
+    ]
+    # On-demand só entra com o pool confirmado (ver OnDemandConfig)
+    on_demand_config = on_demand_service.config
+    if on_demand_config.pool_configured:
+        connection_usages.append(
+            ConnectionUsage(
+                component="on-demand",
+                database="pgbouncer",
+                replicas=on_demand_config.autoscaling.max_replicas
+                if on_demand_config.autoscaling
+                else on_demand_config.replicas,
+                per_replica=on_demand_config.db_pool_size,
+            )
+        )
+    check_budget(
+        connection_usages,
+        {
+            "pgbouncer": pgbouncer_config.replicas * pgbouncer_config.max_client_conn,
+            **load_max_connections(),
+        },
+    )
+
     # ✅ Export simples
     pulumi.export("namespace", sandbox_namespace.metadata["name"])
     pulumi.export("caddy_url", caddy.load_balancer_url)
+    pulumi.export(
+        "caddy_metrics_url",
+        f"http://caddy-metrics.{namespace}.svc.cluster.local:{caddy.config.metrics.port}/metrics",
+    )
 
     pulumi.log.info("🎉 SANDBOX com LoadBalancer automático!")
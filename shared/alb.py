@@ -0,0 +1,82 @@
+import os
+import pulumi
+import pulumi_aws as aws
+import pulumi_kubernetes as k8s
+
+from .irsa import create_irsa_role
+
+
+def install_alb_controller(
+    name: str,
+    cluster_name: pulumi.Input[str],
+    vpc_id: pulumi.Input[str],
+    oidc_provider: aws.iam.OpenIdConnectProvider,
+    k8s_provider: k8s.Provider,
+    opts=None,
+) -> k8s.helm.v3.Release:
+    """
+    Instala o aws-load-balancer-controller no cluster EKS.
+
+    Necessário para Services com `loadBalancerClass: service.k8s.aws/nlb`
+    (NLB com targets do tipo IP, proxy protocol e pod readiness gates).
+
+    Args:
+        name: Prefixo dos recursos
+        cluster_name: Nome do cluster EKS
+        vpc_id: VPC do cluster
+        oidc_provider: OIDC provider do cluster (IRSA)
+        k8s_provider: Provider Kubernetes do cluster
+    """
+    parent_opts = opts or pulumi.ResourceOptions()
+
+    policy_path = os.path.join(
+        os.path.dirname(__file__), "policies", "aws-load-balancer-controller.json"
+    )
+    with open(policy_path, "r") as f:
+        policy_document = f.read()
+
+    policy = aws.iam.Policy(
+        f"{name}-policy",
+        description="Permissões do aws-load-balancer-controller",
+        policy=policy_document,
+        opts=parent_opts,
+    )
+
+    role = create_irsa_role(
+        f"{name}-role",
+        oidc_provider,
+        namespace="kube-system",
+        service_account="aws-load-balancer-controller",
+        opts=parent_opts,
+    )
+
+    aws.iam.RolePolicyAttachment(
+        f"{name}-policy-attachment",
+        role=role.name,
+        policy_arn=policy.arn,
+        opts=parent_opts,
+    )
+
+    return k8s.helm.v3.Release(
+        name,
+        name="aws-load-balancer-controller",
+        chart="aws-load-balancer-controller",
+        version="1.13.0",
+        namespace="kube-system",
+        repository_opts=k8s.helm.v3.RepositoryOptsArgs(
+            repo="https://aws.github.io/eks-charts",
+        ),
+        values={
+            "clusterName": cluster_name,
+            "region": aws.config.region,
+            "vpcId": vpc_id,
+            "serviceAccount": {
+                "create": True,
+                "name": "aws-load-balancer-controller",
+                "annotations": {"eks.amazonaws.com/role-arn": role.arn},
+            },
+        },
+        opts=pulumi.ResourceOptions.merge(
+            parent_opts, pulumi.ResourceOptions(provider=k8s_provider)
+        ),
+    )
@@ -0,0 +1,108 @@
+import os
+from typing import Dict, List
+import pulumi
+import pulumi_aws as aws
+import pulumi_kubernetes as k8s
+
+from .irsa import create_irsa_role
+
+
+def install_cluster_autoscaler(
+    name: str,
+    cluster_name: pulumi.Input[str],
+    oidc_provider: aws.iam.OpenIdConnectProvider,
+    k8s_provider: k8s.Provider,
+    priorities: Dict[int, List[pulumi.Input[str]]],
+    opts=None,
+) -> k8s.helm.v3.Release:
+    """
+    Instala o Cluster Autoscaler no cluster EKS.
+
+    Descobre os managed node groups pelas tags que o EKS coloca nos ASGs
+    (k8s.io/cluster-autoscaler/enabled e .../<cluster>) e lê labels e taints
+    de cada node group via eks:DescribeNodegroup, o que permite escalar
+    pools a partir de zero. Entre os pools que atendem aos pods pendentes
+    usa o expander `priority` (ex.: spot antes de on-demand para os pods que
+    toleram o taint do pool spot) e, no empate, `least-waste`. Nodes
+    subutilizados são consolidados (scale down). Pods com emptyDir só são
+    movidos com a annotation `cluster-autoscaler.kubernetes.io/safe-to-evict:
+    "true"` (caches descartáveis, ex.: Caddy e on-demand).
+
+    Args:
+        name: Prefixo dos recursos
+        cluster_name: Nome do cluster EKS
+        oidc_provider: OIDC provider do cluster (IRSA)
+        k8s_provider: Provider Kubernetes do cluster
+        priorities: {prioridade: [regex do nome do ASG]}
+    """
+    parent_opts = opts or pulumi.ResourceOptions()
+
+    policy_path = os.path.join(
+        os.path.dirname(__file__), "policies", "cluster-autoscaler.json"
+    )
+    with open(policy_path, "r") as f:
+        policy_document = f.read()
+
+    policy = aws.iam.Policy(
+        f"{name}-policy",
+        description="Permissões do Cluster Autoscaler",
+        policy=policy_document,
+        opts=parent_opts,
+    )
+
+    role = create_irsa_role(
+        f"{name}-role",
+        oidc_provider,
+        namespace="kube-system",
+        service_account="cluster-autoscaler",
+        opts=parent_opts,
+    )
+
+    aws.iam.RolePolicyAttachment(
+        f"{name}-policy-attachment",
+        role=role.name,
+        policy_arn=policy.arn,
+        opts=parent_opts,
+    )
+
+    return k8s.helm.v3.Release(
+        name,
+        name="cluster-autoscaler",
+        chart="cluster-autoscaler",
+        version="9.46.6",
+        namespace="kube-system",
+        repository_opts=k8s.helm.v3.RepositoryOptsArgs(
+            repo="https://kubernetes.github.io/autoscaler",
+        ),
+        values={
+            "cloudProvider": "aws",
+            "awsRegion": aws.config.region,
+            "autoDiscovery": {"clusterName": cluster_name},
+            # Mesma minor do Kubernetes do cluster
+            "image": {"tag": "v1.34.0"},
+            "rbac": {
+                "serviceAccount": {
+                    "create": True,
+                    "name": "cluster-autoscaler",
+                    "annotations": {"eks.amazonaws.com/role-arn": role.arn},
+                }
+            },
+            "expanderPriorities": {
+                str(priority): patterns for priority, patterns in priorities.items()
+            },
+            "extraArgs": {
+                "expander": "priority,least-waste",
+                "balance-similar-node-groups": True,
+                # Consolidação: remove nodes abaixo de 50% de uso por 5 minutos
+                "scale-down-utilization-threshold": 0.5,
+                "scale-down-unneeded-time": "5m",
+                "scale-down-delay-after-add": "5m",
+                # skip-nodes-with-local-storage fica no padrão (true): o
+                # Redis em emptyDir não é drenado; pods com emptyDir
+                # descartável usam safe-to-evict "true"
+            },
+        },
+        opts=pulumi.ResourceOptions.merge(
+            parent_opts, pulumi.ResourceOptions(provider=k8s_provider)
+        ),
+    )
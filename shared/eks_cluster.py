@@ -1,8 +1,13 @@
+from typing import List, Optional
 import pulumi
 import pulumi_aws as aws
 import pulumi_kubernetes as k8s
 
-# from .alb import install_alb_controller
+from .alb import install_alb_controller
+from .keda import install_keda
+from .cluster_autoscaler import install_cluster_autoscaler
+from .node_pools import NodePoolConfig, load_node_pools
+from .prometheus import install_prometheus_stack
 
 
 class EKSClusterStack(pulumi.ComponentResource):
@@ -17,7 +22,8 @@ class EKSClusterStack(pulumi.ComponentResource):
 
     ARQUITETURA:
     - Cluster EKS único na VPC compartilhada
-    - Node Groups nas subnets privadas
+    - Node Groups nas subnets privadas, um por pool (infra-eks:node-pools),
+      escalados pelo Cluster Autoscaler
     - IAM Roles para cluster e nodes
 
     NOTA:
@@ -31,10 +37,13 @@ class EKSClusterStack(pulumi.ComponentResource):
         vpc_id: pulumi.Input[str],
         private_subnet_ids: pulumi.Input[list],
         public_subnet_ids: pulumi.Input[list],
+        node_pools: Optional[List[NodePoolConfig]] = None,
         opts=None,
     ):
         super().__init__("custom:eks:EKSClusterStack", name, None, opts)
 
+        node_pools = node_pools or load_node_pools()
+
         # IAM Role para o Cluster EKS
         eks_role = aws.iam.Role(
             f"{name}-role",
@@ -85,6 +94,19 @@ class EKSClusterStack(pulumi.ComponentResource):
             opts=pulumi.ResourceOptions(parent=self, depends_on=[eks_role]),
         )
 
+        # OIDC Provider do cluster (IAM Roles for Service Accounts)
+        self.oidc_provider = aws.iam.OpenIdConnectProvider(
+            f"{name}-oidc-provider",
+            url=self.eks_cluster.identities[0].oidcs[0].issuer,
+            client_id_lists=["sts.amazonaws.com"],
+            tags={
+                "Name": f"{name}-oidc-provider",
+                "Environment": "shared",
+                "ManagedBy": "pulumi",
+            },
+            opts=pulumi.ResourceOptions(parent=self, depends_on=[self.eks_cluster]),
+        )
+
         # IAM Role para Node Group
         node_group_role = aws.iam.Role(
             f"{name}-nodegroup-role",
@@ -115,25 +137,29 @@ class EKSClusterStack(pulumi.ComponentResource):
             opts=pulumi.ResourceOptions(parent=self),
         )
 
-        # Node Group
-        self.node_group = aws.eks.NodeGroup(
-            "eks-nodegroup",
+        # Node Groups (um por pool)
+        self.node_groups = {
+            pool.name: self._create_node_group(
+                pool, node_group_role, private_subnet_ids
+            )
+            for pool in node_pools
+        }
+        self.node_group_list = list(self.node_groups.values())
+        # Primeiro pool (export do ASG no stack shared)
+        self.node_group = self.node_group_list[0]
+
+        # Metrics Server (necessário para os HorizontalPodAutoscalers)
+        self.metrics_server = aws.eks.Addon(
+            "eks-metrics-server",
             cluster_name=self.eks_cluster.name,
-            node_role_arn=node_group_role.arn,
-            subnet_ids=private_subnet_ids,
-            instance_types=["t3.medium"],
-            scaling_config=aws.eks.NodeGroupScalingConfigArgs(
-                desired_size=2,
-                min_size=1,
-                max_size=5,
-            ),
+            addon_name="metrics-server",
             tags={
-                "Name": "eks-nodegroup",
+                "Name": "eks-metrics-server",
                 "Environment": "shared",
                 "ManagedBy": "pulumi",
             },
             opts=pulumi.ResourceOptions(
-                parent=self, depends_on=[self.eks_cluster, node_group_role]
+                parent=self, depends_on=self.node_group_list
             ),
         )
 
@@ -177,10 +203,59 @@ users:
             opts=pulumi.ResourceOptions(parent=self),
         )
 
+        # AWS Load Balancer Controller (NLB com targets IP para o Caddy)
+        self.alb_controller = install_alb_controller(
+            "aws-load-balancer-controller",
+            cluster_name=self.eks_cluster.name,
+            vpc_id=vpc_id,
+            oidc_provider=self.oidc_provider,
+            k8s_provider=self.provider,
+            opts=pulumi.ResourceOptions(parent=self, depends_on=self.node_group_list),
+        )
+
+        # Cluster Autoscaler (min/max de cada pool, consolidação de nodes)
+        priorities = {}
+        for pool in node_pools:
+            priorities.setdefault(pool.priority, []).append(
+                self.node_groups[pool.name].node_group_name.apply(
+                    lambda node_group_name: f".*{node_group_name}.*"
+                )
+            )
+        self.cluster_autoscaler = install_cluster_autoscaler(
+            "cluster-autoscaler",
+            cluster_name=self.eks_cluster.name,
+            oidc_provider=self.oidc_provider,
+            k8s_provider=self.provider,
+            priorities=priorities,
+            opts=pulumi.ResourceOptions(parent=self, depends_on=self.node_group_list),
+        )
+
+        # KEDA (autoscaling por eventos, ex.: fila dos workers do N8N)
+        self.keda = install_keda(
+            "keda",
+            k8s_provider=self.provider,
+            opts=pulumi.ResourceOptions(parent=self, depends_on=self.node_group_list),
+        )
+
+        # kube-prometheus-stack (opcional): CRDs ServiceMonitor/PrometheusRule
+        # usados pelos ambientes
+        self.prometheus_stack = None
+        infra_config = pulumi.Config("infra-eks")
+        if infra_config.get_bool("prometheus-stack"):
+            self.prometheus_stack = install_prometheus_stack(
+                "kube-prometheus-stack",
+                k8s_provider=self.provider,
+                # Volume persistente opcional (padrão: emptyDir)
+                storage_size=infra_config.get("prometheus-storage-size"),
+                storage_class=infra_config.get("prometheus-storage-class"),
+                opts=pulumi.ResourceOptions(parent=self, depends_on=self.node_group_list),
+            )
+
         self.register_outputs(
             {
                 "eks_cluster": self.eks_cluster,
                 "node_group": self.node_group,
+                "node_groups": self.node_groups,
                 "provider": self.provider,
                 "kubeconfig": pulumi.Output.secret(self.kubeconfig),
                 "cluster_name": self.eks_cluster.name,
@@ -188,6 +263,53 @@ users:
             }
         )
 
+    def _create_node_group(
+        self,
+        pool: NodePoolConfig,
+        node_role: aws.iam.Role,
+        subnet_ids: pulumi.Input[list],
+    ) -> aws.eks.NodeGroup:
+        """Managed node group de um pool"""
+        # O pool "default" mantém o nome do node group original
+        resource_name = (
+            "eks-nodegroup" if pool.name == "default" else f"eks-nodegroup-{pool.name}"
+        )
+        return aws.eks.NodeGroup(
+            resource_name,
+            cluster_name=self.eks_cluster.name,
+            node_role_arn=node_role.arn,
+            subnet_ids=subnet_ids,
+            instance_types=pool.instance_types,
+            capacity_type=pool.eks_capacity_type,
+            # x86_64 usa a AMI padrão da versão do cluster (evita recriar o
+            # node group original)
+            ami_type=pool.ami_type if pool.arch != "x86_64" else None,
+            disk_size=pool.disk_size,
+            labels={"node.bonde.org/pool": pool.name, **pool.labels},
+            taints=[
+                aws.eks.NodeGroupTaintArgs(
+                    key=taint.key, value=taint.value, effect=taint.effect
+                )
+                for taint in pool.taints
+            ],
+            scaling_config=aws.eks.NodeGroupScalingConfigArgs(
+                desired_size=pool.desired_size,
+                min_size=pool.min_size,
+                max_size=pool.max_size,
+            ),
+            tags={
+                "Name": resource_name,
+                "Environment": "shared",
+                "ManagedBy": "pulumi",
+            },
+            opts=pulumi.ResourceOptions(
+                parent=self,
+                depends_on=[self.eks_cluster, node_role],
+                # O desired_size é controlado pelo Cluster Autoscaler
+                ignore_changes=["scalingConfig.desiredSize"],
+            ),
+        )
+
 
 def create_eks_cluster(
     name: str,
@@ -197,5 +319,7 @@ def create_eks_cluster(
 ):
     """
     Cria o cluster EKS compartilhado para todos os ambientes.
+
+    Os node pools vêm de infra-eks:node-pools (ver shared/node_pools.py).
     """
     return EKSClusterStack(name, vpc_id, private_subnet_ids, public_subnet_ids)
@@ -0,0 +1,54 @@
+import json
+import pulumi
+import pulumi_aws as aws
+
+
+def create_irsa_role(
+    name: str,
+    oidc_provider: aws.iam.OpenIdConnectProvider,
+    namespace: str,
+    service_account: str,
+    opts=None,
+) -> aws.iam.Role:
+    """
+    Cria uma IAM Role assumível por uma ServiceAccount do Kubernetes (IRSA).
+
+    Args:
+        name: Nome da role
+        oidc_provider: OIDC provider do cluster EKS
+        namespace: Namespace da ServiceAccount
+        service_account: Nome da ServiceAccount
+    """
+    assume_role_policy = pulumi.Output.all(
+        oidc_provider.arn, oidc_provider.url
+    ).apply(
+        lambda args: json.dumps(
+            {
+                "Version": "2012-10-17",
+                "Statement": [
+                    {
+                        "Effect": "Allow",
+                        "Principal": {"Federated": args[0]},
+                        "Action": "sts:AssumeRoleWithWebIdentity",
+                        "Condition": {
+                            "StringEquals": {
+                                f"{args[1].replace('https://', '')}:sub": f"system:serviceaccount:{namespace}:{service_account}",
+                                f"{args[1].replace('https://', '')}:aud": "sts.amazonaws.com",
+                            }
+                        },
+                    }
+                ],
+            }
+        )
+    )
+
+    return aws.iam.Role(
+        name,
+        assume_role_policy=assume_role_policy,
+        tags={
+            "Name": name,
+            "Environment": "shared",
+            "ManagedBy": "pulumi",
+        },
+        opts=opts,
+    )
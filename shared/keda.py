@@ -0,0 +1,31 @@
+import pulumi
+import pulumi_kubernetes as k8s
+
+
+def install_keda(name: str, k8s_provider: k8s.Provider, opts=None) -> k8s.helm.v3.Release:
+    """
+    Instala o KEDA no cluster EKS.
+
+    Necessário para ScaledObjects (ex.: workers do N8N escalados pelo
+    tamanho da fila no Redis).
+
+    Args:
+        name: Nome do release
+        k8s_provider: Provider Kubernetes do cluster
+    """
+    parent_opts = opts or pulumi.ResourceOptions()
+
+    return k8s.helm.v3.Release(
+        name,
+        name="keda",
+        chart="keda",
+        version="2.17.2",
+        namespace="keda",
+        create_namespace=True,
+        repository_opts=k8s.helm.v3.RepositoryOptsArgs(
+            repo="https://kedacore.github.io/charts",
+        ),
+        opts=pulumi.ResourceOptions.merge(
+            parent_opts, pulumi.ResourceOptions(provider=k8s_provider)
+        ),
+    )
@@ -0,0 +1,77 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+import pulumi
+
+# Arquitetura → AMI dos managed node groups (EKS >= 1.30 usa AL2023)
+AMI_TYPES = {
+    "x86_64": "AL2023_x86_64_STANDARD",
+    "arm64": "AL2023_ARM_64_STANDARD",
+}
+CAPACITY_TYPES = {"on-demand": "ON_DEMAND", "spot": "SPOT"}
+
+
+class NodePoolTaintConfig(BaseModel):
+    key: str
+    value: Optional[str] = None
+    effect: str = "NO_SCHEDULE"  # NO_SCHEDULE, NO_EXECUTE, PREFER_NO_SCHEDULE
+
+
+class NodePoolConfig(BaseModel):
+    """
+    Pool de nodes do cluster (um managed node group por pool).
+
+    - instance_types: várias famílias equivalentes aumentam a chance de
+      capacidade spot (ex.: t3.large, t3a.large, m5.large)
+    - capacity_type: on-demand ou spot (o EKS faz o rebalanceamento das
+      interrupções spot)
+    - arch: x86_64 ou arm64 (Graviton, ex.: t4g, m7g)
+    - taints/labels: reservam o pool para workloads que os toleram/selecionam
+    - priority: preferência do Cluster Autoscaler entre pools que atendem
+      aos pods pendentes (maior primeiro)
+    """
+
+    name: str
+    instance_types: List[str] = ["t3.medium"]
+    capacity_type: str = "on-demand"
+    arch: str = "x86_64"
+    min_size: int = 1
+    max_size: int = 5
+    desired_size: int = 1
+    disk_size: Optional[int] = None  # GiB
+    labels: Dict[str, str] = {}
+    taints: List[NodePoolTaintConfig] = []
+    priority: int = 10
+
+    @property
+    def ami_type(self) -> str:
+        if self.arch not in AMI_TYPES:
+            raise ValueError(f"Node pool {self.name}: arch desconhecida {self.arch}")
+        return AMI_TYPES[self.arch]
+
+    @property
+    def eks_capacity_type(self) -> str:
+        if self.capacity_type not in CAPACITY_TYPES:
+            raise ValueError(
+                f"Node pool {self.name}: capacity_type desconhecido {self.capacity_type}"
+            )
+        return CAPACITY_TYPES[self.capacity_type]
+
+
+# Pool criado antes da configuração por lista (eks-nodegroup)
+DEFAULT_NODE_POOLS = [
+    NodePoolConfig(name="default", min_size=1, max_size=5, desired_size=2)
+]
+
+
+def load_node_pools(config: Optional[pulumi.Config] = None) -> List[NodePoolConfig]:
+    """Lê infra-eks:node-pools (lista de NodePoolConfig) do stack shared"""
+    config = config or pulumi.Config("infra-eks")
+    pools = config.get_object("node-pools")
+    if not pools:
+        return DEFAULT_NODE_POOLS
+
+    node_pools = [NodePoolConfig(**pool) for pool in pools]
+    names = [pool.name for pool in node_pools]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Nomes de node pools duplicados: {names}")
+    return node_pools
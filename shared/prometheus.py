@@ -0,0 +1,75 @@
+from typing import Any, Dict, Optional
+import pulumi
+import pulumi_kubernetes as k8s
+
+
+def install_prometheus_stack(
+    name: str,
+    k8s_provider: k8s.Provider,
+    retention: str = "15d",
+    storage_size: Optional[str] = None,
+    storage_class: Optional[str] = None,
+    opts=None,
+) -> k8s.helm.v3.Release:
+    """
+    Instala o kube-prometheus-stack no cluster EKS.
+
+    Prometheus Operator (CRDs ServiceMonitor/PrometheusRule), Prometheus,
+    Alertmanager, Grafana, kube-state-metrics e node-exporter. O Prometheus
+    coleta ServiceMonitors e PrometheusRules de todos os namespaces, sem
+    exigir os labels do release; o Grafana carrega os dashboards dos
+    ConfigMaps com o label `grafana_dashboard` (ex.: dashboard do Caddy).
+
+    Args:
+        name: Nome do release
+        k8s_provider: Provider Kubernetes do cluster
+        retention: Retenção das séries no Prometheus
+        storage_size: Volume persistente do Prometheus (opcional). Sem ele as
+            séries ficam em emptyDir e se perdem quando o pod é recriado. O
+            cluster não tem o driver EBS CSI nem StorageClass padrão, então
+            informe um `storage_class` provisionável junto
+        storage_class: StorageClass do volume
+    """
+    parent_opts = opts or pulumi.ResourceOptions()
+
+    prometheus_spec: Dict[str, Any] = {
+        "serviceMonitorSelectorNilUsesHelmValues": False,
+        "podMonitorSelectorNilUsesHelmValues": False,
+        "ruleSelectorNilUsesHelmValues": False,
+        "retention": retention,
+    }
+    if storage_size:
+        claim_spec: Dict[str, Any] = {
+            "accessModes": ["ReadWriteOnce"],
+            "resources": {"requests": {"storage": storage_size}},
+        }
+        if storage_class:
+            claim_spec["storageClassName"] = storage_class
+        prometheus_spec["storageSpec"] = {"volumeClaimTemplate": {"spec": claim_spec}}
+
+    return k8s.helm.v3.Release(
+        name,
+        name="kube-prometheus-stack",
+        chart="kube-prometheus-stack",
+        version="65.1.1",
+        namespace="monitoring",
+        create_namespace=True,
+        repository_opts=k8s.helm.v3.RepositoryOptsArgs(
+            repo="https://prometheus-community.github.io/helm-charts",
+        ),
+        values={
+            "prometheus": {"prometheusSpec": prometheus_spec},
+            "grafana": {
+                "sidecar": {
+                    "dashboards": {
+                        "enabled": True,
+                        "label": "grafana_dashboard",
+                        "searchNamespace": "ALL",
+                    }
+                }
+            },
+        },
+        opts=pulumi.ResourceOptions.merge(
+            parent_opts, pulumi.ResourceOptions(provider=k8s_provider)
+        ),
+    )
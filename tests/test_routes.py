@@ -0,0 +1,46 @@
+from modules.ingress.routes import CaddyPathRouteConfig, insert_path_routes
+
+
+def _caddy_json(routes):
+    return {"apps": {"http": {"servers": {"https": {"routes": routes}}}}}
+
+
+def _proxy(host, dial):
+    return {
+        "match": [{"host": [host]}],
+        "handle": [{"handler": "reverse_proxy", "upstreams": [{"dial": dial}]}],
+    }
+
+
+WEBHOOK = CaddyPathRouteConfig(
+    host="n8n.sandbox.bonde.org", paths=["/webhook/*"], upstream="n8n-webhook:80"
+)
+
+
+def test_rota_de_path_antes_da_rota_do_host():
+    base = _caddy_json(
+        [_proxy("api.sandbox.bonde.org", "api:80"), _proxy("n8n.sandbox.bonde.org", "n8n:80")]
+    )
+    routes = insert_path_routes(base, [WEBHOOK])["apps"]["http"]["servers"]["https"]["routes"]
+
+    assert [route["handle"][0]["upstreams"][0]["dial"] for route in routes] == [
+        "api:80",
+        "n8n-webhook:80",
+        "n8n:80",
+    ]
+    assert routes[1]["match"] == [
+        {"host": ["n8n.sandbox.bonde.org"], "path": ["/webhook/*"]}
+    ]
+    # O JSON base não é alterado
+    assert len(base["apps"]["http"]["servers"]["https"]["routes"]) == 2
+
+
+def test_host_sem_rota_entra_antes_da_catch_all():
+    catch_all = {"handle": [{"handler": "reverse_proxy", "upstreams": [{"dial": "public:80"}]}]}
+    base = _caddy_json([_proxy("api.sandbox.bonde.org", "api:80"), catch_all])
+    routes = insert_path_routes(base, [WEBHOOK])["apps"]["http"]["servers"]["https"]["routes"]
+    assert [route["handle"][0]["upstreams"][0]["dial"] for route in routes] == [
+        "api:80",
+        "n8n-webhook:80",
+        "public:80",
+    ]
@@ -0,0 +1,119 @@
+import pytest
+
+from modules.observability.slo import (
+    SLI_WINDOWS,
+    SloConfig,
+    build_slo_rules,
+    duration_hours,
+)
+
+METRIC = "caddy_http_request_duration_seconds"
+SELECTOR = 'namespace="sandbox",server="https"'
+
+
+def _rules(slo: SloConfig = None):
+    slo = slo or SloConfig(
+        availability=0.995,
+        latency_threshold_seconds=0.5,
+        latency_target=0.95,
+        window="30d",
+        metric=METRIC,
+    )
+    spec = build_slo_rules("caddy", "sandbox", slo, {"server": "https"})
+    recording, alerts = spec["groups"]
+    return recording["rules"], alerts["rules"]
+
+
+def test_recording_rules_por_janela():
+    recording, _ = _rules()
+    rules = {rule["record"]: rule for rule in recording}
+
+    for window in SLI_WINDOWS:
+        total = f"sum(rate({METRIC}_count{{{SELECTOR}}}[{window}]))"
+        errors = rules[f"slo:sli_error:ratio_rate{window}"]
+        assert errors["expr"] == (
+            f'sum(rate({METRIC}_count{{{SELECTOR},code=~"5.."}}[{window}])) / {total}'
+        )
+        latency = rules[f"slo:sli_latency_error:ratio_rate{window}"]
+        assert latency["expr"] == (
+            f'1 - sum(rate({METRIC}_bucket{{{SELECTOR},le="0.5"}}[{window}])) / {total}'
+        )
+        for rule in [errors, latency]:
+            assert rule["labels"] == {"slo": "caddy", "namespace": "sandbox"}
+
+    assert len(recording) == 2 * len(SLI_WINDOWS) + 1
+    assert rules["slo:latency_p95:5m"]["expr"] == (
+        f"histogram_quantile(0.95, sum by (le) (rate({METRIC}_bucket{{{SELECTOR}}}[5m])))"
+    )
+
+
+def test_quantil_segue_latency_target():
+    recording, _ = _rules(SloConfig(latency_target=0.99, metric=METRIC))
+    quantile = recording[-1]
+    assert quantile["record"] == "slo:latency_p99:5m"
+    assert quantile["expr"].startswith("histogram_quantile(0.99, ")
+
+
+def test_limiares_de_burn_rate():
+    _, alerts = _rules()
+    errors = [alert for alert in alerts if alert["alert"] == "SLOBurnRateErrors"]
+
+    # 14.4x / 6x / 3x / 1x × budget de 0.5%
+    thresholds = [0.072, 0.03, 0.015, 0.005]
+    windows = [("1h", "5m"), ("6h", "30m"), ("1d", "2h"), ("3d", "6h")]
+    severities = ["page", "page", "ticket", "ticket"]
+    for alert, threshold, (long_window, short_window), severity in zip(
+        errors, thresholds, windows, severities
+    ):
+        series = 'slo="caddy",namespace="sandbox"'
+        assert alert["expr"] == (
+            f"slo:sli_error:ratio_rate{long_window}{{{series}}} > {threshold} "
+            f"and slo:sli_error:ratio_rate{short_window}{{{series}}} > {threshold}"
+        )
+        assert alert["labels"]["severity"] == severity
+        assert alert["labels"]["namespace"] == "sandbox"
+
+    latency = [alert for alert in alerts if alert["alert"] == "SLOBurnRateLatency"]
+    # Budget de latência: 5% (p95)
+    assert [alert["expr"].rsplit(" > ", 1)[1] for alert in latency] == [
+        "0.72",
+        "0.3",
+        "0.15",
+        "0.05",
+    ]
+
+
+def test_namespaces_nao_colidem():
+    slo = SloConfig(metric=METRIC)
+    sandbox = build_slo_rules("caddy", "sandbox", slo, {})
+    production = build_slo_rules("caddy", "production", slo, {})
+    sandbox_labels = sandbox["groups"][0]["rules"][0]["labels"]
+    production_labels = production["groups"][0]["rules"][0]["labels"]
+    assert sandbox_labels != production_labels
+
+
+def test_metric_obrigatoria():
+    with pytest.raises(ValueError, match="metric"):
+        build_slo_rules("caddy", "sandbox", SloConfig(), {})
+
+
+@pytest.mark.parametrize(
+    "targets",
+    [
+        {"availability": 1.0},
+        {"availability": 0},
+        {"latency_target": 1.5},
+        {"latency_target": -0.1},
+    ],
+)
+def test_objetivos_fora_de_0_e_1(targets):
+    with pytest.raises(ValueError, match="entre 0 e 1"):
+        build_slo_rules("caddy", "sandbox", SloConfig(metric=METRIC, **targets), {})
+
+
+@pytest.mark.parametrize("window", ["30", "30x", "1.5d", ""])
+def test_janela_invalida(window):
+    with pytest.raises(ValueError, match="Duração inválida"):
+        build_slo_rules("caddy", "sandbox", SloConfig(metric=METRIC, window=window), {})
+    with pytest.raises(ValueError):
+        duration_hours(window)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Promove ou reverte um canary comparando as métricas do Caddy.
+
+Compara p95 e taxa de erro (5xx) dos servidores de loopback
+`canary-<estável>-stable` e `canary-<estável>-canary` e reescreve o
+`canary.weight` em config/<ambiente>/<canary>.yaml: avança para o próximo
+degrau quando o canary está saudável e volta para 0 quando regride.
+O `pulumi up` seguinte aplica o novo peso no Caddy.
+
+USO:
+python -m tools.canary sandbox client-canary --prometheus-url http://localhost:9090
+python -m tools.canary sandbox client-canary --dry-run
+"""
+import argparse
+import json
+import os
+import re
+import urllib.parse
+import urllib.request
+from typing import Dict, Optional
+
+import yaml
+
+from modules.ingress.routes import canary_server_name
+
+WEIGHT_STEPS = [10, 25, 50, 100]
+
+
+def query(prometheus_url: str, expr: str) -> Optional[float]:
+    """Executa uma query instantânea no Prometheus e retorna o primeiro valor"""
+    url = f"{prometheus_url.rstrip('/')}/api/v1/query?" + urllib.parse.urlencode(
+        {"query": expr}
+    )
+    with urllib.request.urlopen(url, timeout=10) as response:
+        payload = json.load(response)
+
+    if payload.get("status") != "success":
+        raise Exception(f"Query falhou no Prometheus: {expr}")
+
+    result = payload["data"]["result"]
+    if not result:
+        return None
+    value = float(result[0]["value"][1])
+    return None if value != value else value  # NaN sem tráfego
+
+
+def collect(prometheus_url: str, server: str, window: str) -> Dict[str, Optional[float]]:
+    """p95, taxa de erro e volume de requests de um servidor do Caddy"""
+    selector = f'server="{server}"'
+    return {
+        "p95": query(
+            prometheus_url,
+            "histogram_quantile(0.95, sum by (le) "
+            f"(rate(caddy_http_request_duration_seconds_bucket{{{selector}}}[{window}])))",
+        ),
+        "error_rate": query(
+            prometheus_url,
+            f'sum(rate(caddy_http_request_duration_seconds_count{{{selector}, code=~"5.."}}[{window}])) '
+            f"/ sum(rate(caddy_http_request_duration_seconds_count{{{selector}}}[{window}]))",
+        ),
+        "requests": query(
+            prometheus_url,
+            f"sum(increase(caddy_http_request_duration_seconds_count{{{selector}}}[{window}]))",
+        ),
+    }
+
+
+def decide(
+    stable: Dict[str, Optional[float]],
+    canary: Dict[str, Optional[float]],
+    weight: int,
+    max_latency_ratio: float,
+    max_error_delta: float,
+    min_requests: int,
+) -> int:
+    """Novo peso do canary: próximo degrau, 0 (rollback) ou o atual (sem dados)"""
+    if (canary["requests"] or 0) < min_requests:
+        print(f"⏳ Poucos requests no canary ({canary['requests'] or 0:.0f}), mantendo {weight}%")
+        return weight
+
+    canary_errors = canary["error_rate"] or 0
+    stable_errors = stable["error_rate"] or 0
+    if canary_errors - stable_errors > max_error_delta:
+        print(f"❌ Taxa de erro do canary {canary_errors:.2%} (estável {stable_errors:.2%})")
+        return 0
+
+    if canary["p95"] is not None and stable["p95"]:
+        ratio = canary["p95"] / stable["p95"]
+        if ratio > max_latency_ratio:
+            print(f"❌ p95 do canary {canary['p95']:.3f}s é {ratio:.2f}x o estável ({stable['p95']:.3f}s)")
+            return 0
+
+    next_weight = next((step for step in WEIGHT_STEPS if step > weight), 100)
+    print(f"✅ Canary saudável, promovendo {weight}% → {next_weight}%")
+    return next_weight
+
+
+def write_weight(path: str, weight: int):
+    """Atualiza `canary.weight` preservando comentários e formatação do YAML"""
+    with open(path, "r") as f:
+        content = f.read()
+
+    updated, count = re.subn(
+        r"^(canary:\n(?:[ \t]+.*\n)*?[ \t]+weight:[ \t]*)\d+",
+        rf"\g<1>{weight}",
+        content,
+        flags=re.MULTILINE,
+    )
+    if not count:
+        raise Exception(f"canary.weight não encontrado em {path}")
+
+    with open(path, "w") as f:
+        f.write(updated)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("environment")
+    parser.add_argument("service", help="Serviço canary (ex.: client-canary)")
+    parser.add_argument("--prometheus-url", default=os.environ.get("PROMETHEUS_URL", "http://localhost:9090"))
+    parser.add_argument("--window", default="15m")
+    parser.add_argument("--max-latency-ratio", type=float, default=1.2)
+    parser.add_argument("--max-error-delta", type=float, default=0.01)
+    parser.add_argument("--min-requests", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    config_path = os.path.join("config", args.environment, f"{args.service}.yaml")
+    with open(config_path, "r") as f:
+        canary_config = (yaml.safe_load(f) or {}).get("canary")
+    if not canary_config:
+        raise Exception(f"{config_path} não possui bloco canary")
+
+    stable_service = canary_config["canary_of"]
+    weight = int(canary_config.get("weight", 0))
+    if weight <= 0:
+        print(f"⚠️  Canary desativado (weight=0) em {config_path}")
+        raise SystemExit(0)
+
+    stable = collect(args.prometheus_url, canary_server_name(stable_service, "stable"), args.window)
+    canary = collect(args.prometheus_url, canary_server_name(stable_service, "canary"), args.window)
+    print(f"📊 estável: {stable}")
+    print(f"📊 canary:  {canary}")
+
+    new_weight = decide(
+        stable,
+        canary,
+        weight,
+        args.max_latency_ratio,
+        args.max_error_delta,
+        args.min_requests,
+    )
+    if new_weight != weight and not args.dry_run:
+        write_weight(config_path, new_weight)
+        print(f"📝 {config_path}: canary.weight = {new_weight} (aplique com `pulumi up`)")
+    if new_weight == 100:
+        print(f"🚀 Canary com 100% do tráfego; promova a imagem para {stable_service}")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Orçamento de conexões com o Postgres por banco.
+
+Soma, para cada componente, réplicas (ou o máximo do HPA) × pool por
+processo e compara com o `max_connections` configurado em
+`apps:database-max-connections` (ex.: {"bonde": 100, "n8n": 50}).
+Chamado pelo stack durante o preview, falha o deploy quando algum banco
+estoura o orçamento.
+
+USO:
+python -m tools.db_budget sandbox --max-connections bonde=100
+
+O CLI cobre apenas os serviços de config/<ambiente>; o check do stack
+inclui também Hasura, N8N, PgBouncer e o on-demand (apenas com o pool
+configurado, ver OnDemandConfig).
+"""
+import argparse
+from typing import Dict, List, Optional
+
+import pulumi
+from pydantic import BaseModel
+
+from modules.apps.webservice import WebServiceConfig
+from modules.apps.workflows import N8NConfig
+
+# Banco de cada secret com URL de conexão
+DATABASE_SECRETS = {
+    "bonde-database-url": "bonde",
+    "bonde-database-read-url": "bonde-read",
+    "votepeloclima-database-url": "votepeloclima",
+    "n8n-database-secret": "n8n",
+}
+
+# Pool padrão por processo de cada runtime (sem override no env)
+RUNTIME_POOL_DEFAULTS = {
+    "node": 10,  # node-postgres Pool (max=10)
+    "python": 15,  # SQLAlchemy (pool_size=5 + max_overflow=10)
+    "ruby": 5,  # ActiveRecord (RAILS_MAX_THREADS=5)
+    "n8n": 2,  # DB_POSTGRESDB_POOL_SIZE
+}
+# Superusuário, manutenção e conexões manuais
+RESERVED_CONNECTIONS = 10
+
+
+class ConnectionUsage(BaseModel):
+    component: str
+    database: str
+    replicas: int
+    per_replica: int
+
+    @property
+    def total(self) -> int:
+        return self.replicas * self.per_replica
+
+
+def webservice_runtime(config: WebServiceConfig) -> str:
+    """Runtime do serviço a partir do comando do container"""
+    command = " ".join((config.container.command or []) + (config.container.args or []))
+    if any(tool in command for tool in ["uvicorn", "gunicorn", "python"]):
+        return "python"
+    if any(tool in command for tool in ["puma", "rails", "bundle"]):
+        return "ruby"
+    return "node"
+
+
+def webservice_pool_size(config: WebServiceConfig) -> int:
+    """Conexões por réplica: override no env ou o padrão do runtime"""
+    env = config.container.env
+    if env.get("DATABASE_POOL_MAX"):
+        return int(env["DATABASE_POOL_MAX"])
+
+    runtime = webservice_runtime(config)
+    if runtime == "ruby":
+        threads = int(env.get("RAILS_MAX_THREADS", RUNTIME_POOL_DEFAULTS["ruby"]))
+        return threads * int(env.get("WEB_CONCURRENCY", 1))
+    return RUNTIME_POOL_DEFAULTS[runtime]
+
+
+def estimate_webservices(
+    configs: Dict[str, WebServiceConfig],
+    pooled: bool = False,
+    read_replicas: bool = False,
+) -> List[ConnectionUsage]:
+    """
+    Conexões dos WebServices que recebem uma URL de banco via env_from_secret.
+
+    Args:
+        pooled: O bonde-database-url aponta para o PgBouncer (ver load_env_secrets)
+        read_replicas: apps:bonde-database-read-urls configurado; sem réplicas
+            o bonde-database-read-url é o primário (sem pooler) e conta no bonde
+    """
+    usages = []
+    for service_name, config in configs.items():
+        databases = {
+            DATABASE_SECRETS[secret]
+            for secret in config.container.env_from_secret.values()
+            if secret in DATABASE_SECRETS
+        }
+        for database in sorted(databases):
+            if pooled and database == "bonde":
+                database = "pgbouncer"
+            elif database == "bonde-read" and not read_replicas:
+                database = "bonde"
+            usages.append(
+                ConnectionUsage(
+                    component=service_name,
+                    database=database,
+                    replicas=config.replicas,
+                    per_replica=webservice_pool_size(config),
+                )
+            )
+    return usages
+
+
+def estimate_hasura(
+    name: str,
+    replicas: int,
+    pg_connections: int,
+    pg_stripes: int = 1,
+) -> ConnectionUsage:
+    """Hasura: HASURA_GRAPHQL_PG_CONNECTIONS é por stripe"""
+    return ConnectionUsage(
+        component=name,
+        database="bonde",
+        replicas=replicas,
+        per_replica=pg_connections * pg_stripes,
+    )
+
+
+def estimate_n8n(name: str, config: N8NConfig) -> ConnectionUsage:
+    """N8N: main + workers (máximo do KEDA) + processadores de webhook"""
+    queue = config.queue
+    replicas = config.replicas
+    if queue.enabled:
+        replicas += (
+            queue.worker_autoscaling.max_replicas
+            if queue.worker_autoscaling
+            else queue.worker_replicas
+        ) + queue.webhook_replicas
+    return ConnectionUsage(
+        component=name,
+        database="n8n",
+        replicas=replicas,
+        per_replica=config.db_pool_size or RUNTIME_POOL_DEFAULTS["n8n"],
+    )
+
+
+def check_budget(
+    usages: List[ConnectionUsage],
+    max_connections: Dict[str, int],
+    reserved: int = RESERVED_CONNECTIONS,
+) -> Dict[str, int]:
+    """
+    Totaliza as conexões por banco e falha quando algum excede o orçamento.
+
+    Bancos sem max_connections configurado são apenas reportados.
+
+    Returns:
+        Total de conexões por banco
+    """
+    totals: Dict[str, int] = {}
+    for usage in usages:
+        totals[usage.database] = totals.get(usage.database, 0) + usage.total
+        pulumi.log.info(
+            f"🔌 {usage.component} → {usage.database}: "
+            f"{usage.replicas} × {usage.per_replica} = {usage.total}"
+        )
+
+    over_budget = []
+    for database, total in sorted(totals.items()):
+        limit = max_connections.get(database)
+        if limit is None:
+            pulumi.log.info(f"🔌 {database}: {total} conexões (sem orçamento configurado)")
+            continue
+        budget = limit - reserved
+        pulumi.log.info(f"🔌 {database}: {total}/{budget} conexões")
+        if total > budget:
+            over_budget.append(f"{database} ({total} > {budget})")
+
+    if over_budget:
+        raise Exception(
+            "Orçamento de conexões excedido: "
+            + ", ".join(over_budget)
+            + ". Reduza réplicas/pools ou use o PgBouncer."
+        )
+    return totals
+
+
+def load_max_connections(config: Optional[pulumi.Config] = None) -> Dict[str, int]:
+    """Lê apps:database-max-connections ({"bonde": 100, ...}) do stack"""
+    config = config or pulumi.Config("apps")
+    return {
+        database: int(limit)
+        for database, limit in (config.get_object("database-max-connections") or {}).items()
+    }
+
+
+if __name__ == "__main__":
+    from tools.loader import load_service_configs
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("environment")
+    parser.add_argument(
+        "--max-connections",
+        action="append",
+        default=[],
+        help="<banco>=<max_connections>, ex.: bonde=100",
+    )
+    parser.add_argument("--pooled", action="store_true", help="bonde via PgBouncer")
+    parser.add_argument(
+        "--read-replicas", action="store_true", help="bonde-read em réplicas próprias"
+    )
+    args = parser.parse_args()
+
+    usages = estimate_webservices(
+        load_service_configs(args.environment), args.pooled, args.read_replicas
+    )
+    totals: Dict[str, int] = {}
+    for usage in usages:
+        totals[usage.database] = totals.get(usage.database, 0) + usage.total
+        print(f"{usage.component:24} {usage.database:14} {usage.replicas} × {usage.per_replica} = {usage.total}")
+
+    limits = dict(item.split("=", 1) for item in args.max_connections)
+    for database, total in sorted(totals.items()):
+        limit = limits.get(database)
+        status = f"/{int(limit) - RESERVED_CONNECTIONS}" if limit else ""
+        print(f"{database}: {total}{status}")
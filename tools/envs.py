@@ -3,14 +3,36 @@ import json
 import pulumi
 import pulumi_kubernetes as k8s
 from urllib.parse import urlparse
-from typing import Dict
+from typing import Dict, Optional
 
 
 def load_env_secrets(
-    namespace: k8s.core.v1.Namespace, provider: k8s.Provider
+    namespace: k8s.core.v1.Namespace,
+    provider: k8s.Provider,
+    pooled_database_url: Optional[pulumi.Input[str]] = None,
+    pooled_session_database_url: Optional[pulumi.Input[str]] = None,
+    n8n_queue_mode: bool = False,
 ) -> Dict[str, k8s.core.v1.Secret]:
+    """
+    Cria os secrets compartilhados pelos serviços do ambiente.
+
+    Args:
+        pooled_database_url: URL do PgBouncer; quando informada, DATABASE_URL e
+            BONDE_DATABASE_URL passam pelo pooler. O Hasura segue direto no
+            banco (event triggers e subscriptions dependem de sessão).
+        pooled_session_database_url: Alias do PgBouncer em modo session,
+            exposto em DATABASE_SESSION_URL para os serviços que precisam de
+            estado de sessão (migrations, advisory locks, LISTEN/NOTIFY).
+            Sem ele, DATABASE_SESSION_URL aponta direto para o banco.
+        n8n_queue_mode: N8N com workers em queue mode; exige
+            apps:n8n-encryption-key (chave compartilhada entre os processos)
+    """
     # Criar secrets
     config = pulumi.Config("apps")
+    database_url = pooled_database_url or config.require_secret("bonde-database-url")
+    session_database_url = pooled_session_database_url or config.require_secret(
+        "bonde-database-url"
+    )
 
     bonde_database_url = k8s.core.v1.Secret(
         "bonde-database-url",
@@ -19,12 +41,50 @@ def load_env_secrets(
             namespace=namespace.metadata["name"],
         ),
         string_data={
-            "DATABASE_URL": config.require_secret("bonde-database-url"),
-            "BONDE_DATABASE_URL": config.require_secret("bonde-database-url"),
+            "DATABASE_URL": database_url,
+            "BONDE_DATABASE_URL": database_url,
+            "DATABASE_SESSION_URL": session_database_url,
             "HASURA_GRAPHQL_DATABASE_URL": config.require_secret("bonde-database-url"),
         },
         opts=pulumi.ResourceOptions(provider=provider),
     )
+    # ✅ Réplicas de leitura (opcional): "postgres://r1,postgres://r2"
+    # Sem réplicas configuradas, DATABASE_READ_URL aponta para o primário,
+    # então os serviços podem optar pela chave em qualquer ambiente.
+    bonde_database_read_urls = config.get_secret("bonde-database-read-urls")
+    read_data = {
+        "DATABASE_READ_URL": config.require_secret("bonde-database-url"),
+        "DATABASE_READ_URLS": config.require_secret("bonde-database-url"),
+    }
+    if bonde_database_read_urls:
+        read_urls = bonde_database_read_urls.apply(
+            lambda urls: [url.strip() for url in urls.split(",") if url.strip()]
+        )
+        # Lista vazia (ex.: "," ou espaços) cai no primário, sem réplicas no Hasura
+        read_data = pulumi.Output.all(
+            read_urls, config.require_secret("bonde-database-url")
+        ).apply(
+            lambda args: {
+                "DATABASE_READ_URL": args[0][0],
+                "DATABASE_READ_URLS": ",".join(args[0]),
+                "HASURA_GRAPHQL_READ_REPLICA_URLS": ",".join(args[0]),
+            }
+            if args[0]
+            else {
+                "DATABASE_READ_URL": args[1],
+                "DATABASE_READ_URLS": args[1],
+            }
+        )
+
+    bonde_database_read_url = k8s.core.v1.Secret(
+        "bonde-database-read-url",
+        metadata=k8s.meta.v1.ObjectMetaArgs(
+            name="bonde-database-read-url",
+            namespace=namespace.metadata["name"],
+        ),
+        string_data=read_data,
+        opts=pulumi.ResourceOptions(provider=provider),
+    )
     votepeloclima_database_url = k8s.core.v1.Secret(
         "votepeloclima-database-url",
         metadata=k8s.meta.v1.ObjectMetaArgs(
@@ -39,6 +99,22 @@ def load_env_secrets(
         opts=pulumi.ResourceOptions(provider=provider),
     )
 
+    # ✅ N8N Encryption Key: obrigatória com workers em queue mode, senão cada
+    # processo gera a própria chave e os workers não decifram as credenciais
+    n8n_encryption_key = None
+    if n8n_queue_mode or config.get_secret("n8n-encryption-key"):
+        n8n_encryption_key = k8s.core.v1.Secret(
+            "n8n-encryption-key",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name="n8n-encryption-key",
+                namespace=namespace.metadata["name"],
+            ),
+            string_data={
+                "N8N_ENCRYPTION_KEY": config.require_secret("n8n-encryption-key"),
+            },
+            opts=pulumi.ResourceOptions(provider=provider),
+        )
+
     # ✅ N8N Database Secret com parsing da URL
     n8n_database_url = config.require_secret("n8n-database-url")
 
@@ -294,8 +370,10 @@ def load_env_secrets(
 
     return dict(
         bonde_database_url=bonde_database_url,
+        bonde_database_read_url=bonde_database_read_url,
         votepeloclima_database_url=votepeloclima_database_url,
         n8n_database_secret=n8n_database_secret,
+        n8n_encryption_key=n8n_encryption_key,
         smtp_secret=smtp_secret,
         n8n_webhook_secret=n8n_webhook_secret,
         action_secret=action_secret,
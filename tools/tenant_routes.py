@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Compila a tabela de domínios dos tenants em um shard de rotas do Caddy.
+
+O shard é um `map` host → (upstream, tenant) avaliado na borda, que define
+o header do tenant e, para tenants fora do upstream padrão, faz o proxy
+direto. Domínios não mapeados seguem para a rota catch-all (public).
+
+USO:
+python -m tools.tenant_routes sandbox --snapshot tenants.csv
+python -m tools.tenant_routes sandbox --database-url postgres://...
+
+O resultado é salvo em config/caddy/tenants-<ambiente>.json e aplicado pelo
+CaddyStack em um ConfigMap próprio, recarregado sem reiniciar o Caddy.
+"""
+import argparse
+import csv
+import json
+import os
+from typing import Dict, List
+
+from modules.ingress.tenants import DEFAULT_HEADER, build_tenant_route, tenants_path
+
+DEFAULT_QUERY = (
+    "SELECT custom_domain AS domain, id AS tenant FROM mobilizations "
+    "WHERE custom_domain IS NOT NULL AND custom_domain <> ''"
+)
+
+
+def load_snapshot(path: str) -> List[Dict[str, str]]:
+    """Lê um snapshot (.csv ou .json) com as colunas domain, tenant e upstream (opcional)"""
+    with open(path, "r") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return list(csv.DictReader(f))
+
+
+def load_from_database(database_url: str, query: str = DEFAULT_QUERY) -> List[Dict[str, str]]:
+    """Lê os domínios direto do banco do bonde (requer psycopg)"""
+    try:
+        import psycopg
+    except ImportError:
+        raise Exception(
+            "psycopg não instalado; use --snapshot ou instale com `uv pip install psycopg[binary]`"
+        )
+
+    with psycopg.connect(database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(query)
+            columns = [column.name for column in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("environment")
+    parser.add_argument("--snapshot", help="Arquivo .csv/.json com domain,tenant[,upstream]")
+    parser.add_argument("--database-url", default=os.environ.get("BONDE_DATABASE_URL"))
+    parser.add_argument("--query", default=DEFAULT_QUERY)
+    parser.add_argument("--header", default=DEFAULT_HEADER)
+    args = parser.parse_args()
+
+    if args.snapshot:
+        rows = load_snapshot(args.snapshot)
+    elif args.database_url:
+        rows = load_from_database(args.database_url, args.query)
+    else:
+        parser.error("informe --snapshot ou --database-url")
+
+    route = build_tenant_route(rows, header=args.header)
+    output = tenants_path(args.environment)
+    with open(output, "w") as f:
+        json.dump(route, f, indent=4)
+        f.write("\n")
+
+    print(f"✅ {len(rows)} domínios salvos em {output}")